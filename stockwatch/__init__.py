@@ -0,0 +1,3 @@
+"""
+StockWatch Pro building blocks shared by the Streamlit UI and background workers.
+"""
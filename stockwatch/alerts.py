@@ -0,0 +1,195 @@
+"""
+Threshold evaluation and alert message formatting.
+
+AlertEngine evaluates every rule for the whole watchlist in one vectorized
+pass: quotes and per-stock thresholds become NumPy columns, each rule yields a
+"breach ratio" column (>= 1 means breached), and only the sparse set of rules
+that fire is turned back into Python dicts.
+
+Rules, configured per stock (all optional except alert_pct):
+
+    alert_pct        % move from the day open          (pct_open)
+    alert_pct_prev   % move from the previous close    (pct_prev_close)
+    price_above      absolute level crossed upwards    (price_above)
+    price_below      absolute level crossed downwards  (price_below)
+    window_pct       % move over the last window_mins  (window_move)
+
+A stock with "urgent": true marks its alerts urgent, so they skip digest
+coalescing and are sent at once.
+
+Hysteresis: once a rule fires it stays latched until its ratio falls back
+below the re-arm point (rearm_ratio of a % threshold, or level_band_pct on
+the other side of a price level), so a price hovering at the threshold
+alerts once instead of every cooldown.
+
+Cooldowns (per symbol: the stock's cooldown_mins, else the engine default)
+are claimed from a shared CooldownStore, so when several sessions or the
+monitor evaluate the same breach only one of them alerts.
+"""
+
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+ALERT_COOLDOWN = 600   # seconds between alerts for the same symbol
+
+RULES = ("pct_open", "pct_prev_close", "price_above", "price_below", "window_move")
+
+
+def pct_change(current: float, reference: float) -> float:
+    return 0.0 if reference == 0 else ((current - reference) / reference) * 100
+
+
+def currency_for(symbol: str) -> str:
+    return "£" if symbol.endswith(".L") else "$"
+
+
+def _column(df: pd.DataFrame, name: str) -> np.ndarray:
+    """Float column with NaN for missing, non-numeric or zero values."""
+    if name not in df:
+        return np.full(len(df), np.nan)
+    col = pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.where(col == 0, np.nan, col)
+
+
+class AlertEngine:
+    """Vectorized multi-rule alert evaluation with per-rule hysteresis."""
+
+    def __init__(self, rearm_ratio: float = 0.75, level_band_pct: float = 0.5,
+                 cooldown: float = ALERT_COOLDOWN):
+        self.rearm_ratio    = rearm_ratio
+        self.level_band_pct = level_band_pct
+        self.cooldown       = cooldown
+        self.breached       = set()                          # symbols breaching any rule right now
+        self._index         = pd.Index([], dtype=object)
+        self._latched       = np.zeros((0, len(RULES)), dtype=bool)
+
+    def _align(self, index: pd.Index) -> np.ndarray:
+        """Latched flags re-ordered to `index`; symbols new to the watchlist start unlatched."""
+        if index.equals(self._index):
+            return self._latched.copy()
+        pos     = self._index.get_indexer(index)
+        latched = np.zeros((len(index), len(RULES)), dtype=bool)
+        keep    = pos >= 0
+        latched[keep] = self._latched[pos[keep]]
+        return latched
+
+    def evaluate(self, stocks: list, quotes: dict, cooldowns,
+                 now: float | None = None, prices_at=None) -> list:
+        """
+        Return alert entries for every rule that fires this cycle and whose
+        symbol wins its cooldown claim on `cooldowns` (a CooldownStore).
+        `prices_at(symbols, times)` supplies the reference prices for
+        rolling-window rules in one call (e.g. PriceRings.prices_at; NaN where
+        unknown); without it those rules never fire.
+        """
+        now = time.time() if now is None else now
+        if not stocks:
+            self.breached = set()
+            return []
+
+        cfg   = pd.DataFrame.from_records(stocks).drop_duplicates("symbol").set_index("symbol")
+        syms  = cfg.index
+        keys  = syms.to_numpy(dtype=object)   # plain strings: iterating the (Arrow-backed) index is slow
+        q     = pd.DataFrame.from_dict(quotes, orient="index").reindex(syms) if quotes else pd.DataFrame(index=syms)
+        price = _column(q, "c")
+        pc    = _column(q, "pc")
+        open_ = _column(q, "o")
+        ref   = np.where(np.isnan(open_), np.where(np.isnan(pc), price, pc), open_)   # open, else prev close
+
+        pct_open = (price - ref) / ref * 100
+        pct_prev = (price - pc) / pc * 100
+
+        win_pct  = _column(cfg, "window_pct")
+        win_secs = _column(cfg, "window_mins") * 60
+        then     = np.full(len(syms), np.nan)
+        windowed = np.flatnonzero(~np.isnan(win_pct) & ~np.isnan(win_secs) & ~np.isnan(price))
+        if prices_at is not None and len(windowed):
+            then[windowed] = prices_at(keys[windowed].tolist(), now - win_secs[windowed])
+        win_move = (price - then) / then * 100
+
+        above, below = _column(cfg, "price_above"), _column(cfg, "price_below")
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ratio = np.nan_to_num(np.column_stack([
+                np.abs(pct_open) / _column(cfg, "alert_pct"),
+                np.abs(pct_prev) / _column(cfg, "alert_pct_prev"),
+                price / above,
+                below / price,
+                np.abs(win_move) / win_pct,
+            ]), nan=0.0)
+        band     = 1 - self.level_band_pct / 100
+        rearm_at = np.array([self.rearm_ratio, self.rearm_ratio, band, band, self.rearm_ratio])
+
+        breach  = ratio >= 1
+        latched = self._align(syms) & ~(ratio < rearm_at)
+        fire    = breach & ~latched
+        cool    = _column(cfg, "cooldown_mins") * 60
+        cool    = np.where(np.isnan(cool), self.cooldown, cool)
+
+        changes    = np.column_stack([pct_open, pct_prev, pct_open, pct_open, win_move])
+        thresholds = np.column_stack([_column(cfg, "alert_pct"), _column(cfg, "alert_pct_prev"),
+                                      above, below, win_pct])
+        names      = cfg["name"].to_numpy() if "name" in cfg else keys
+        urgent     = cfg["urgent"].eq(True).to_numpy() if "urgent" in cfg else np.zeros(len(syms), dtype=bool)
+        stamp      = datetime.fromtimestamp(now).isoformat(timespec="seconds")
+        candidates = defaultdict(list)
+        for i, r in zip(*np.nonzero(fire)):
+            sym = keys[i]
+            candidates[sym].append({
+                "symbol":    sym,
+                "name":      names[i],
+                "price":     float(price[i]),
+                "change":    float(changes[i, r]),
+                "threshold": float(thresholds[i, r]),
+                "currency":  currency_for(sym),
+                "rule":      RULES[r],
+                "window":    float(win_secs[i] / 60) if RULES[r] == "window_move" else None,
+                "urgent":    bool(urgent[i]),
+                "ts":        now,
+                "time":      stamp,
+            })
+        pos = {sym: i for i, sym in enumerate(keys)}
+        claimed, sent = cooldowns.claim(
+            {sym: (float(cool[pos[sym]]), alerts) for sym, alerts in candidates.items()}, now,
+        )
+        # A rule another session already alerted on counts as fired here too; any
+        # other rule held back by the cooldown stays armed and retries later
+        for sym, rules in sent.items():
+            for r, rule in enumerate(RULES):
+                if rule not in rules:
+                    fire[pos[sym], r] = False
+
+        self._index   = syms
+        self._latched = latched | fire
+        self.breached = set(keys[breach.any(axis=1)])
+        return [a for sym, alerts in candidates.items() if sym in claimed for a in alerts]
+
+
+def describe_rule(a: dict) -> str:
+    """Human-readable reason an alert fired, e.g. "crossed above $150.00"."""
+    rule = a.get("rule", "pct_open")
+    if rule == "price_above":
+        return f"crossed above {a['currency']}{a['threshold']:,.2f}"
+    if rule == "price_below":
+        return f"crossed below {a['currency']}{a['threshold']:,.2f}"
+    span = {"pct_open": "from open", "pct_prev_close": "from prev close"}.get(rule)
+    if span is None:
+        span = f"in {a['window']:g} min"
+    return f"±{a['threshold']:.1f}% {span}"
+
+
+def build_alert_message(alerts: list) -> str:
+    lines = ["🚨 *StockWatch Pro Alert*\n"]
+    for a in alerts:
+        direction = "⬆️ UP" if a["change"] > 0 else "⬇️ DOWN"
+        lines.append(
+            f"*{a['symbol']}* ({a['name']})\n"
+            f"Price: {a['currency']}{a['price']:.2f}  |  "
+            f"Change: {direction} {abs(a['change']):.2f}%\n"
+            f"Threshold: {describe_rule(a)}"
+        )
+    lines.append(f"\n_Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} UTC_")
+    return "\n\n".join(lines)
@@ -0,0 +1,267 @@
+"""
+Offline benchmark for the dashboard.
+
+Starts mock_http as a stand-in for Finnhub and GREEN API, drives
+streamlit_app.py headlessly through Streamlit's AppTest at a range of
+watchlist sizes, and records rerun latency, HTTP calls by endpoint and memory.
+Results are written as JSON so runs can be diffed for regressions.
+
+    python -m stockwatch.bench                                  # sizes 3 10 30 100 300 1000
+    python -m stockwatch.bench --sizes 3 100 --recipients 5 --latency 40 --error-rate 0.02
+    python -m stockwatch.bench --out bench_results.json --reruns 10
+    python -m stockwatch.bench --startup 5 --sizes 30            # cold starts in fresh processes
+
+Each size runs in a fresh temporary directory (config, tick history, outbox)
+with process-wide caches cleared, in three phases: a cold first run, warm
+reruns served from the quote cache, and a forced refresh ("Refresh Now").
+
+--startup N instead measures what an autoscaled container pays: N fresh
+interpreters each import Streamlit, run the app once and rerun it, and report
+the time for each step plus which heavy optional modules the first run
+pulled in.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from stockwatch.mock_http import start_background
+
+APP_PATH      = Path(__file__).resolve().parent.parent / "streamlit_app.py"
+DEFAULT_SIZES = [3, 10, 30, 100, 300, 1000]
+SETTLE        = 10.0   # max seconds to wait for queued WhatsApp sends after each size
+HEAVY_MODULES = ("pandas", "whatsapp_api_client_python", "aiohttp", "qrcode", "websockets", "stockwatch.chart")
+
+
+def rss_mb() -> float:
+    """Current resident set size in MB (Linux /proc), else the peak RSS."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def bench_config(size: int, recipients: int, concurrency: int) -> dict:
+    return {
+        "stocks": [{"symbol": f"S{i:04d}", "name": f"Mock {i}", "alert_pct": 2.0} for i in range(size)],
+        "whatsapp": {
+            "id_instance": "1100000000",
+            "api_token":   "benchtoken",
+            "recipients":  [{"name": f"R{i}", "phone": f"+4477009{i:05d}"} for i in range(recipients)],
+        },
+        "refresh_interval":   60,
+        "fetch_concurrency":  concurrency,
+        "calls_per_minute":   100_000,     # the mock has no quota; measure the app, not the budget
+        "digest_window_secs": 0,
+        "streaming":          {"enabled": False, "url": ""},
+    }
+
+
+def _delta(after: dict, before: dict) -> dict:
+    return {k: after.get(k, 0) - before.get(k, 0) for k in after if after.get(k, 0) != before.get(k, 0)}
+
+
+def _timed_run(at, server=None, action=None) -> tuple[float, dict]:
+    before  = server.snapshot() if server else {}
+    started = time.perf_counter()
+    (action(at) if action else at).run()
+    elapsed = (time.perf_counter() - started) * 1000
+    if at.exception:
+        raise RuntimeError(f"app raised: {at.exception[0].value}")
+    return elapsed, _delta(server.snapshot(), before) if server else {}
+
+
+def _refresh(at):
+    return next(b for b in at.button if "Refresh Now" in str(b.label)).click()
+
+
+def bench_size(size: int, args, server) -> dict:
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    st.cache_resource.clear()
+    workdir = tempfile.mkdtemp(prefix=f"stockwatch-bench-{size}-")
+    os.chdir(workdir)
+    try:
+        with open("stockwatch_config.json", "w") as f:
+            json.dump(bench_config(size, args.recipients, args.concurrency), f)
+
+        rss_before = rss_mb()
+        start      = server.snapshot()
+        at         = AppTest.from_file(str(args.app), default_timeout=args.timeout)
+        cold, cold_http = _timed_run(at, server)
+        warm, warm_http = [], {}
+        for _ in range(args.reruns):
+            ms, http = _timed_run(at, server)
+            warm.append(ms)
+            for k, v in http.items():
+                warm_http[k] = warm_http.get(k, 0) + v
+        refresh, refresh_http = _timed_run(at, server, _refresh)
+
+        # Alerts are sent on background workers; give them a moment to drain
+        deadline, last = time.monotonic() + SETTLE, None
+        while time.monotonic() < deadline:
+            sends = server.snapshot().get("greenapi.send", 0)
+            if sends == last:
+                break
+            last = sends
+            time.sleep(0.5)
+
+        result = {
+            "size":        size,
+            "recipients":  args.recipients,
+            "cold_ms":     round(cold, 1),
+            "warm_ms":     {
+                "median": round(statistics.median(warm), 1) if warm else None,
+                "max":    round(max(warm), 1) if warm else None,
+                "runs":   len(warm),
+            },
+            "refresh_ms":  round(refresh, 1),
+            "http":        {"cold": cold_http, "warm": warm_http, "refresh": refresh_http},
+            "sends_total": _delta(server.snapshot(), start).get("greenapi.send", 0),
+            "rss_mb":      round(rss_mb(), 1),
+            "rss_delta_mb": round(rss_mb() - rss_before, 1),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "elements":    len(at.markdown),
+        }
+    finally:
+        os.chdir(args.start_dir)      # a failed size must not leave the rest of the run in its temp dir
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def startup_child(args) -> dict:
+    """One cold start, run inside a fresh interpreter by bench_startup()."""
+    started = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    imported = (time.perf_counter() - started) * 1000
+
+    at = AppTest.from_file(str(args.app), default_timeout=args.timeout)
+    first, _ = _timed_run(at)
+    loaded   = [m for m in HEAVY_MODULES if m in sys.modules]
+    from stockwatch.metrics import METRICS       # the app's own spans for that first run
+    stages   = {k: round(v["last_ms"], 1) for k, v in sorted(METRICS.stages().items())}
+    reruns   = [_timed_run(at)[0] for _ in range(args.reruns)]
+    return {
+        "import_ms":   round(imported, 1),
+        "first_ms":    round(first, 1),
+        "rerun_ms":    round(statistics.median(reruns), 1) if reruns else None,
+        "total_ms":    round((time.perf_counter() - started) * 1000, 1),
+        "loaded":      loaded,
+        "stages":      stages,
+        "rss_mb":      round(rss_mb(), 1),
+    }
+
+
+def bench_startup(args) -> dict:
+    """Run `args.startup` cold starts, each in a new process and a fresh working directory."""
+    runs = []
+    for _ in range(args.startup):
+        workdir = tempfile.mkdtemp(prefix="stockwatch-startup-")
+        with open(os.path.join(workdir, "stockwatch_config.json"), "w") as f:
+            json.dump(bench_config(args.sizes[0], args.recipients, args.concurrency), f)
+        cmd  = [sys.executable, "-m", "stockwatch.bench", "--startup-child", "--app", str(args.app),
+                "--reruns", str(args.reruns), "--timeout", str(args.timeout)]
+        env  = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(args.app.parent),
+                                                                           os.environ.get("PYTHONPATH")]))}
+        proc = subprocess.run(cmd, cwd=workdir, env=env, capture_output=True, text=True)
+        shutil.rmtree(workdir, ignore_errors=True)
+        if proc.returncode:
+            raise RuntimeError(f"startup run failed:\n{proc.stderr[-2000:]}")
+        runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    median = {k: round(statistics.median(r[k] for r in runs), 1)
+              for k in ("import_ms", "first_ms", "rerun_ms", "total_ms", "rss_mb") if runs[0][k] is not None}
+    return {"size": args.sizes[0], "runs": runs, "median": median}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes",       type=int, nargs="+", default=DEFAULT_SIZES, help="watchlist sizes to run")
+    ap.add_argument("--recipients",  type=int,   default=3,   help="WhatsApp recipients in the config")
+    ap.add_argument("--reruns",      type=int,   default=5,   help="warm reruns per size")
+    ap.add_argument("--concurrency", type=int,   default=8,   help="fetch_concurrency in the config")
+    ap.add_argument("--latency",     type=float, default=30,  help="mock API mean latency (ms)")
+    ap.add_argument("--jitter",      type=float, default=10,  help="mock API latency std-dev (ms)")
+    ap.add_argument("--error-rate",  type=float, default=0.0, help="fraction of mock requests failing with 500")
+    ap.add_argument("--rate-limit",  type=float, default=0.0, help="fraction of mock requests failing with 429")
+    ap.add_argument("--timeout",     type=float, default=600, help="AppTest timeout per run (s)")
+    ap.add_argument("--app",         type=Path,  default=APP_PATH)
+    ap.add_argument("--out",         type=Path,  default=Path("bench_results.json"))
+    ap.add_argument("--startup",     type=int,   default=0,
+                    help="measure N cold starts in fresh processes (first --sizes entry) instead of the sweep")
+    ap.add_argument("--startup-child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    args.app       = args.app.resolve()
+    args.out       = args.out.resolve()
+    args.start_dir = os.getcwd()
+    if args.startup_child:
+        print(json.dumps(startup_child(args)))
+        return
+
+    server, url = start_background(latency_ms=args.latency, jitter_ms=args.jitter,
+                                   error_rate=args.error_rate, rate_limit_rate=args.rate_limit)
+    # Read by stockwatch.quotes / stockwatch.whatsapp at import, i.e. on the first AppTest run
+    os.environ["STOCKWATCH_FINNHUB_BASE"]  = f"{url}/api/v1"
+    os.environ["STOCKWATCH_GREENAPI_BASE"] = url
+    sys.path.insert(0, str(args.app.parent))
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=args.app.parent,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    import streamlit
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit":    commit,
+            "python":    platform.python_version(),
+            "streamlit": streamlit.__version__,
+            "platform":  platform.platform(),
+            "args":      {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items() if k != "start_dir"},
+        },
+        "results": [],
+    }
+
+    if args.startup:
+        report["startup"] = startup = bench_startup(args)
+        print(f"{'run':>4} {'import ms':>10} {'first ms':>9} {'rerun ms':>9} {'total ms':>9}  loaded")
+        for i, r in enumerate(startup["runs"]):
+            print(f"{i:>4} {r['import_ms']:>10.0f} {r['first_ms']:>9.0f} {r['rerun_ms'] or 0:>9.0f} "
+                  f"{r['total_ms']:>9.0f}  {', '.join(r['loaded']) or '-'}")
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        server.shutdown()
+        print(f"results written to {args.out}")
+        return
+
+    print(f"{'size':>6} {'cold ms':>9} {'warm ms':>9} {'refresh ms':>11} {'quotes':>7} {'sends':>6} {'rss MB':>7}")
+    for size in args.sizes:
+        r = bench_size(size, args, server)
+        report["results"].append(r)
+        print(f"{size:>6} {r['cold_ms']:>9.0f} {r['warm_ms']['median'] or 0:>9.0f} {r['refresh_ms']:>11.0f} "
+              f"{r['http']['cold'].get('finnhub.quote', 0):>7} {r['sends_total']:>6} {r['rss_mb']:>7.0f}")
+        with open(args.out, "w") as f:   # rewritten after every size so a crash keeps partial results
+            json.dump(report, f, indent=2)
+    server.shutdown()
+    print(f"results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+On-disk candle cache with tail-only backfill.
+
+CandleStore keeps each symbol's bars at each resolution in their own .npy
+file under CANDLE_DIR (<symbol>/<resolution>.npy): an (n, 6) float64 array of
+t, o, h, l, c, v sorted by bar open time. Files are read back memory-mapped,
+so a multi-day chart or a rolling-window lookup touches only the pages it
+needs. backfill() asks the provider only for bars from the last stored one
+on (that bar may have been unfinished), so a symbol's history is downloaded
+once when it is added and topped up afterwards.
+
+CandleBackfiller runs those backfills on one daemon thread: request() queues
+the symbols that are new or due and returns at once. Calls to a metered
+provider take a token from the quote scheduler's bucket, so backfill shares
+the API budget with quotes, but never more than BUDGET_SHARE of it. A 401 or
+403 (Finnhub's free tier has no candle access) turns backfill off for that
+provider instead of retrying every symbol forever.
+"""
+
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from stockwatch.metrics import METRICS
+from stockwatch.ratelimit import TokenBucket
+
+CANDLE_DIR  = Path("stockwatch_candles")
+RESOLUTIONS = {          # Finnhub resolution -> (bar seconds, days kept)
+    "5": (300, 5),
+    "D": (86400, 365),
+}
+COLUMNS     = ("t", "o", "h", "l", "c", "v")
+ERROR_RETRY  = 600       # seconds before retrying a symbol whose backfill failed
+BUDGET_WAIT  = 30        # seconds a backfill waits for an API token before giving way to quotes
+BUDGET_SHARE = 0.1       # most of a metered provider's call budget backfill may use
+REFRESH_MIN  = 900       # seconds between top-ups of one series, however short its bars
+
+log = logging.getLogger("stockwatch.candles")
+
+_EMPTY = np.empty((0, len(COLUMNS)))
+
+
+class CandleFetchError(RuntimeError):
+    """The provider refused or failed a candle request; `status` is its HTTP status if it answered."""
+
+    def __init__(self, message: str, status: int | None = None, retry_after: float = 0.0):
+        super().__init__(message)
+        self.status      = status
+        self.retry_after = retry_after
+
+
+def _dirname(symbol: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]", "_", symbol)
+
+
+class CandleStore:
+    """Per-symbol, per-resolution candle files, memory-mapped on read."""
+
+    def __init__(self, root: Path = CANDLE_DIR):
+        self.root  = Path(root).resolve()   # writes happen on a background thread, after any chdir
+        self._lock = threading.Lock()
+        self._maps = {}    # (symbol, resolution) -> (file mtime_ns, memmap)
+
+    def path(self, symbol: str, resolution: str) -> Path:
+        return self.root / _dirname(symbol) / f"{resolution}.npy"
+
+    # ── Reads ─────────────────────────────────────────────────────────────────
+    def load(self, symbol: str, resolution: str) -> np.ndarray:
+        """Stored bars, memory-mapped read-only; an empty (0, 6) array if there are none."""
+        path = self.path(symbol, resolution)
+        try:
+            stamp = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return _EMPTY
+        key = (symbol, resolution)
+        with self._lock:
+            hit = self._maps.get(key)
+            if hit is not None and hit[0] == stamp:
+                return hit[1]
+        bars = np.load(path, mmap_mode="r")
+        with self._lock:
+            self._maps[key] = (stamp, bars)
+        return bars
+
+    def closes(self, symbols, resolution: str, start: float) -> pd.DataFrame | None:
+        """Close per bar (time index × symbol) from `start` on, or None if no symbol has bars there."""
+        series = {}
+        for sym in symbols:
+            bars = self.load(sym, resolution)
+            bars = bars[int(np.searchsorted(bars[:, 0], start)):]
+            if len(bars):
+                series[sym] = pd.Series(bars[:, 4], index=pd.to_datetime(bars[:, 0], unit="s"))
+        if not series:
+            return None
+        df = pd.DataFrame(series).ffill()
+        df.index.name = "time"
+        return df
+
+    def price_at(self, symbol: str, t: float) -> float:
+        """Close of the last bar finished by `t`, intraday bars before daily ones; NaN if none."""
+        for resolution, (step, _) in RESOLUTIONS.items():
+            bars = self.load(symbol, resolution)
+            i    = int(np.searchsorted(bars[:, 0], t - step, side="right")) - 1   # opened a full bar before t
+            if i >= 0:
+                return float(bars[i, 4])
+        return float("nan")
+
+    def backed_prices_at(self, prices_at):
+        """
+        A prices_at(symbols, times) that asks `prices_at` (e.g. the in-memory
+        rings) first and looks up only the pairs it has nothing for in the
+        candles: one searchsorted per symbol and resolution, as price_at() does.
+        """
+        def lookup(symbols: list, times) -> np.ndarray:
+            times   = np.asarray(times, dtype=np.float64)
+            prices  = prices_at(symbols, times)
+            missing = defaultdict(list)     # symbol -> positions the rings had no price for
+            for i in np.flatnonzero(np.isnan(prices)).tolist():
+                missing[symbols[i]].append(i)
+            for sym, idx in missing.items():
+                idx = np.asarray(idx)
+                for resolution, (step, _) in RESOLUTIONS.items():
+                    bars  = self.load(sym, resolution)
+                    j     = np.searchsorted(bars[:, 0], times[idx] - step, side="right") - 1
+                    found = j >= 0
+                    prices[idx[found]] = bars[j[found], 4]
+                    idx   = idx[~found]
+                    if not len(idx):
+                        break
+            return prices
+        return lookup
+
+    # ── Writes ────────────────────────────────────────────────────────────────
+    def backfill(self, symbol: str, resolution: str, candles, now: float | None = None) -> int:
+        """
+        Fetch the missing tail with `candles(symbol, resolution, start, end)`
+        (a provider's candles()) and merge it in. Returns the number of bars
+        fetched; raises CandleFetchError if the provider returned an error.
+        """
+        step, days = RESOLUTIONS[resolution]
+        now    = time.time() if now is None else now
+        oldest = now - days * 86400
+        stored = self.load(symbol, resolution)
+        start  = max(oldest, stored[-1, 0]) if len(stored) else oldest
+        data   = candles(symbol, resolution, int(start), int(now))
+        if "error" in data:
+            raise CandleFetchError(data["error"], data.get("status"), data.get("retry_after") or 0.0)
+        fresh = (np.column_stack([np.asarray(data[k], dtype=np.float64) for k in COLUMNS])
+                 if data.get("s") == "ok" and data.get("t") else _EMPTY)
+        if len(fresh):
+            fresh = fresh[np.argsort(fresh[:, 0], kind="stable")]
+            kept  = stored[(stored[:, 0] >= oldest) & (stored[:, 0] < fresh[0, 0])]
+            self._write(symbol, resolution, np.concatenate([kept, fresh]))
+        return len(fresh)
+
+    def _write(self, symbol: str, resolution: str, bars: np.ndarray) -> None:
+        """Replace the file atomically (temp file + rename); open memmaps keep reading the old one."""
+        path = self.path(symbol, resolution)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.ascontiguousarray(bars))
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def nbytes(self) -> int:
+        """Size of every candle file on disk."""
+        return sum(p.stat().st_size for p in self.root.glob("*/*.npy"))
+
+
+class CandleBackfiller:
+    """
+    Background backfill for a CandleStore. Each (symbol, resolution) is
+    fetched when first requested and topped up every REFRESH_MIN seconds to
+    an hour; failures are retried after ERROR_RETRY. Other client errors are
+    not retried, and a 401/403 disables backfill for the provider.
+    """
+
+    def __init__(self, store: CandleStore):
+        self.store    = store
+        self._lock    = threading.Lock()
+        self._wake    = threading.Event()
+        self._idle    = threading.Event()
+        self._queue   = {}    # (symbol, resolution) -> QuoteScheduler to fetch through
+        self._due     = {}    # (symbol, resolution) -> time.time() of the next check
+        self.fetched  = 0     # bars downloaded
+        self.calls    = 0     # provider calls made
+        self.errors   = {}    # symbol -> last error
+        self.denied   = {}    # provider label -> why it refused candle requests
+        self._bucket  = TokenBucket(1.0, 1)   # backfill's share of the quote budget; rate set per call
+        self._idle.set()
+        threading.Thread(target=self._run, name="candle-backfill", daemon=True).start()
+
+    def request(self, symbols, scheduler) -> int:
+        """Queue every symbol whose bars are missing or due, via `scheduler`. Returns how many were queued."""
+        now    = time.time()
+        queued = 0
+        with self._lock:
+            if scheduler.provider.label in self.denied:
+                return 0
+            for sym in symbols:
+                for resolution in RESOLUTIONS:
+                    key = (sym, resolution)
+                    if key not in self._queue and self._due.get(key, 0.0) <= now:
+                        self._queue[key] = scheduler
+                        queued += 1
+            if queued:
+                self._idle.clear()
+        if queued:
+            self._wake.set()
+        return queued
+
+    def join(self, timeout: float | None = None) -> bool:
+        """Wait until the queue is empty. False on timeout."""
+        return self._idle.wait(timeout)
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            while True:
+                with self._lock:
+                    if not self._queue:
+                        self._idle.set()
+                        break
+                    key, scheduler = next(iter(self._queue.items()))
+                self._backfill(key, scheduler)
+                with self._lock:
+                    del self._queue[key]
+
+    def _backfill(self, key: tuple, scheduler) -> None:
+        symbol, resolution = key
+        provider = scheduler.provider
+        step     = RESOLUTIONS[resolution][0]
+        with self._lock:
+            if provider.label in self.denied:
+                return
+        if provider.metered:
+            self._bucket.rate = scheduler.bucket.rate * BUDGET_SHARE
+            if not (self._bucket.acquire(timeout=BUDGET_WAIT) and scheduler.bucket.acquire(timeout=BUDGET_WAIT)):
+                with self._lock:
+                    self._due[key] = time.time() + BUDGET_WAIT     # over its share, or quotes need the budget
+                return
+        try:
+            added = self.store.backfill(symbol, resolution, provider.candles)
+        except Exception as e:
+            self._failed(key, scheduler, e)
+            return
+        METRICS.inc("stockwatch_candle_fetches_total", result="ok")
+        with self._lock:
+            self.calls   += 1
+            self.fetched += added
+            self.errors.pop(symbol, None)
+            self._due[key] = time.time() + min(max(step, REFRESH_MIN), 3600)
+
+    def _failed(self, key: tuple, scheduler, error: Exception) -> None:
+        symbol, resolution = key
+        status = getattr(error, "status", None)
+        METRICS.inc("stockwatch_candle_fetches_total", result="error")
+        with self._lock:
+            self.calls        += 1
+            self.errors[symbol] = str(error)
+            if status in (401, 403):
+                # The plan has no candle access: asking again for every symbol only burns budget
+                self.denied[scheduler.provider.label] = str(error)
+                self._due[key] = time.time() + ERROR_RETRY
+            elif status == 429:
+                scheduler.bucket.pause(error.retry_after or 60)
+                self._due[key] = time.time() + BUDGET_WAIT
+            elif status is not None:
+                self._due[key] = float("inf")     # the request itself is bad; repeating it won't help
+            else:
+                self._due[key] = time.time() + ERROR_RETRY
+        if status in (401, 403):
+            log.warning("candle backfill disabled for %s: %s", scheduler.provider.label, error)
+        else:
+            log.warning("candle backfill %s/%s failed: %s", symbol, resolution, error)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": len(self._queue), "calls": self.calls, "bars": self.fetched,
+                    "errors": len(self.errors), "denied": dict(self.denied)}
@@ -0,0 +1,138 @@
+"""
+Incrementally maintained price-history frame for the dashboard chart.
+
+HistoryChart keeps a fixed number of time buckets (`points`) per symbol for
+one window, aligned to absolute time so they are stable across reruns. Each
+update reads only the ticks newer than what it has already seen (from the
+in-memory rings or the tick store), drops them into their buckets, and
+retires buckets that slide out of the window. Building the chart frame then
+costs O(points × symbols) however much history has accumulated, and the
+chart payload sent to the browser is bounded the same way.
+"""
+
+import math
+import threading
+
+import numpy as np
+import pandas as pd
+
+POINTS = 1200    # buckets per window: the chart's time resolution
+
+
+class HistoryChart:
+    """Bucketed last-price history for a fixed set of symbols over a sliding window."""
+
+    def __init__(self, symbols, window: float, points: int = POINTS):
+        self.symbols = list(symbols)
+        self.window  = float(window)
+        self.points  = int(points)
+        self.width   = self.window / self.points           # seconds per bucket
+        self._col    = {s: i for i, s in enumerate(self.symbols)}
+        self._lock   = threading.Lock()
+        self._last   = np.full((self.points, len(self.symbols)), np.nan)   # last price per bucket, circular
+        self._count  = np.zeros(self.points, dtype=np.int64)               # ticks per bucket
+        self._carry  = np.full(len(self.symbols), np.nan)  # last price before the window, for forward-fill
+        self._seen   = np.full(len(self.symbols), -np.inf)  # newest tick time ingested per symbol
+        self._head   = None                                 # newest bucket id in the window
+        self.added   = 0                                    # ticks ingested by the last update
+
+    # ── Maintenance ───────────────────────────────────────────────────────────
+    def _advance(self, now: float) -> None:
+        """Slide the window so its newest bucket contains `now`, folding expired buckets into the carry."""
+        head = math.floor(now / self.width)
+        if self._head is None:
+            self._head = head
+            return
+        # Buckets leaving the window, oldest first; after a long gap that is every stored bucket
+        for b in range(self._head - self.points + 1, min(head - self.points + 1, self._head + 1)):
+            row = self._last[b % self.points]
+            np.copyto(self._carry, row, where=~np.isnan(row))
+            row.fill(np.nan)
+            self._count[b % self.points] = 0
+        self._head = max(self._head, head)
+
+    def _ingest(self, cols: np.ndarray, t: np.ndarray, p: np.ndarray) -> int:
+        """Add ticks (column index, time, price); ticks not newer than a symbol's last one are ignored."""
+        keep = t > self._seen[cols]
+        cols, t, p = cols[keep], t[keep], p[keep]
+        if not len(t):
+            return 0
+        order      = np.lexsort((t, cols))                  # by symbol, then time
+        cols, t, p = cols[order], t[order], p[order]
+        np.maximum.at(self._seen, cols, t)
+        buckets = np.minimum(np.floor(t / self.width).astype(np.int64), self._head)   # clock skew: clamp to now
+        early   = buckets < self._head - self.points + 1
+        if early.any():                                     # before the window: only the carry matters
+            c, q = cols[early], p[early]
+            last = _last_of_each(c)
+            self._carry[c[last]] = q[last]
+        inside = ~early
+        slot   = buckets[inside] % self.points
+        c, q   = cols[inside], p[inside]
+        np.add.at(self._count, slot, 1)
+        last   = _last_of_each(slot * len(self.symbols) + c)
+        self._last[slot[last], c[last]] = q[last]
+        return len(t)
+
+    def update_from_rings(self, rings, now: float) -> int:
+        """Ingest whatever the rings hold past each symbol's watermark. Returns ticks added."""
+        with self._lock:
+            self._advance(now)
+            start  = (self._head - self.points + 1) * self.width
+            chunks = []
+            for sym, i in self._col.items():
+                if sym not in rings:
+                    continue
+                if np.isinf(self._seen[i]) and np.isnan(self._carry[i]):
+                    self._carry[i] = rings.price_at(sym, start)   # seed forward-fill on first read
+                t, p = rings.since(sym, max(self._seen[i], start))
+                if len(t):
+                    chunks.append((np.full(len(t), i), t, p))
+            self.added = self._ingest(*map(np.concatenate, zip(*chunks))) if chunks else 0
+            return self.added
+
+    def update_from_store(self, store, now: float) -> int:
+        """Ingest ticks from a TickStore past each symbol's watermark. Returns ticks added."""
+        with self._lock:
+            self._advance(now)
+            start = (self._head - self.points + 1) * self.width
+            rows  = store.since_many({s: max(self._seen[i], start) for s, i in self._col.items()})
+            if rows:
+                syms, t, p = zip(*rows)
+                cols       = np.fromiter((self._col[s] for s in syms), dtype=np.int64, count=len(syms))
+                self.added = self._ingest(cols, np.asarray(t, dtype=np.float64), np.asarray(p, dtype=np.float64))
+            else:
+                self.added = 0
+            return self.added
+
+    # ── Reads ─────────────────────────────────────────────────────────────────
+    def frame(self) -> pd.DataFrame | None:
+        """Forward-filled price per bucket (time index × symbol), from the first bucket with data."""
+        with self._lock:
+            if self._head is None:
+                return None
+            ids  = np.arange(self._head - self.points + 1, self._head + 1)
+            vals = np.vstack([self._carry, self._last[ids % self.points]])
+        df = pd.DataFrame(vals, columns=self.symbols).ffill().iloc[1:]
+        df.index = pd.to_datetime(ids * self.width, unit="s")
+        df.index.name = "time"
+        has = df.notna().any(axis=1).to_numpy()
+        return df.iloc[int(has.argmax()):] if has.any() else None
+
+    def ticks(self) -> int:
+        """Ticks that landed in the current window."""
+        with self._lock:
+            return int(self._count.sum())
+
+
+def _last_of_each(keys: np.ndarray) -> np.ndarray:
+    """Index of the last occurrence of every distinct key."""
+    _, first_from_end = np.unique(keys[::-1], return_index=True)
+    return len(keys) - 1 - first_from_end
+
+
+def format_prices(df: pd.DataFrame, decimals: int = 3) -> pd.DataFrame:
+    """Prices as fixed-decimal strings with "—" for gaps, formatted array-wise rather than per cell."""
+    vals = df.to_numpy(dtype=np.float64)
+    text = np.where(np.isnan(vals), "—", np.char.mod(f"%.{decimals}f", vals))
+    return pd.DataFrame(text, index=df.index, columns=df.columns)
@@ -0,0 +1,313 @@
+"""
+Loading and saving stockwatch_config.json.
+
+Every reader in the process shares one ConfigStore per file. It parses the
+file once and re-parses only when its mtime or size changes. That is checked
+at most once a second, so dashboards and the monitor pick up external edits
+without re-reading the file on every rerun. Saves go through a temp file and
+a rename, so a crash mid-write never leaves a truncated config. A file that
+stops parsing or goes missing after a good load leaves the last good config
+in place (with `error` set); defaults are only served before the first save.
+diff_config() and apply_config_changes() let a session fold in only what
+changed on disk (stocks and recipients by key, other settings by value)
+instead of discarding its state.
+
+Each user of a shared deployment can have their own config under
+USERS_DIR/<user>/ (see tenant_config_path()); the default "" user is the
+top-level CONFIG_FILE.
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+CONFIG_FILE = Path("stockwatch_config.json")
+USERS_DIR   = Path("stockwatch_users")      # per-user namespaces: stockwatch_users/<user>/stockwatch_config.json
+
+DEFAULT_CONFIG = {
+    "stocks": [
+        {"symbol": "CSCO",  "name": "Cisco Systems",    "alert_pct": 2.0},
+        {"symbol": "GSK",   "name": "GSK plc",           "alert_pct": 2.0},
+        {"symbol": "GOOGL", "name": "Alphabet (Google)", "alert_pct": 2.0},
+    ],
+    "whatsapp": {
+        "id_instance":    "",   # GREEN API Instance ID
+        "api_token":      "",   # GREEN API Token
+        "recipients":     [],   # [{"name": str, "phone": str}]
+    },
+    "refresh_interval":  60,
+    "fetch_concurrency": 8,     # max simultaneous Finnhub /quote requests
+    "calls_per_minute":  55,    # Finnhub budget (free tier allows 60/min)
+    "history_retention_days": 30,   # ticks older than this are dropped from the history DB
+    "ring_depth":        4096,  # in-memory ticks kept per symbol for charts and rolling rules
+    "candle_backfill":   False, # download and cache intraday/daily candles (needs a Finnhub plan with candle access)
+    "alert_cooldown_mins": 10,  # default gap between alerts for one symbol (per-stock cooldown_mins overrides)
+    "digest_window_secs":  15,  # alerts per recipient within this window go out as one message (0 = off)
+    "watchlist_view":    "auto",  # "cards" | "table" | "auto" (table for large watchlists)
+    "cards_per_page":    30,
+    "streaming": {
+        "enabled": False,       # live trade prices over WebSocket instead of REST polling
+        "url":     "",          # blank = Finnhub; ws://127.0.0.1:8765 for stockwatch.mock_ws
+    },
+    "market_data": {
+        "provider":     "finnhub",   # "finnhub" | "replay" (see stockwatch.providers)
+        "replay_file":  "",          # JSON-lines ticks for the replay provider
+        "replay_speed": 60.0,        # replay clock speed-up over real time
+        "replay_loop":  True,        # start again at the end of the file
+    },
+}
+
+
+def copy_config(cfg: dict) -> dict:
+    """Copy of a config deep enough for a session to edit (stock/recipient dicts hold only scalars)."""
+    wa = cfg["whatsapp"]
+    return {
+        **cfg,
+        "stocks":      [dict(s) for s in cfg["stocks"]],
+        "whatsapp":    {**wa, "recipients": [dict(r) for r in wa.get("recipients", [])]},
+        "streaming":   dict(cfg["streaming"]),
+        "market_data": dict(cfg["market_data"]),
+    }
+
+
+def default_config() -> dict:
+    return copy_config(DEFAULT_CONFIG)
+
+
+def normalise_config(saved: dict) -> dict:
+    """Fill any keys missing from a saved/uploaded config with defaults. Raises ValueError if it is not an object."""
+    if not isinstance(saved, dict):
+        raise ValueError(f"expected a JSON object, got {type(saved).__name__}")
+    return {
+        "stocks":            saved.get("stocks",           DEFAULT_CONFIG["stocks"]),
+        "whatsapp":          {**DEFAULT_CONFIG["whatsapp"], **saved.get("whatsapp", {})},
+        "refresh_interval":  saved.get("refresh_interval", 60),
+        "fetch_concurrency": saved.get("fetch_concurrency", DEFAULT_CONFIG["fetch_concurrency"]),
+        "calls_per_minute":  saved.get("calls_per_minute",  DEFAULT_CONFIG["calls_per_minute"]),
+        "history_retention_days": saved.get("history_retention_days", DEFAULT_CONFIG["history_retention_days"]),
+        "ring_depth":        saved.get("ring_depth",        DEFAULT_CONFIG["ring_depth"]),
+        "candle_backfill":   saved.get("candle_backfill",   DEFAULT_CONFIG["candle_backfill"]),
+        "alert_cooldown_mins": saved.get("alert_cooldown_mins", DEFAULT_CONFIG["alert_cooldown_mins"]),
+        "digest_window_secs":  saved.get("digest_window_secs",  DEFAULT_CONFIG["digest_window_secs"]),
+        "watchlist_view":    saved.get("watchlist_view",    DEFAULT_CONFIG["watchlist_view"]),
+        "cards_per_page":    saved.get("cards_per_page",    DEFAULT_CONFIG["cards_per_page"]),
+        "streaming":         {**DEFAULT_CONFIG["streaming"], **saved.get("streaming", {})},
+        "market_data":       {**DEFAULT_CONFIG["market_data"], **saved.get("market_data", {})},
+    }
+
+
+def load_config(path: Path = CONFIG_FILE) -> dict:
+    """A private, editable copy of the config (served from the shared cache)."""
+    return copy_config(config_store(path).current())
+
+
+def serialise_config(cfg: dict) -> dict:
+    return {
+        "stocks":            cfg["stocks"],
+        "whatsapp":          cfg["whatsapp"],
+        "refresh_interval":  cfg["refresh_interval"],
+        "fetch_concurrency": cfg.get("fetch_concurrency", DEFAULT_CONFIG["fetch_concurrency"]),
+        "calls_per_minute":  cfg.get("calls_per_minute",  DEFAULT_CONFIG["calls_per_minute"]),
+        "history_retention_days": cfg.get("history_retention_days", DEFAULT_CONFIG["history_retention_days"]),
+        "ring_depth":        cfg.get("ring_depth",        DEFAULT_CONFIG["ring_depth"]),
+        "candle_backfill":   cfg.get("candle_backfill",   DEFAULT_CONFIG["candle_backfill"]),
+        "alert_cooldown_mins": cfg.get("alert_cooldown_mins", DEFAULT_CONFIG["alert_cooldown_mins"]),
+        "digest_window_secs":  cfg.get("digest_window_secs",  DEFAULT_CONFIG["digest_window_secs"]),
+        "watchlist_view":    cfg.get("watchlist_view",    DEFAULT_CONFIG["watchlist_view"]),
+        "cards_per_page":    cfg.get("cards_per_page",    DEFAULT_CONFIG["cards_per_page"]),
+        "streaming":         cfg["streaming"],
+        "market_data":       cfg.get("market_data", DEFAULT_CONFIG["market_data"]),
+    }
+
+
+def save_config(cfg: dict, path: Path = CONFIG_FILE):
+    config_store(path).save(cfg)
+
+
+def atomic_write_json(path: Path, data) -> None:
+    """Write JSON to a temp file in the same directory, then rename over `path`."""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent or ".", prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2, default=str)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+# ── Shared, mtime-keyed cache ─────────────────────────────────────────────────
+class ConfigStore:
+    """One config file, parsed once per change and shared read-only by every caller."""
+
+    def __init__(self, path: Path = CONFIG_FILE, check_every: float = 1.0):
+        self.path        = Path(path)
+        self.check_every = check_every
+        self.version     = 0        # bumped whenever the cached config is replaced
+        self.error       = None     # why the last reload failed (the previous config stays in use)
+        self._lock       = threading.Lock()
+        self._stamp      = None     # (mtime_ns, size) of the parsed file, or None if absent
+        self._config     = None
+        self._checked    = float("-inf")
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def snapshot(self) -> tuple[dict, int]:
+        """(config, version). The dict is shared and replaced, never mutated: copy it before editing."""
+        now = time.monotonic()
+        with self._lock:
+            if self._config is None or now - self._checked >= self.check_every:
+                self._checked = now
+                stamp = self._stat()
+                if self._config is None or stamp != self._stamp:
+                    self._reload(stamp)
+            return self._config, self.version
+
+    def current(self) -> dict:
+        return self.snapshot()[0]
+
+    def _reload(self, stamp) -> None:
+        if stamp is None and self._stamp is None:
+            config = default_config()     # never saved yet
+        else:
+            try:
+                if stamp is None:
+                    raise FileNotFoundError("file is missing")
+                with open(self.path) as f:
+                    config = normalise_config(json.load(f))
+            except (OSError, ValueError, TypeError) as e:    # TypeError: a section that is not an object
+                # Usually an editor caught mid-save, or a save that deletes before
+                # it rewrites; keep serving the last good config
+                self.error = f"{self.path}: {e}"
+                if self._config is None:
+                    self._config = default_config()
+                return
+        self._config, self._stamp, self.error = config, stamp, None
+        self.version += 1
+
+    def save(self, cfg: dict) -> None:
+        """Atomically write `cfg` and make it the cached version without re-reading it."""
+        data = serialise_config(cfg)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)    # first save of a new user's config
+            atomic_write_json(self.path, data)
+            self._config  = normalise_config(copy_config(data))
+            self._stamp   = self._stat()
+            self._checked = time.monotonic()
+            self.error    = None
+            self.version += 1
+
+
+_stores      = {}
+_stores_lock = threading.Lock()
+
+
+def config_store(path: Path = CONFIG_FILE) -> ConfigStore:
+    """The process-wide ConfigStore for `path`."""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = ConfigStore(key)
+    return store
+
+
+# ── Per-user namespaces ───────────────────────────────────────────────────────
+_TENANT_RE = re.compile(r"[a-z0-9][a-z0-9_.-]{0,63}")
+
+
+def tenant_name(raw) -> str:
+    """
+    Normalise a user name into a config namespace ("" is the shared default
+    config). Raises ValueError for names that are not safe as a directory.
+    """
+    name = str(raw or "").strip().lower()
+    if name and not _TENANT_RE.fullmatch(name):
+        raise ValueError(f"invalid user name {raw!r}: use letters, digits, '.', '_' or '-' (max 64)")
+    return name
+
+
+def tenant_dir(tenant: str, root: Path = USERS_DIR) -> Path:
+    return Path(root) / tenant_name(tenant)
+
+
+def tenant_config_path(tenant: str, root: Path = USERS_DIR) -> Path:
+    """Config file for `tenant`; the shared CONFIG_FILE for the default ("") tenant."""
+    return tenant_dir(tenant, root) / CONFIG_FILE.name if tenant else CONFIG_FILE
+
+
+def list_tenants(root: Path = USERS_DIR) -> list[str]:
+    """Users with a saved config under `root`, sorted."""
+    try:
+        entries = sorted(os.scandir(root), key=lambda e: e.name)
+    except FileNotFoundError:
+        return []
+    return [e.name for e in entries
+            if e.is_dir() and _TENANT_RE.fullmatch(e.name) and os.path.isfile(os.path.join(e.path, CONFIG_FILE.name))]
+
+
+# ── Incremental changes ───────────────────────────────────────────────────────
+def _keyed_diff(old: list, new: list, key: str) -> dict:
+    before = {item[key]: item for item in old}
+    after  = {item[key]: item for item in new}
+    return {
+        "added":   [item for k, item in after.items() if k not in before],
+        "removed": [k for k in before if k not in after],
+        "changed": [item for k, item in after.items() if k in before and before[k] != item],
+    }
+
+
+def diff_config(old: dict, new: dict) -> dict:
+    """
+    What changed between two configs: {"stocks": {added, removed, changed},
+    "recipients": {added, removed, changed}, "settings": {name: new value}}.
+    Stocks are keyed by symbol, recipients by phone; settings names are
+    top-level keys or "whatsapp.<key>".
+    """
+    settings = {k: v for k, v in new.items() if k not in ("stocks", "whatsapp") and old.get(k) != v}
+    for k, v in new["whatsapp"].items():
+        if k != "recipients" and old["whatsapp"].get(k) != v:
+            settings[f"whatsapp.{k}"] = v
+    return {
+        "stocks":     _keyed_diff(old["stocks"], new["stocks"], "symbol"),
+        "recipients": _keyed_diff(old["whatsapp"].get("recipients", []),
+                                  new["whatsapp"].get("recipients", []), "phone"),
+        "settings":   settings,
+    }
+
+
+def apply_config_changes(cfg: dict, changes: dict) -> None:
+    """Apply a diff_config() result to `cfg` in place, leaving everything it doesn't mention alone."""
+    for items, key, diff in ((cfg["stocks"], "symbol", changes["stocks"]),
+                             (cfg["whatsapp"].setdefault("recipients", []), "phone", changes["recipients"])):
+        gone    = set(diff["removed"])
+        updated = {item[key]: item for item in diff["changed"]}
+        items[:] = [dict(updated.get(item[key], item)) for item in items if item[key] not in gone]
+        present = {item[key] for item in items}
+        items.extend(dict(item) for item in diff["added"] + diff["changed"] if item[key] not in present)
+    for name, value in changes["settings"].items():
+        section, _, key = name.rpartition(".")
+        target = cfg[section] if section else cfg
+        target[key] = dict(value) if isinstance(value, dict) else value
+
+
+def describe_changes(changes: dict) -> str:
+    """Short human summary of a diff_config() result, or "" if nothing changed."""
+    parts = []
+    for label, key in (("stock", "symbol"), ("recipient", "name")):
+        diff = changes[label + "s"]
+        parts += [f"+{item.get(key, item.get('phone'))}" for item in diff["added"]]
+        parts += [f"−{k}" for k in diff["removed"]]
+        parts += [f"~{item.get(key, item.get('phone'))}" for item in diff["changed"]]
+    parts += list(changes["settings"])
+    return ", ".join(parts)
@@ -0,0 +1,134 @@
+"""
+Alert cooldowns shared by every dashboard session and the headless monitor.
+
+The last alert time per symbol lives in a SQLite table (by default in the
+outbox database), so three open tabs plus a monitor still send each alert
+once. `claim()` is an atomic check-and-set: a single UPSERT only moves a
+symbol's timestamp forward if its cooldown has elapsed, so when several
+sessions see the same breach in the same instant exactly one of them wins.
+The winning alerts are stored with the claim, which lets every other session
+display what was sent. Cooldowns are kept per user (tenant), so two users
+watching the same symbol are each alerted on their own schedule.
+"""
+
+import copy
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from stockwatch.outbox import OUTBOX_DB
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS alert_cooldowns (
+    tenant   TEXT NOT NULL DEFAULT '',   -- user namespace ('' = the shared default config)
+    symbol   TEXT NOT NULL,
+    last_ts  REAL NOT NULL,     -- unix seconds of the last alert sent for this symbol
+    alerts   TEXT NOT NULL,     -- JSON list of the alert entries sent at last_ts
+    PRIMARY KEY (tenant, symbol)
+) WITHOUT ROWID;
+"""
+
+# Tables from before per-user cooldowns were keyed by symbol alone
+_MIGRATE = """
+ALTER TABLE alert_cooldowns RENAME TO alert_cooldowns_old;
+""" + _SCHEMA + """
+INSERT INTO alert_cooldowns (tenant, symbol, last_ts, alerts)
+    SELECT '', symbol, last_ts, alerts FROM alert_cooldowns_old;
+DROP TABLE alert_cooldowns_old;
+"""
+
+
+class CooldownStore:
+    """Per-symbol alert cooldowns with atomic cross-process check-and-set."""
+
+    def __init__(self, path: Path = OUTBOX_DB, tenant: str = ""):
+        self.path   = Path(path)
+        self.tenant = tenant
+        self._lock  = threading.Lock()
+        self._conn  = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        cols = {row[1] for row in self._conn.execute("PRAGMA table_info(alert_cooldowns)")}
+        if cols and "tenant" not in cols:
+            try:
+                self._conn.executescript("BEGIN IMMEDIATE;" + _MIGRATE + "COMMIT;")
+            except sqlite3.OperationalError:     # another process migrated it first
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+        self._conn.executescript(_SCHEMA)
+
+    def for_tenant(self, tenant: str) -> "CooldownStore":
+        """A view of the same database scoped to another user, sharing this store's connection."""
+        view = copy.copy(self)
+        view.tenant = tenant
+        return view
+
+    def claim(self, candidates: dict, now: float | None = None) -> tuple[set, dict]:
+        """
+        `candidates` maps symbol -> (cooldown seconds, [alert entries]). Claims
+        every symbol whose cooldown has elapsed, in one transaction. Returns
+        (claimed symbols, {unclaimed symbol: rules already sent for it}); the
+        caller sends alerts for the claimed symbols only.
+        """
+        now     = time.time() if now is None else now
+        claimed = set()
+        sent    = {}
+        if not candidates:
+            return claimed, sent
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sym, (cooldown, alerts) in candidates.items():
+                    cur = self._conn.execute(
+                        """INSERT INTO alert_cooldowns (tenant, symbol, last_ts, alerts)
+                           VALUES (:tenant, :sym, :now, :alerts)
+                           ON CONFLICT (tenant, symbol)
+                           DO UPDATE SET last_ts = excluded.last_ts, alerts = excluded.alerts
+                           WHERE excluded.last_ts - alert_cooldowns.last_ts >= :cooldown""",
+                        {"tenant": self.tenant, "sym": sym, "now": now, "alerts": json.dumps(alerts),
+                         "cooldown": cooldown},
+                    )
+                    if cur.rowcount:
+                        claimed.add(sym)
+                    else:
+                        (held,) = self._conn.execute(
+                            "SELECT alerts FROM alert_cooldowns WHERE tenant = ? AND symbol = ?",
+                            (self.tenant, sym)).fetchone()
+                        sent[sym] = {a.get("rule") for a in json.loads(held)}
+            except BaseException:
+                self._conn.execute("ROLLBACK")   # never leave the shared connection mid-transaction
+                raise
+            self._conn.execute("COMMIT")
+        return claimed, sent
+
+    def last_sent(self, symbols=None) -> dict:
+        """symbol -> time of its last alert."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT symbol, last_ts FROM alert_cooldowns WHERE tenant = ?", (self.tenant,)).fetchall()
+        wanted = None if symbols is None else set(symbols)
+        return {s: t for s, t in rows if wanted is None or s in wanted}
+
+    def recent(self, within: float, now: float | None = None) -> list:
+        """Alert entries sent in the last `within` seconds by any session, newest first."""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT alerts FROM alert_cooldowns WHERE tenant = ? AND last_ts >= ? ORDER BY last_ts DESC",
+                (self.tenant, now - within),
+            ).fetchall()
+        return [a for (alerts,) in rows for a in json.loads(alerts)]
+
+    def clear(self, symbols=None) -> None:
+        with self._lock:
+            if symbols is None:
+                self._conn.execute("DELETE FROM alert_cooldowns WHERE tenant = ?", (self.tenant,))
+            else:
+                self._conn.executemany("DELETE FROM alert_cooldowns WHERE tenant = ? AND symbol = ?",
+                                       [(self.tenant, s) for s in symbols])
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
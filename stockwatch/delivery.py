@@ -0,0 +1,328 @@
+"""
+Asynchronous WhatsApp delivery.
+
+DeliveryQueue turns every (message, recipient) pair into a task for a small
+pool of worker threads, so sending never blocks a dashboard rerun or a monitor
+cycle. Sends to different recipients run concurrently, every send takes a
+token from one shared bucket sized to GREEN API's request limits, and
+transient failures (network errors, HTTP 429, 5xx) are retried with
+exponential backoff. Final outcomes are reported through `on_receipt`.
+
+With an Outbox attached, messages are recorded on disk before they are queued
+and every outcome is marked there, so `replay()` can pick up whatever a
+crashed or restarted process left undelivered. While a delivery is queued
+here its outbox lease is kept renewed, so neither a replay in this process
+nor another process claims it a second time. With an InstanceStateMonitor
+attached, nothing is sent while the instance is known to be unauthorised:
+new messages are parked in the outbox and replayed once it can send again.
+
+DigestCoalescer sits in front of the queue and folds the alerts for each
+recipient that arrive within a short window into one message.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from stockwatch.alerts import build_alert_message
+from stockwatch.metrics import METRICS
+from stockwatch.ratelimit import TokenBucket
+from stockwatch.whatsapp import can_send, get_green_api_client, send_one
+
+SENDS_PER_SECOND = 2      # shared by all workers; GREEN API answers 429 above its per-instance limit
+SEND_BURST       = 5
+MAX_ATTEMPTS     = 5
+BASE_DELAY       = 2.0    # seconds before the first retry, doubled on every further attempt
+MAX_DELAY        = 60.0
+REPLAY_EVERY     = 60     # seconds between outbox scans for abandoned deliveries
+DIGEST_WINDOW    = 15     # seconds alerts for one recipient are collected into a single message
+
+log = logging.getLogger("stockwatch.delivery")
+
+
+class _Task:
+    """One message to one recipient, carried across retries."""
+
+    __slots__ = ("client", "wa", "name", "phone", "message", "on_receipt", "outbox_id", "attempts")
+
+    def __init__(self, client, name: str, phone: str, message: str, on_receipt, outbox_id: int | None = None,
+                 wa: dict | None = None):
+        self.client     = client     # GreenAPI client, created on the first attempt if None
+        self.wa         = wa
+        self.name       = name
+        self.phone      = phone
+        self.message    = message
+        self.on_receipt = on_receipt
+        self.outbox_id  = outbox_id
+        self.attempts   = 0
+
+
+class DeliveryQueue:
+    """Background worker pool for GREEN API sends with rate limiting and retry/backoff."""
+
+    def __init__(self, workers: int = 4, sends_per_second: float = SENDS_PER_SECOND, burst: float = SEND_BURST,
+                 max_attempts: int = MAX_ATTEMPTS, base_delay: float = BASE_DELAY, send=send_one,
+                 outbox=None, state=None):
+        self.bucket       = TokenBucket(sends_per_second, burst)
+        self.outbox       = outbox
+        self.state        = state
+        self.max_attempts = max_attempts
+        self.base_delay   = base_delay
+        self._send        = send
+        self._replayed    = {}          # id_instance -> monotonic time of its last replay scan
+        self._cond        = threading.Condition()
+        self._heap        = []          # (due monotonic time, seq, task)
+        self._seq         = itertools.count()
+        self._in_flight   = 0
+        self._held        = set()       # (outbox id, phone) of every queued or in-flight delivery
+        self._renewed     = time.monotonic()   # last lease renewal of everything held
+        self._counts      = {"sent": 0, "failed": 0, "retries": 0}
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"wa-delivery-{i}", daemon=True).start()
+
+    # ── Producer side ─────────────────────────────────────────────────────────
+    def enqueue(self, message: str, recipients: list, wa: dict, on_receipt=None) -> int:
+        """
+        Queue `message` for every recipient and return at once with the number
+        of sends queued. `on_receipt(name, phone, ok, error)` is called from a
+        worker thread when each send finally succeeds or gives up.
+        """
+        return self.enqueue_many([message], recipients, wa, on_receipt)
+
+    def enqueue_many(self, messages: list, recipients: list, wa: dict, on_receipt=None) -> int:
+        """enqueue() for several messages, journaled to the outbox in a single transaction."""
+        if not can_send(wa):
+            for message in messages:
+                for rec in recipients:
+                    self._receipt(_Task(None, rec["name"], rec["phone"], message, on_receipt), False,
+                                  "Client not configured")
+            return 0
+        ids = (self.outbox.record(messages, recipients, wa.get("id_instance", "")) if self.outbox
+               else [None] * len(messages))
+        if not self._sendable(wa):
+            # Fail fast instead of timing out per recipient; with an outbox the
+            # deliveries stay pending and replay() sends them once authorised
+            held = "held in outbox" if self.outbox else "not sent"
+            for message in messages:
+                for rec in recipients:
+                    self._receipt(_Task(None, rec["name"], rec["phone"], message, on_receipt), False,
+                                  f"instance {self.state.state(wa)[0]} — {held}")
+            return 0
+        # The client (and the SDK import behind it) is created by a worker on first send
+        tasks = [_Task(None, rec["name"], rec["phone"], message, on_receipt, mid, wa)
+                 for message, mid in zip(messages, ids) for rec in recipients]
+        self._submit(tasks)
+        return len(tasks)
+
+    def replay(self, wa: dict, on_receipt=None, force: bool = False) -> int:
+        """
+        Re-queue outbox deliveries from `wa`'s instance left pending by a
+        crashed or restarted process (or by exhausted retries). Scans at most every REPLAY_EVERY
+        seconds unless forced. Returns the number of sends re-queued.
+        """
+        instance = wa.get("id_instance", "")
+        last     = self._replayed.get(instance, float("-inf"))
+        if self.outbox is None or (not force and time.monotonic() - last < REPLAY_EVERY):
+            return 0
+        if not can_send(wa) or not self._sendable(wa):
+            return 0
+        self._replayed[instance] = time.monotonic()
+        self._renew_leases(force=True)
+        with self._cond:
+            held = set(self._held)
+        tasks = [_Task(None, name, phone, body, on_receipt, mid, wa)
+                 for mid, body, name, phone in self.outbox.claim_pending(instance=instance, skip=held)]
+        if tasks:
+            log.info("replaying %d undelivered alert(s) from the outbox", len(tasks))
+            self._submit(tasks)
+        return len(tasks)
+
+    def _sendable(self, wa: dict | None) -> bool:
+        return self.state is None or wa is None or self.state.sendable(wa)
+
+    def _submit(self, tasks: list) -> None:
+        now = time.monotonic()
+        with self._cond:
+            for task in tasks:
+                if task.outbox_id is not None:
+                    self._held.add((task.outbox_id, task.phone))
+                self._push(now, task)
+            self._cond.notify_all()
+
+    def _renew_leases(self, force: bool = False) -> None:
+        """Extend the outbox lease of every held delivery, at most every half lease unless forced."""
+        if self.outbox is None:
+            return
+        now = time.monotonic()
+        with self._cond:
+            if not force and now - self._renewed < self.outbox.lease / 2:
+                return
+            self._renewed = now
+            held = list(self._held)
+        if held:
+            self.outbox.renew(held)
+
+    def join(self, timeout: float | None = None) -> bool:
+        """Wait until every queued send (including retries) has finished. False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._heap or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"queued": len(self._heap), "in_flight": self._in_flight, **self._counts}
+
+    # ── Workers ───────────────────────────────────────────────────────────────
+    def _push(self, due: float, task: _Task) -> None:
+        heapq.heappush(self._heap, (due, next(self._seq), task))
+
+    def _next(self) -> _Task:
+        with self._cond:
+            while True:
+                wait = None
+                if self._heap:
+                    wait = self._heap[0][0] - time.monotonic()
+                    if wait <= 0:
+                        self._in_flight += 1
+                        return heapq.heappop(self._heap)[2]
+                self._cond.wait(wait)
+
+    def _work(self) -> None:
+        while True:
+            task = self._next()
+            try:
+                self._attempt(task)
+            except Exception:
+                log.exception("delivery to %s failed unexpectedly", task.phone)
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    self._cond.notify_all()
+
+    def _attempt(self, task: _Task) -> None:
+        if not self._sendable(task.wa):
+            # De-authorised while queued: leave it pending in the outbox for replay
+            self._receipt(task, False, f"instance {self.state.state(task.wa)[0]}", retryable=True)
+            return
+        if self.outbox is not None and task.outbox_id is not None:
+            self.outbox.renew([(task.outbox_id, task.phone)])
+        self._renew_leases()      # a backlog draining at the send rate can outlast one lease
+        self.bucket.acquire(timeout=float("inf"))
+        if task.client is None:
+            task.client = get_green_api_client(task.wa)
+        ok, err, retryable = self._send(task.client, task.phone, task.message)
+        task.attempts += 1
+        if not ok and retryable and task.attempts < self.max_attempts:
+            delay = min(MAX_DELAY, self.base_delay * 2 ** (task.attempts - 1))
+            if err == "HTTP 429":
+                self.bucket.pause(delay)   # every worker backs off, not just this one
+            log.info("send to %s failed (%s), retry %d in %.0fs", task.phone, err, task.attempts, delay)
+            METRICS.inc("stockwatch_sends_total", result="retry")
+            if self.outbox is not None and task.outbox_id is not None:
+                self.outbox.renew([(task.outbox_id, task.phone)], extra=delay)
+            with self._cond:
+                self._counts["retries"] += 1
+                self._push(time.monotonic() + delay, task)
+                self._cond.notify()
+            return
+        self._receipt(task, ok, err, retryable)
+
+    def _receipt(self, task: _Task, ok: bool, err: str, retryable: bool = False) -> None:
+        with self._cond:
+            self._counts["sent" if ok else "failed"] += 1
+            self._held.discard((task.outbox_id, task.phone))
+        METRICS.inc("stockwatch_sends_total", result="sent" if ok else "failed")
+        if self.outbox is not None and task.outbox_id is not None:
+            self.outbox.mark(task.outbox_id, task.phone, ok, err, retryable)
+        if task.on_receipt is not None:
+            task.on_receipt(task.name, task.phone, ok, err)
+
+
+class DigestCoalescer:
+    """
+    Per-recipient alert digests in front of a DeliveryQueue.
+
+    The first alert for a recipient opens a `window`-second digest; every
+    alert added before it closes joins the same message, which is sent with
+    build_alert_message. Alerts marked "urgent" skip the window and go out at
+    once. Recipients whose digests close together with identical content
+    share one enqueue_many call, so the outbox records the message once.
+    """
+
+    def __init__(self, queue: DeliveryQueue, window: float = DIGEST_WINDOW):
+        self.queue   = queue
+        self.window  = window
+        self._cond   = threading.Condition()
+        self._open   = {}     # (instance, phone) -> {"due", "recipient", "alerts", "wa", "on_receipt"}
+        self._counts = {"alerts": 0, "messages": 0}
+        threading.Thread(target=self._run, name="wa-digest", daemon=True).start()
+
+    def add(self, alerts: list, recipients: list, wa: dict, on_receipt=None, window: float | None = None) -> None:
+        """Queue `alerts` for every recipient; `window` overrides the default digest window for these."""
+        if not alerts or not recipients:
+            return
+        window = self.window if window is None else window
+        urgent = [a for a in alerts if a.get("urgent")]
+        normal = [a for a in alerts if not a.get("urgent")]
+        with self._cond:
+            self._counts["alerts"] += len(alerts) * len(recipients)
+        if urgent:
+            self._send(urgent, recipients, wa, on_receipt)
+        if not normal:
+            return
+        if window <= 0:
+            self._send(normal, recipients, wa, on_receipt)
+            return
+        now = time.monotonic()
+        with self._cond:
+            for rec in recipients:
+                # Keyed by sending instance too: two users may alert the same phone from different accounts
+                key    = (wa.get("id_instance"), rec["phone"])
+                digest = self._open.setdefault(key, {"due": now + window, "alerts": []})
+                digest.update(recipient=rec, wa=wa, on_receipt=on_receipt)
+                digest["alerts"].extend(normal)
+            self._cond.notify()
+
+    def flush(self, force: bool = False) -> int:
+        """Send every digest whose window has closed (all of them if forced). Returns messages sent."""
+        now = time.monotonic()
+        with self._cond:
+            due = [p for p, d in self._open.items() if force or d["due"] <= now]
+            closed = [self._open.pop(p) for p in due]
+        groups = {}
+        for d in closed:
+            key = (tuple(id(a) for a in d["alerts"]), id(d["wa"]), id(d["on_receipt"]))
+            groups.setdefault(key, []).append(d)
+        for group in groups.values():
+            first = group[0]
+            self._send(first["alerts"], [d["recipient"] for d in group], first["wa"], first["on_receipt"])
+        return len(closed)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {**self._counts, "open": len(self._open)}
+
+    def _send(self, alerts: list, recipients: list, wa: dict, on_receipt) -> None:
+        with self._cond:
+            self._counts["messages"] += len(recipients)
+        self.queue.enqueue_many([build_alert_message(alerts)], recipients, wa, on_receipt)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                wait = min((d["due"] for d in self._open.values()), default=None)
+                if wait is not None:
+                    wait -= time.monotonic()
+                if wait is None or wait > 0:
+                    self._cond.wait(wait)
+            try:
+                self.flush()
+            except Exception:
+                log.exception("digest flush failed")
@@ -0,0 +1,139 @@
+"""
+Persistent price history in an embedded SQLite database.
+
+Every quote tick is appended as (symbol, ts, price). The table is keyed on
+(symbol, ts) and stored WITHOUT ROWID, so range queries by symbol and time are
+a single clustered index scan, and re-polling a quote whose trade timestamp
+hasn't moved is a no-op. WAL mode lets the dashboard and the headless monitor
+read and write the same file concurrently.
+
+Retention: ticks older than `retention_days` are deleted, and ticks older than
+`compact_after_days` are thinned to the last tick per minute per symbol.
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+HISTORY_DB    = Path("stockwatch_history.db")
+COMPACT_EVERY = 3600    # seconds between automatic retention/compaction passes
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ticks (
+    symbol TEXT NOT NULL,
+    ts     REAL NOT NULL,      -- unix seconds of the trade / quote
+    price  REAL NOT NULL,
+    PRIMARY KEY (symbol, ts)
+) WITHOUT ROWID;
+"""
+
+
+class TickStore:
+    """Append-only tick table with indexed range queries and a retention policy."""
+
+    def __init__(self, path: Path = HISTORY_DB, retention_days: float = 30, compact_after_days: float = 1):
+        self.path               = Path(path)
+        self.retention_days     = retention_days
+        self.compact_after_days = compact_after_days
+        self._lock              = threading.Lock()
+        self._last_compact      = 0.0
+        self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    # ── Writes ────────────────────────────────────────────────────────────────
+    def append_many(self, rows) -> int:
+        """Insert (symbol, ts, price) rows in one transaction; duplicates are ignored."""
+        rows = list(rows)
+        if not rows:
+            return 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+            cur = self._conn.executemany("INSERT OR IGNORE INTO ticks VALUES (?, ?, ?)", rows)
+            self._conn.execute("COMMIT")
+        self.maybe_compact()
+        return cur.rowcount
+
+    def record_quotes(self, quotes: dict, now: float | None = None) -> int:
+        """Append the current price of every good quote, stamped with its trade time."""
+        now = time.time() if now is None else now
+        return self.append_many(
+            (sym, float(q.get("t") or now), float(q["c"]))
+            for sym, q in quotes.items()
+            if q.get("c") and "error" not in q
+        )
+
+    # ── Reads ─────────────────────────────────────────────────────────────────
+    def range(self, symbol: str, start: float | None = None, end: float | None = None) -> list:
+        """[(ts, price), ...] for one symbol between start and end (inclusive), oldest first."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT ts, price FROM ticks WHERE symbol = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+                (symbol, start if start is not None else float("-inf"), end if end is not None else float("inf")),
+            ).fetchall()
+
+    def latest(self, symbol: str, n: int) -> list:
+        """The newest `n` (ts, price) ticks for one symbol, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ts, price FROM ticks WHERE symbol = ? ORDER BY ts DESC LIMIT ?", (symbol, n),
+            ).fetchall()
+        return rows[::-1]
+
+    def since_many(self, after: dict) -> list:
+        """[(symbol, ts, price), ...] newer than a per-symbol time, one index seek per symbol."""
+        with self._lock:
+            return [(sym, ts, price) for sym, t0 in after.items() for ts, price in self._conn.execute(
+                "SELECT ts, price FROM ticks WHERE symbol = ? AND ts > ? ORDER BY ts", (sym, t0))]
+
+    def window(self, symbols, start: float, end: float | None = None) -> list:
+        """[(symbol, ts, price), ...] for several symbols in [start, end], oldest first."""
+        symbols = list(symbols)
+        if not symbols:
+            return []
+        marks = ",".join("?" * len(symbols))
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT symbol, ts, price FROM ticks WHERE symbol IN ({marks}) AND ts >= ? AND ts <= ? "
+                f"ORDER BY ts",
+                (*symbols, start, end if end is not None else float("inf")),
+            ).fetchall()
+
+    def symbols(self) -> list:
+        """Every symbol with stored ticks."""
+        with self._lock:
+            return [s for (s,) in self._conn.execute("SELECT DISTINCT symbol FROM ticks ORDER BY symbol")]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM ticks").fetchone()[0]
+
+    # ── Retention / compaction ────────────────────────────────────────────────
+    def maybe_compact(self) -> None:
+        if time.time() - self._last_compact >= COMPACT_EVERY:
+            self.compact()
+
+    def compact(self, now: float | None = None) -> dict:
+        """Apply the retention policy, thin old ticks to one per minute, checkpoint the WAL."""
+        now                = time.time() if now is None else now
+        self._last_compact = now
+        drop_before        = now - self.retention_days * 86400
+        thin_before        = now - self.compact_after_days * 86400
+        with self._lock:
+            self._conn.execute("BEGIN")
+            expired = self._conn.execute("DELETE FROM ticks WHERE ts < ?", (drop_before,)).rowcount
+            thinned = self._conn.execute(
+                """DELETE FROM ticks WHERE ts < :cut AND (symbol, ts) NOT IN (
+                       SELECT symbol, MAX(ts) FROM ticks WHERE ts < :cut
+                       GROUP BY symbol, CAST(ts / 60 AS INTEGER))""",
+                {"cut": thin_before},
+            ).rowcount
+            self._conn.execute("COMMIT")
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return {"expired": expired, "thinned": thinned}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
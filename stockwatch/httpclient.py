@@ -0,0 +1,122 @@
+"""
+Shared keep-alive HTTP client for Finnhub and GREEN API.
+
+Every outbound REST call goes through CLIENT. It keeps one requests.Session
+per host, each with a connection pool sized for the concurrent quote fetch,
+so repeated calls reuse warm TCP/TLS connections instead of handshaking on
+every request. Timeouts are set per named endpoint, and per-host latency and
+connection counts are recorded for the diagnostics views.
+"""
+
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from stockwatch.metrics import METRICS
+
+POOL_SIZE = 32      # connections kept per host; >= the largest fetch_concurrency
+SAMPLES   = 512     # latency samples kept per host for percentiles
+
+DEFAULT_TIMEOUTS = {             # seconds, by endpoint name passed to get()
+    "finnhub.quote":   8,
+    "finnhub.candle":  15,
+    "finnhub.symbols": 60,
+    "greenapi.state":  8,
+    "greenapi.send":   15,
+    "greenapi.qr":     10,
+}
+DEFAULT_TIMEOUT = 10
+
+
+class _HostStats:
+    __slots__ = ("calls", "errors", "total", "samples")
+
+    def __init__(self):
+        self.calls   = 0
+        self.errors  = 0
+        self.total   = 0.0
+        self.samples = deque(maxlen=SAMPLES)
+
+
+class HttpClient:
+    """Per-host pooled sessions with per-endpoint timeouts and latency metrics."""
+
+    def __init__(self, timeouts: dict | None = None, pool_size: int = POOL_SIZE):
+        self.timeouts  = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.pool_size = pool_size
+        self._lock     = threading.Lock()
+        self._sessions = {}    # "scheme://host" -> requests.Session
+        self._adapters = {}    # "scheme://host" -> HTTPAdapter
+        self._stats    = {}    # host -> _HostStats
+
+    def session(self, url: str) -> requests.Session:
+        parts = urlsplit(url)
+        base  = f"{parts.scheme}://{parts.netloc}"
+        sess  = self._sessions.get(base)
+        if sess is None:
+            with self._lock:
+                sess = self._sessions.get(base)
+                if sess is None:
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    sess    = requests.Session()
+                    sess.mount(base, adapter)
+                    self._sessions[base] = sess
+                    self._adapters[base] = adapter
+        return sess
+
+    def get(self, url: str, endpoint: str | None = None, timeout: float | None = None,
+            **kwargs) -> requests.Response:
+        """GET through the host's pooled session. Raises like requests.get; latency is recorded either way."""
+        if timeout is None:
+            timeout = self.timeouts.get(endpoint, DEFAULT_TIMEOUT)
+        started = time.perf_counter()
+        ok      = False
+        try:
+            resp = self.session(url).get(url, timeout=timeout, **kwargs)
+            ok   = resp.status_code < 500
+            return resp
+        finally:
+            self._record(urlsplit(url).netloc, time.perf_counter() - started, ok)
+
+    def _record(self, host: str, elapsed: float, ok: bool) -> None:
+        with self._lock:
+            st = self._stats.setdefault(host, _HostStats())
+            st.calls  += 1
+            st.errors += not ok
+            st.total  += elapsed
+            st.samples.append(elapsed)
+        METRICS.observe("stockwatch_http_request_seconds", elapsed, host=host)
+        if not ok:
+            METRICS.inc("stockwatch_http_errors_total", host=host)
+
+    def connections(self, host: str) -> int:
+        """Connections opened to `host` so far (fewer than calls means keep-alive is working)."""
+        adapter = next((a for base, a in self._adapters.items() if urlsplit(base).netloc == host), None)
+        if adapter is None:
+            return 0
+        pools = adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def stats(self) -> dict:
+        """host -> {calls, errors, avg_ms, p50_ms, p95_ms, connections}."""
+        with self._lock:
+            snap = {h: (s.calls, s.errors, s.total, sorted(s.samples)) for h, s in self._stats.items()}
+        out = {}
+        for host, (calls, errors, total, samples) in snap.items():
+            pct = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000 if samples else 0.0
+            out[host] = {
+                "calls":       calls,
+                "errors":      errors,
+                "avg_ms":      total / calls * 1000 if calls else 0.0,
+                "p50_ms":      pct(0.50),
+                "p95_ms":      pct(0.95),
+                "connections": self.connections(host),
+            }
+        return out
+
+
+CLIENT = HttpClient()
@@ -0,0 +1,208 @@
+"""
+Process-wide timing spans, counters and histograms.
+
+METRICS is shared by everything in the process: the dashboard and the monitor
+wrap each pipeline stage in `METRICS.span(stage)`, and the quote cache, HTTP
+client and delivery queue count hits, latencies and send outcomes as they go.
+The dashboard shows a summary in its diagnostics expander; both export the
+Prometheus text format, either as a file for node_exporter's textfile
+collector or from a small /metrics endpoint.
+
+    with METRICS.span("fetch"):
+        quotes, timing = fetch_quotes(...)
+    METRICS.inc("stockwatch_sends_total", result="failed")
+    METRICS.export()                     # -> stockwatch_metrics.prom
+"""
+
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+METRICS_FILE = Path("stockwatch_metrics.prom")
+BUCKETS      = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SAMPLES      = 256     # recent observations kept per series for percentiles in the UI
+
+HELP = {   # name -> (type, help); every metric recorded must be listed here
+    "stockwatch_stage_seconds":        ("histogram", "Wall time of each pipeline stage."),
+    "stockwatch_quote_fetch_seconds":  ("histogram", "Finnhub /quote latency per symbol (real HTTP calls only)."),
+    "stockwatch_quote_cache_total":    ("counter",   "Quote cache lookups by result."),
+    "stockwatch_http_request_seconds": ("histogram", "Outbound HTTP request latency per host."),
+    "stockwatch_http_errors_total":    ("counter",   "Outbound HTTP requests that failed or returned 5xx, per host."),
+    "stockwatch_sends_total":          ("counter",   "WhatsApp deliveries by final result, plus retries."),
+    "stockwatch_candle_fetches_total": ("counter",   "Candle backfill calls by result."),
+}
+
+
+class _Histogram:
+    __slots__ = ("buckets", "count", "sum", "last", "samples")
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count   = 0
+        self.sum     = 0.0
+        self.last    = 0.0
+        self.samples = deque(maxlen=SAMPLES)
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                break
+        self.count  += 1
+        self.sum    += value
+        self.last    = value
+        self.samples.append(value)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class Metrics:
+    """Thread-safe registry of labelled counters and histograms."""
+
+    def __init__(self):
+        self._lock       = threading.Lock()
+        self._counters   = {}   # (name, labels) -> float
+        self._histograms = {}   # (name, labels) -> _Histogram
+        self._exported   = float("-inf")
+
+    # ── Recording ─────────────────────────────────────────────────────────────
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = _Histogram()
+            hist.observe(seconds)
+
+    @contextmanager
+    def span(self, stage: str):
+        """Time the enclosed block into stockwatch_stage_seconds{stage=...}, even if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stockwatch_stage_seconds", time.perf_counter() - started, stage=stage)
+
+    # ── Reading ───────────────────────────────────────────────────────────────
+    def summary(self, name: str, label: str) -> dict:
+        """label value -> {count, last_ms, avg_ms, p50_ms, p95_ms, max_ms} for one histogram."""
+        with self._lock:
+            snap = {dict(lbl).get(label): (h.count, h.sum, h.last, sorted(h.samples))
+                    for (n, lbl), h in self._histograms.items() if n == name}
+        out = {}
+        for value, (count, total, last, samples) in snap.items():
+            pct = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000 if samples else 0.0
+            out[value] = {
+                "count":   count,
+                "last_ms": last * 1000,
+                "avg_ms":  total / count * 1000 if count else 0.0,
+                "p50_ms":  pct(0.50),
+                "p95_ms":  pct(0.95),
+                "max_ms":  samples[-1] * 1000 if samples else 0.0,
+            }
+        return out
+
+    def stages(self) -> dict:
+        return self.summary("stockwatch_stage_seconds", "stage")
+
+    def counters(self, name: str, label: str) -> dict:
+        """label value -> count for one counter."""
+        with self._lock:
+            return {dict(lbl).get(label): v for (n, lbl), v in self._counters.items() if n == name}
+
+    # ── Export ────────────────────────────────────────────────────────────────
+    def render(self) -> str:
+        """Everything recorded so far in the Prometheus text exposition format."""
+        with self._lock:
+            counters   = sorted(self._counters.items())
+            histograms = sorted(((k, (list(h.buckets), h.count, h.sum)) for k, h in self._histograms.items()),
+                                key=lambda item: item[0])
+        lines, seen = [], set()
+
+        def header(name):
+            if name not in seen:
+                seen.add(name)
+                kind, text = HELP.get(name, ("untyped", ""))
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name)
+            lines.append(f"{name}{_labels(labels)} {value:g}")
+        for (name, labels), (buckets, count, total) in histograms:
+            header(name)
+            cumulative = 0
+            for bound, n in zip(BUCKETS, buckets):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(labels + (('le', f'{bound:g}'),))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: Path = METRICS_FILE, every: float = 0.0) -> bool:
+        """
+        Atomically write render() to `path` (temp file + rename, so a scraper
+        never reads half a file). Skipped, returning False, if the last export
+        was less than `every` seconds ago.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._exported < every:
+                return False
+            self._exported = now
+        path = Path(path)
+        fd, tmp = tempfile.mkstemp(dir=path.parent or ".", prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(self.render())
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return True
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serve render() at http://host:port/metrics from a daemon thread."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+
+METRICS = Metrics()
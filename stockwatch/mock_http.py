@@ -0,0 +1,193 @@
+"""
+Local stand-ins for the Finnhub REST API and GREEN API, for offline testing
+and benchmarks.
+
+Serves Finnhub /api/v1/quote, /api/v1/search, /api/v1/stock/candle and
+/api/v1/stock/symbol plus the GREEN API sendMessage, getStateInstance and qr
+endpoints, with configurable latency and error rates, and counts every
+request by route.
+
+    python -m stockwatch.mock_http --port 8780 --latency 40 --error-rate 0.01
+    # then point the app at it:
+    STOCKWATCH_FINNHUB_BASE=http://127.0.0.1:8780/api/v1 \\
+    STOCKWATCH_GREENAPI_BASE=http://127.0.0.1:8780 streamlit run streamlit_app.py
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+_GREEN_ROUTE  = re.compile(r"^/waInstance[^/]+/(\w+)/[^/]+$")
+_LISTED       = [("AAPL", "APPLE INC"), ("MSFT", "MICROSOFT CORP"), ("GOOGL", "ALPHABET INC-CL A"),
+                 ("CSCO", "CISCO SYSTEMS INC"), ("GSK", "GSK PLC-SPON ADR"), ("AMZN", "AMAZON.COM INC")]
+_CANDLE_STEPS = {"1": 60, "5": 300, "15": 900, "30": 1800, "60": 3600, "D": 86400, "W": 7 * 86400}
+
+
+class MockServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer that carries the mock's settings and request counters."""
+
+    daemon_threads = True
+
+    def __init__(self, addr, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, move_pct: float = 2.0, state: str = "authorized", seed: int = 0):
+        super().__init__(addr, _Handler)
+        self.latency_ms      = latency_ms
+        self.jitter_ms       = jitter_ms
+        self.error_rate      = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.move_pct        = move_pct     # std-dev of the simulated % move from open
+        self.state           = state        # what getStateInstance reports
+        self.random          = random.Random(seed)
+        self._lock           = threading.Lock()
+        self.counts          = {}
+
+    def count(self, route: str) -> None:
+        with self._lock:
+            self.counts[route] = self.counts.get(route, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+    def quote(self, symbol: str) -> dict:
+        base = 20 + zlib.crc32(symbol.encode()) % 480
+        with self._lock:
+            move = self.random.gauss(0, self.move_pct / 100)
+        c = base * (1 + move)
+        return {"c": round(c, 4), "o": base, "pc": base, "h": round(max(c, base), 4),
+                "l": round(min(c, base), 4), "d": round(c - base, 4), "dp": round(move * 100, 4),
+                "t": int(time.time())}
+
+    def listing(self, exchange: str, size: int = 20_000) -> list:
+        """A fixed exchange listing: a few real names plus numbered mock companies."""
+        rows = _LISTED + [(f"M{i:05d}", f"MOCK {('ALPHA', 'BETA', 'GAMMA', 'DELTA')[i % 4]} INDUSTRIES {i}")
+                          for i in range(size - len(_LISTED))]
+        return [{"symbol": s, "displaySymbol": s, "description": d, "type": "Common Stock", "mic": exchange}
+                for s, d in rows]
+
+    def candles(self, symbol: str, resolution: str, start: int, end: int) -> dict:
+        """Bars on a fixed grid, each a pure function of (symbol, bar time), so refetches agree."""
+        step  = _CANDLE_STEPS.get(resolution, 86400)
+        times = list(range(-(-start // step) * step, min(end, int(time.time())) + 1, step))
+        if not times:
+            return {"s": "no_data"}
+        base  = 20 + zlib.crc32(symbol.encode()) % 480
+        bars  = {"s": "ok", "t": times, "o": [], "h": [], "l": [], "c": [], "v": []}
+        for t in times:
+            rng    = random.Random(f"{symbol}:{resolution}:{t}")
+            o      = base * (1 + rng.gauss(0, self.move_pct / 100))
+            c      = o * (1 + rng.gauss(0, self.move_pct / 400))
+            spread = abs(rng.gauss(0, self.move_pct / 400)) * o
+            for key, value in (("o", o), ("h", max(o, c) + spread), ("l", min(o, c) - spread), ("c", c),
+                               ("v", rng.randint(1_000, 100_000))):
+                bars[key].append(round(value, 4))
+        return bars
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version        = "HTTP/1.1"    # keep-alive, like the real APIs
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: dict, headers: dict | None = None) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _simulate(self, route: str) -> bool:
+        """Count, sleep and maybe inject a failure. Returns False if a failure was sent."""
+        srv = self.server
+        srv.count(route)
+        with srv._lock:
+            delay = max(0.0, srv.random.gauss(srv.latency_ms, srv.jitter_ms)) / 1000
+            roll  = srv.random.random()
+        time.sleep(delay)
+        if roll < srv.rate_limit_rate:
+            self._reply(429, {"error": "API limit reached"}, {"Retry-After": "1"})
+            return False
+        if roll < srv.rate_limit_rate + srv.error_rate:
+            self._reply(500, {"error": "mock failure"})
+            return False
+        return True
+
+    def do_GET(self):
+        url   = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        green = _GREEN_ROUTE.match(url.path)
+        if url.path == "/api/v1/quote":
+            if self._simulate("finnhub.quote"):
+                self._reply(200, self.server.quote(query.get("symbol", "")))
+        elif url.path == "/api/v1/search":
+            if self._simulate("finnhub.search"):
+                q = query.get("q", "").upper()
+                self._reply(200, {"count": 1, "result": [
+                    {"symbol": q, "displaySymbol": q, "description": f"{q} MOCK CORP", "type": "Common Stock"}]})
+        elif url.path == "/api/v1/stock/symbol":
+            if self._simulate("finnhub.symbols"):
+                self._reply(200, self.server.listing(query.get("exchange", "US")))
+        elif url.path == "/api/v1/stock/candle":
+            if self._simulate("finnhub.candle"):
+                self._reply(200, self.server.candles(query.get("symbol", ""), query.get("resolution", "D"),
+                                                     int(query.get("from", 0)), int(query.get("to", 0))))
+        elif green and green.group(1) == "getStateInstance":
+            if self._simulate("greenapi.state"):
+                self._reply(200, {"stateInstance": self.server.state})
+        elif green and green.group(1) == "qr":
+            if self._simulate("greenapi.qr"):
+                self._reply(200, {"type": "alreadyLogged", "message": "instance account already authorized"})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        green = _GREEN_ROUTE.match(urlsplit(self.path).path)
+        if green and green.group(1) == "sendMessage":
+            if self._simulate("greenapi.send"):
+                self._reply(200, {"idMessage": f"MOCK{self.server.random.getrandbits(48):012X}"})
+        else:
+            self._reply(404, {"error": "not found"})
+
+
+def start_background(host: str = "127.0.0.1", port: int = 0, **options) -> tuple:
+    """Start the mock server in a daemon thread. Returns (server, base_url)."""
+    server = MockServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, name="mock-http", daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host",        default="127.0.0.1")
+    ap.add_argument("--port",        type=int,   default=8780)
+    ap.add_argument("--latency",     type=float, default=0.0,  help="mean response latency (ms)")
+    ap.add_argument("--jitter",      type=float, default=0.0,  help="latency std-dev (ms)")
+    ap.add_argument("--error-rate",  type=float, default=0.0,  help="fraction of requests answered with HTTP 500")
+    ap.add_argument("--rate-limit",  type=float, default=0.0,  help="fraction of requests answered with HTTP 429")
+    ap.add_argument("--state",       default="authorized",     help="instance state reported by getStateInstance")
+    args = ap.parse_args()
+
+    server, url = start_background(args.host, args.port, latency_ms=args.latency, jitter_ms=args.jitter,
+                                   error_rate=args.error_rate, rate_limit_rate=args.rate_limit, state=args.state)
+    print(f"mock Finnhub + GREEN API on {url}  (Finnhub base {url}/api/v1)  — Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
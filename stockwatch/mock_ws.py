@@ -0,0 +1,77 @@
+"""
+Local stand-in for the Finnhub trade WebSocket, for offline testing.
+
+Speaks the same protocol as wss://ws.finnhub.io: clients send
+{"type": "subscribe", "symbol": ...} and receive
+{"type": "trade", "data": [{"s", "p", "t", "v"}, ...]} messages with a random
+walk price for every subscribed symbol.
+
+    python -m stockwatch.mock_ws --port 8765 --rate 5
+    # then set the streaming URL in the sidebar to ws://127.0.0.1:8765
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+
+from websockets.exceptions import ConnectionClosed
+from websockets.sync.server import serve
+
+
+def make_handler(rate: float = 5.0, start_price: float = 100.0, volatility: float = 0.002):
+    """Build a connection handler that emits `rate` trade batches per second."""
+    interval = 1.0 / rate
+
+    def handler(ws):
+        subs, prices = set(), {}
+        next_tick = time.monotonic()
+        try:
+            while True:
+                try:
+                    raw = ws.recv(timeout=max(0.0, next_tick - time.monotonic()))
+                except TimeoutError:
+                    raw = None
+                if raw:
+                    msg = json.loads(raw)
+                    if msg.get("type") == "subscribe":
+                        subs.add(msg["symbol"])
+                    elif msg.get("type") == "unsubscribe":
+                        subs.discard(msg["symbol"])
+                if time.monotonic() < next_tick:
+                    continue
+                next_tick += interval
+                now_ms = int(time.time() * 1000)
+                data   = []
+                for sym in subs:
+                    p = prices.get(sym, start_price) * (1 + random.gauss(0, volatility))
+                    prices[sym] = p
+                    data.append({"s": sym, "p": round(p, 4), "t": now_ms, "v": random.randint(1, 500)})
+                ws.send(json.dumps({"type": "trade", "data": data} if data else {"type": "ping"}))
+        except ConnectionClosed:
+            pass
+
+    return handler
+
+
+def start_background(host: str = "127.0.0.1", port: int = 0, rate: float = 5.0):
+    """Start the mock server in a daemon thread. Returns (server, ws_url)."""
+    server = serve(make_handler(rate), host, port)
+    threading.Thread(target=server.serve_forever, name="mock-ws", daemon=True).start()
+    return server, f"ws://{host}:{server.socket.getsockname()[1]}"
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--rate", type=float, default=5.0, help="trade batches per second")
+    args = ap.parse_args()
+    with serve(make_handler(args.rate), args.host, args.port) as server:
+        print(f"Mock Finnhub trade stream on ws://{args.host}:{args.port}")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""
+Headless StockWatch monitor.
+
+Polls quotes, evaluates alert thresholds and sends GREEN API messages on its
+own schedule, independent of any browser tab. After every cycle it writes a
+state file that the Streamlit dashboard picks up and displays read-only.
+With --users, one monitor serves every per-user config as well, fetching
+each symbol once per cycle however many users watch it.
+
+    python -m stockwatch.monitor                      # uses ./stockwatch_config.json
+    python -m stockwatch.monitor --config cfg.json --state state.json --interval 30
+    python -m stockwatch.monitor --once               # single cycle, then exit
+    python -m stockwatch.monitor --users              # also every stockwatch_users/<user>/ config
+    python -m stockwatch.monitor --metrics-port 9464  # also serve Prometheus /metrics
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from stockwatch.alerts import AlertEngine, describe_rule
+from stockwatch.candles import CANDLE_DIR, CandleBackfiller, CandleStore
+from stockwatch.config import (CONFIG_FILE, USERS_DIR, atomic_write_json, config_store, describe_changes, diff_config,
+                               list_tenants, tenant_config_path, tenant_dir)
+from stockwatch.cooldown import CooldownStore
+from stockwatch.delivery import DeliveryQueue, DigestCoalescer
+from stockwatch.history import HISTORY_DB, TickStore
+from stockwatch.metrics import METRICS
+from stockwatch.outbox import OUTBOX_DB, Outbox
+from stockwatch.providers import make_provider, provider_key
+from stockwatch.quotes import QuoteScheduler, fetch_quotes
+from stockwatch.ringbuffer import PriceRings
+from stockwatch.streaming import FINNHUB_WS_URL, REFERENCE_TTL, STREAMING_AVAILABLE, TradeStream, overlay_quote
+from stockwatch.whatsapp import WA_AVAILABLE, InstanceStateMonitor, credentials
+
+STATE_FILE   = Path("stockwatch_state.json")
+METRICS_FILE = Path("stockwatch_monitor.prom")
+MAX_ALERTS   = 50    # recent alerts kept in the state file
+STALE_AFTER  = 3     # a state file older than this many intervals means the monitor is down
+
+log = logging.getLogger("stockwatch.monitor")
+
+
+def read_monitor_state(path: Path = STATE_FILE) -> dict | None:
+    """Return the monitor's last published state, or None if absent or stale."""
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    age = time.time() - state.get("updated_at", 0)
+    if age > STALE_AFTER * max(state.get("interval", 60), 1):
+        return None
+    state["age"] = age
+    return state
+
+
+def tenant_state_path(tenant: str, root: Path = USERS_DIR) -> Path:
+    """State file the monitor publishes for `tenant` (STATE_FILE for the default user)."""
+    return tenant_dir(tenant, root) / STATE_FILE.name if tenant else STATE_FILE
+
+
+def watched_stocks(watchlists) -> list:
+    """
+    Union of several watchlists, one entry per symbol in first-seen order,
+    carrying the tightest alert_pct so quote TTLs follow the most sensitive
+    watcher.
+    """
+    union = {}
+    for stocks in watchlists:
+        for stock in stocks:
+            have = union.get(stock["symbol"])
+            if have is None or 0 < stock.get("alert_pct", 0) < (have.get("alert_pct") or float("inf")):
+                union[stock["symbol"]] = stock
+    return list(union.values())
+
+
+class Tenant:
+    """One user's config, alert engine, cooldowns and published state inside a monitor."""
+
+    def __init__(self, name: str, config_path: Path, state_path: Path, cooldowns: CooldownStore):
+        self.name       = name
+        self.tag        = f"[{name}] " if name else ""
+        self.config     = config_store(config_path)
+        self.cfg        = None
+        self.version    = None
+        self.state_path = Path(state_path)
+        self.engine     = AlertEngine()
+        self.cooldowns  = cooldowns.for_tenant(name)
+        self.state      = {}
+        self.alerts     = []
+        self.receipts   = {}
+        self._resume()
+
+    def _resume(self):
+        """Carry recent alerts and receipts over from the previous run."""
+        try:
+            with open(self.state_path) as f:
+                prev = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.alerts     = prev.get("alerts", [])
+        self.receipts   = prev.get("receipts", {})
+
+    def reload(self) -> dict:
+        """This cycle's config, logging what changed since the last one."""
+        cfg, version = self.config.snapshot()
+        if self.cfg is not None and version != self.version:
+            log.info("%sconfig reloaded: %s", self.tag, describe_changes(diff_config(self.cfg, cfg)) or "no changes")
+        if self.config.error:
+            log.warning("%sconfig not reloaded, still using the previous one: %s", self.tag, self.config.error)
+        self.cfg, self.version = cfg, version
+        return cfg
+
+    def receipt(self, name: str, phone: str, ok: bool, err: str) -> None:
+        self.receipts[phone] = (ok, err, datetime.now().isoformat(timespec="seconds"))
+        if not ok:
+            log.warning("%ssend to %s (%s) failed: %s", self.tag, name, phone, err)
+
+    def publish(self) -> None:
+        if not self.state:
+            return
+        self.state["receipts"] = dict(self.receipts)
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(self.state_path, self.state)
+
+
+class Monitor:
+    """
+    Runs fetch → detect → send → publish cycles until stopped.
+
+    With `users_dir`, every user with a config under it is served by the same
+    cycle: the union of their symbols is fetched once, then each user's alerts
+    are evaluated and delivered against their own watchlist, recipients and
+    cooldowns. Deployment-wide settings (interval, Finnhub budget, concurrency,
+    streaming, history) come from `config_path`.
+    """
+
+    def __init__(self, config_path: Path = CONFIG_FILE, state_path: Path = STATE_FILE,
+                 interval: float | None = None, history_path: Path = HISTORY_DB, outbox_path: Path = OUTBOX_DB,
+                 prom_path: Path | None = METRICS_FILE, users_dir: Path | None = None,
+                 candle_dir: Path = CANDLE_DIR):
+        self.config_path = Path(config_path)
+        self.config      = config_store(config_path)
+        self.state_path  = Path(state_path)
+        self.users_dir   = None if users_dir is None else Path(users_dir)
+        self.prom_path   = prom_path
+        self.interval    = interval
+        self.quotes      = QuoteScheduler()
+        self.source      = ("finnhub",)   # provider_key() of the provider behind self.quotes
+        self.ticks       = TickStore(history_path)
+        self.candles     = CandleStore(candle_dir)
+        self.backfill    = CandleBackfiller(self.candles)
+        self.rings       = None
+        self.instance    = InstanceStateMonitor()
+        self.delivery    = DeliveryQueue(outbox=Outbox(outbox_path), state=self.instance)
+        self.cooldowns   = CooldownStore(outbox_path)
+        self.digest      = DigestCoalescer(self.delivery)
+        self.tenants     = {}     # user name ("" = default config) -> Tenant
+        self.state       = {}
+        self.stream      = None
+        self.cycle       = 0
+        self._stop       = threading.Event()
+
+    def stop(self, *_):
+        self._stop.set()
+
+    def _get_quotes(self, symbols: list) -> dict:
+        if self.stream is None:
+            return self.quotes.get_many(symbols)
+        quotes = self.quotes.get_many(symbols, ttl=REFERENCE_TTL)
+        return {sym: overlay_quote(q, self.stream.table.get(sym)) for sym, q in quotes.items()}
+
+    def _switch_provider(self, market: dict) -> None:
+        """Rebuild the quote scheduler when the market-data settings change; keep the old one on error."""
+        source = provider_key(market)
+        if source == self.source:
+            return
+        try:
+            provider = make_provider(market)
+        except (OSError, ValueError) as e:
+            log.error("market data: can't use %s (%s), staying on %s", source[0], e, self.quotes.provider.label)
+            return
+        log.info("market data: %s", provider.describe())
+        self.quotes, self.source = QuoteScheduler(provider), source
+        if self.stream is not None and not provider.streams:
+            self.stream.stop()
+            self.stream = None
+
+    def _active_tenants(self) -> list:
+        """Tenants to serve this cycle; users appear and disappear with their config files."""
+        if self.users_dir is None:
+            names = [""]
+        else:
+            names = ([""] if self.config_path.exists() else []) + list_tenants(self.users_dir)
+        for name in set(self.tenants) - set(names):
+            log.info("user %s removed", name or "(default)")
+            del self.tenants[name]
+        for name in names:
+            if name not in self.tenants:
+                if name:
+                    log.info("user %s added", name)
+                    paths = tenant_config_path(name, self.users_dir), tenant_state_path(name, self.users_dir)
+                else:
+                    paths = self.config_path, self.state_path
+                self.tenants[name] = Tenant(name, *paths, self.cooldowns)
+        return [self.tenants[n] for n in names]
+
+    def run_cycle(self) -> dict:
+        tenants = self._active_tenants()
+        for tenant in tenants:
+            tenant.reload()
+        cfg, _   = self.config.snapshot()     # deployment-wide settings
+        interval = self.interval or cfg["refresh_interval"]
+        self._switch_provider(cfg["market_data"])
+        # Near-threshold symbols expire before the next cycle; quiet ones stretch past it
+        self.quotes.base_ttl = min(self.quotes.provider.ttl, interval / 2)
+        self.quotes.set_budget(cfg["calls_per_minute"])
+
+        # One fetch for every symbol any user watches, however many users share it
+        stocks  = watched_stocks(t.cfg["stocks"] for t in tenants)
+        symbols = [s["symbol"] for s in stocks]
+        if self.rings is None or self.rings.depth != cfg["ring_depth"]:
+            self.rings = PriceRings(cfg["ring_depth"])
+        for sym in symbols:
+            if sym not in self.rings:
+                self.rings.warm(sym, self.ticks.latest(sym, self.rings.depth))
+        if cfg["streaming"]["enabled"] and STREAMING_AVAILABLE and self.quotes.provider.streams and self.stream is None:
+            self.stream = TradeStream(cfg["streaming"]["url"] or FINNHUB_WS_URL)
+            self.stream.start()
+        if self.stream is not None:
+            self.stream.on_trade = self.rings.append     # every trade lands in the rings, not just the table
+            self.stream.subscribe(symbols)
+        if cfg["candle_backfill"]:
+            self.backfill.request(symbols, self.quotes)
+
+        with METRICS.span("fetch"):
+            quotes, timing = fetch_quotes(self._get_quotes, self.quotes.prioritise(symbols), cfg["fetch_concurrency"],
+                                          batch=self.quotes.provider.max_batch)
+            self.quotes.observe(stocks, quotes)
+        with METRICS.span("history"):
+            self.ticks.retention_days = cfg["history_retention_days"]
+            self.ticks.record_quotes(quotes)
+            self.rings.record_quotes(quotes, time.time())
+
+        # Fan the shared quotes out to each user's own rules, cooldowns and recipients
+        triggered = {}
+        prices_at = (self.candles.backed_prices_at(self.rings.prices_at) if cfg["candle_backfill"]
+                     else self.rings.prices_at)
+        with METRICS.span("alerts"):
+            for t in tenants:
+                t.engine.cooldown = t.cfg["alert_cooldown_mins"] * 60
+                triggered[t.name] = t.engine.evaluate(t.cfg["stocks"], quotes, t.cooldowns,
+                                                      prices_at=prices_at)
+                for alert in triggered[t.name]:
+                    log.info("%sALERT %s %+.2f%% (%s)", t.tag, alert["symbol"], alert["change"], describe_rule(alert))
+        with METRICS.span("deliver"):
+            for t in tenants:
+                wa         = t.cfg["whatsapp"]
+                recipients = wa.get("recipients", [])
+                if recipients and WA_AVAILABLE and all(credentials(wa)):
+                    self.instance.watch(wa)
+                    self.delivery.replay(wa, on_receipt=t.receipt)
+                    self.digest.add(triggered[t.name], recipients, wa, on_receipt=t.receipt,
+                                    window=t.cfg["digest_window_secs"])
+
+        self.cycle += 1
+        now = time.time()
+        for t in tenants:
+            watched  = {s["symbol"] for s in t.cfg["stocks"]}
+            t.alerts = (triggered[t.name] + t.alerts)[:MAX_ALERTS]
+            t.state  = {
+                "updated_at":    now,
+                "pid":           os.getpid(),
+                "interval":      interval,
+                "cycle":         self.cycle,
+                "quotes":        {s: q for s, q in quotes.items() if s in watched},
+                "fetch_timing":  timing,
+                "triggered":     triggered[t.name],
+                "breached":      sorted(t.engine.breached),
+                "alerts":        t.alerts,
+                "receipts":      t.receipts,
+                "instance":      self.instance.state(t.cfg["whatsapp"])[0],
+            }
+        self.state = {
+            "updated_at": now,
+            "interval":   interval,
+            "cycle":      self.cycle,
+            "users":      len(tenants),
+            "symbols":    len(symbols),
+            "watched":    sum(len(t.cfg["stocks"]) for t in tenants),
+            "alerts":     sum(map(len, triggered.values())),
+        }
+        self.publish()
+        if self.users_dir is None:
+            log.info("cycle %d: %d quotes in %.2fs, %d alerts",
+                     self.cycle, len(quotes), timing["wall"], self.state["alerts"])
+        else:
+            log.info("cycle %d: %d users watching %d symbols (%d unique) in %.2fs, %d alerts", self.cycle,
+                     len(tenants), self.state["watched"], len(symbols), timing["wall"], self.state["alerts"])
+        return self.state
+
+    def publish(self) -> None:
+        """Write each user's latest state (with any receipts since) for their dashboard, plus metrics."""
+        for tenant in self.tenants.values():
+            tenant.publish()
+        if self.prom_path is not None:
+            METRICS.export(self.prom_path)
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                with METRICS.span("cycle"):
+                    state = self.run_cycle()
+                interval = state["interval"]
+            except Exception:
+                log.exception("monitor cycle failed")
+                interval = self.interval or 60
+            self._stop.wait(max(0.0, interval - (time.monotonic() - started)))
+        if self.stream is not None:
+            self.stream.stop()
+        self.digest.flush(force=True)
+        if self.state and self.delivery.join(timeout=30):   # let queued alerts go out before exiting
+            self.publish()
+        self.delivery.outbox.close()   # flush buffered receipt marks; anything unsent replays next start
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--config",   type=Path, default=CONFIG_FILE, help="config file to read each cycle")
+    ap.add_argument("--state",    type=Path, default=STATE_FILE,  help="state file the dashboard reads")
+    ap.add_argument("--history",  type=Path, default=HISTORY_DB,  help="SQLite tick history database")
+    ap.add_argument("--outbox",   type=Path, default=OUTBOX_DB,   help="SQLite outbox of undelivered alerts")
+    ap.add_argument("--candles",  type=Path, default=CANDLE_DIR,  help="directory of cached candle files")
+    ap.add_argument("--interval", type=float, default=None,       help="seconds between cycles (default: refresh_interval)")
+    ap.add_argument("--once",     action="store_true",            help="run a single cycle and exit")
+    ap.add_argument("--users",    type=Path, nargs="?", const=USERS_DIR, default=None,
+                    help=f"also serve every per-user config under this directory (default: {USERS_DIR})")
+    ap.add_argument("--metrics",  type=Path, default=METRICS_FILE, help="Prometheus text file rewritten every cycle")
+    ap.add_argument("--metrics-port", type=int, default=0,        help="also serve /metrics on this port (0: off)")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    monitor = Monitor(args.config, args.state, args.interval, args.history, args.outbox, args.metrics, args.users,
+                      args.candles)
+    if args.metrics_port:
+        METRICS.serve(args.metrics_port)
+        log.info("serving Prometheus metrics on http://127.0.0.1:%d/metrics", args.metrics_port)
+    signal.signal(signal.SIGTERM, monitor.stop)
+    signal.signal(signal.SIGINT,  monitor.stop)
+    if args.once:
+        monitor.run_cycle()
+        monitor.digest.flush(force=True)
+        monitor.delivery.join(timeout=120)
+        monitor.backfill.join(timeout=120)
+        monitor.publish()
+        monitor.delivery.outbox.close()
+    elif args.users is not None:
+        log.info("monitoring %s and every user under %s/", args.config, args.users)
+        monitor.run_forever()
+    else:
+        log.info("monitoring %s → %s", args.config, args.state)
+        monitor.run_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Durable alert outbox in an embedded SQLite database.
+
+Every alert message is written here, one row per recipient, before it is
+handed to the delivery queue, and each delivery is marked sent / failed as
+receipts come back. Deliveries still pending after a crash, restart or GREEN
+API outage are claimed and replayed later.
+
+Claims are leases (`lease_until`), so the dashboard and the headless monitor
+can share one file. Each message records the GREEN API instance that queued
+it, so with several users on one deployment a replay only picks up messages
+for the account it will send them from. A delivery is only replayed once the process that queued
+it has had `lease` seconds to finish it; the delivery queue renews the lease
+while the delivery waits for a worker or a retry. Receipt marks and lease
+renewals are buffered and written in one transaction every FLUSH_EVERY
+seconds, so journaling costs one commit per batch of alerts rather than one
+per send. Finished messages older than KEEP_DAYS are pruned on startup and
+then at most every PRUNE_EVERY seconds.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+OUTBOX_DB   = Path("stockwatch_outbox.db")
+FLUSH_EVERY = 0.25        # seconds between batched receipt writes
+LEASE       = 120         # seconds a process owns the deliveries it queued or claimed
+MAX_AGE     = 6 * 3600    # pending alerts older than this are expired, not sent late
+KEEP_DAYS   = 7           # finished messages are pruned after this many days
+PRUNE_EVERY = 3600        # seconds between prunes in a long-running process
+
+log = logging.getLogger("stockwatch.outbox")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id       INTEGER PRIMARY KEY,
+    created  REAL NOT NULL,
+    body     TEXT NOT NULL,
+    instance TEXT NOT NULL DEFAULT ''    -- GREEN API id_instance it is sent from ('' = any)
+);
+CREATE TABLE IF NOT EXISTS deliveries (
+    message_id  INTEGER NOT NULL REFERENCES messages(id),
+    phone       TEXT NOT NULL,
+    name        TEXT NOT NULL,
+    status      TEXT NOT NULL DEFAULT 'pending',   -- pending | sent | failed | expired
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    error       TEXT NOT NULL DEFAULT '',
+    lease_until REAL NOT NULL DEFAULT 0,
+    updated     REAL,
+    PRIMARY KEY (message_id, phone)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS deliveries_pending ON deliveries(lease_until) WHERE status = 'pending';
+"""
+
+
+class Outbox:
+    """Write-ahead record of outbound alert messages and their per-recipient delivery state."""
+
+    def __init__(self, path: Path = OUTBOX_DB, lease: float = LEASE, max_age: float = MAX_AGE):
+        self.path    = Path(path)
+        self.lease   = lease
+        self.max_age = max_age
+        self._lock   = threading.Lock()
+        self._marks  = []            # buffered (status, error, updated, message_id, phone)
+        self._leases = {}            # buffered (message_id, phone) -> renewed lease_until
+        self._wake   = threading.Event()
+        self._closed = False
+        self._pruned = float("-inf")   # monotonic time of the last prune
+        self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        if "instance" not in {row[1] for row in self._conn.execute("PRAGMA table_info(messages)")}:
+            try:    # outbox from before per-instance replay
+                self._conn.execute("ALTER TABLE messages ADD COLUMN instance TEXT NOT NULL DEFAULT ''")
+            except sqlite3.OperationalError:    # another process added it first
+                pass
+        self._prune_if_due()
+        self._flusher = threading.Thread(target=self._flush_loop, name="outbox-flush", daemon=True)
+        self._flusher.start()
+
+    @contextmanager
+    def _transaction(self, begin: str = "BEGIN"):
+        """BEGIN … COMMIT on the shared connection, rolled back if anything in between fails."""
+        self._conn.execute(begin)
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    # ── Writes ────────────────────────────────────────────────────────────────
+    def record(self, messages: list, recipients: list, instance: str = "") -> list:
+        """
+        Durably record each message for every recipient, leased to this process,
+        in one transaction. Returns the new message ids in order.
+        """
+        now = time.time()
+        ids = []
+        with self._lock, self._transaction():
+            for body in messages:
+                mid = self._conn.execute("INSERT INTO messages (created, body, instance) VALUES (?, ?, ?)",
+                                         (now, body, instance)).lastrowid
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO deliveries (message_id, phone, name, lease_until) VALUES (?, ?, ?, ?)",
+                    [(mid, r["phone"], r["name"], now + self.lease) for r in recipients],
+                )
+                ids.append(mid)
+        return ids
+
+    def mark(self, message_id: int, phone: str, ok: bool, err: str = "", retryable: bool = False) -> None:
+        """
+        Buffer a delivery outcome. Failures that are still worth retrying stay
+        pending and are replayed once the lease runs out.
+        """
+        status = "sent" if ok else ("pending" if retryable else "failed")
+        with self._lock:
+            self._marks.append((status, err, time.time(), message_id, phone))
+        self._wake.set()
+
+    def renew(self, keys, extra: float = 0.0) -> None:
+        """
+        Buffer a lease extension to `lease + extra` seconds from now for the
+        (message_id, phone) deliveries this process still holds. A lease is
+        never shortened.
+        """
+        until = time.time() + self.lease + extra
+        with self._lock:
+            for key in keys:
+                self._leases[key] = max(until, self._leases.get(key, 0.0))
+        self._wake.set()
+
+    def flush(self) -> int:
+        """Write buffered receipt marks and lease renewals in one transaction. Returns the marks written."""
+        with self._lock:
+            marks, self._marks   = self._marks, []
+            leases, self._leases = self._leases, {}
+            if not (marks or leases) or self._closed:
+                return 0
+            try:
+                with self._transaction():
+                    self._conn.executemany(
+                        "UPDATE deliveries SET status = ?, error = ?, updated = ?, attempts = attempts + 1 "
+                        "WHERE message_id = ? AND phone = ?",
+                        marks,
+                    )
+                    self._conn.executemany(
+                        "UPDATE deliveries SET lease_until = MAX(lease_until, ?) "
+                        "WHERE message_id = ? AND phone = ? AND status = 'pending'",
+                        [(until, mid, phone) for (mid, phone), until in leases.items()],
+                    )
+            except BaseException:
+                self._marks[:0] = marks          # keep them for the next flush
+                for key, until in leases.items():
+                    self._leases[key] = max(until, self._leases.get(key, 0.0))
+                raise
+        return len(marks)
+
+    def _flush_loop(self) -> None:
+        while not self._closed:
+            self._wake.wait()
+            time.sleep(FLUSH_EVERY)   # let a burst of receipts collect into one transaction
+            self._wake.clear()
+            try:
+                self.flush()
+                self._prune_if_due()
+            except Exception as e:
+                log.warning("outbox flush failed, retrying: %s", e)
+                self._wake.set()
+
+    # ── Replay ────────────────────────────────────────────────────────────────
+    def claim_pending(self, now: float | None = None, instance: str | None = None, skip=()) -> list:
+        """
+        Take over pending deliveries whose lease has run out (their process
+        died or gave up) and return them as [(message_id, body, name, phone)].
+        Alerts older than max_age are marked expired instead. With `instance`,
+        only messages queued from that GREEN API instance (or from no
+        particular one) are claimed; (message_id, phone) pairs in `skip` (the
+        caller's own queued deliveries) never are.
+        """
+        now  = time.time() if now is None else now
+        skip = set(skip)
+        with self._lock, self._transaction("BEGIN IMMEDIATE"):
+            self._conn.execute(
+                "UPDATE deliveries SET status = 'expired', updated = :now WHERE status = 'pending' "
+                "AND message_id IN (SELECT id FROM messages WHERE created < :cut)",
+                {"now": now, "cut": now - self.max_age},
+            )
+            rows = self._conn.execute(
+                "SELECT d.message_id, m.body, d.name, d.phone FROM deliveries d "
+                "JOIN messages m ON m.id = d.message_id "
+                "WHERE d.status = 'pending' AND d.lease_until < :now "
+                "AND (:instance IS NULL OR m.instance IN (:instance, '')) ORDER BY d.message_id",
+                {"now": now, "instance": instance},
+            ).fetchall()
+            rows = [row for row in rows if (row[0], row[3]) not in skip]
+            self._conn.executemany(
+                "UPDATE deliveries SET lease_until = ? WHERE message_id = ? AND phone = ?",
+                [(now + self.lease, mid, phone) for mid, _, _, phone in rows],
+            )
+        self._prune_if_due()     # expiries above finish messages too
+        return rows
+
+    # ── Housekeeping ──────────────────────────────────────────────────────────
+    def counts(self) -> dict:
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM deliveries GROUP BY status").fetchall())
+
+    def prune(self, keep_days: float = KEEP_DAYS) -> None:
+        """Drop messages older than keep_days whose deliveries have all finished."""
+        cut = time.time() - keep_days * 86400
+        with self._lock, self._transaction():
+            self._conn.execute(
+                "DELETE FROM deliveries WHERE message_id IN (SELECT id FROM messages WHERE created < ?) "
+                "AND status != 'pending'", (cut,),
+            )
+            self._conn.execute(
+                "DELETE FROM messages WHERE created < ? "
+                "AND NOT EXISTS (SELECT 1 FROM deliveries WHERE message_id = messages.id)", (cut,),
+            )
+
+    def _prune_if_due(self) -> None:
+        """prune() at most every PRUNE_EVERY seconds; called on startup, after flushes and on replay scans."""
+        now = time.monotonic()
+        if now - self._pruned < PRUNE_EVERY or self._closed:
+            return
+        self._pruned = now
+        self.prune()
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._closed = True
+            self._conn.close()
+        self._wake.set()
@@ -0,0 +1,405 @@
+"""
+Market-data providers behind the quote cache.
+
+A provider turns symbols into Finnhub-shaped quote dicts ({"c", "o", "h", "l",
+"pc", "t"}, or {"error": ...}) through `fetch_many(symbols)`. QuoteScheduler
+hands it at most `max_batch` symbols per call and, for metered providers, takes
+one API-budget token per call, so a backend with a multi-symbol endpoint is
+charged once per batch rather than once per symbol.
+
+FinnhubProvider is the REST /quote backend: one symbol per request, fetched
+concurrently. ReplayProvider plays back a file of recorded ticks on a clock
+running `speed` times faster than real time, so the whole alert pipeline can be
+load-tested or demoed offline:
+
+    python -m stockwatch.providers export --out ticks.jsonl          # from the tick history
+    python -m stockwatch.providers generate --symbols 500 --hours 6 --out ticks.jsonl
+    python -m stockwatch.providers replay ticks.jsonl --speed 600 --seconds 20
+
+A replay file holds one JSON object per line, {"s": symbol, "t": unix seconds,
+"p": price}, in any order.
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from stockwatch.httpclient import CLIENT
+from stockwatch.metrics import METRICS
+
+FINNHUB_KEY  = "d6c5mt1r01qsiik0ricgd6c5mt1r01qsiik0rid0"
+FINNHUB_BASE = os.environ.get("STOCKWATCH_FINNHUB_BASE", "https://finnhub.io/api/v1")   # override for mock_http
+
+PROVIDERS    = {"finnhub": "Finnhub REST", "replay": "Replay file"}
+REPLAY_BATCH = 10_000    # symbols per fetch_many call for in-memory providers
+
+
+# ── Finnhub REST ──────────────────────────────────────────────────────────────
+def fetch_quote(symbol: str) -> dict:
+    """Uncached Finnhub /quote call. Errors come back as {"error": str}."""
+    started = time.perf_counter()
+    try:
+        r = CLIENT.get(
+            f"{FINNHUB_BASE}/quote",
+            endpoint="finnhub.quote",
+            params={"symbol": symbol, "token": FINNHUB_KEY},
+        )
+        if r.status_code == 429:
+            return {
+                "error":        "HTTP 429 Too Many Requests",
+                "rate_limited": True,
+                "retry_after":  float(r.headers.get("Retry-After") or 0),
+            }
+        r.raise_for_status()
+        return r.json()
+    except Exception as e:
+        return {"error": str(e)}
+    finally:
+        METRICS.observe("stockwatch_quote_fetch_seconds", time.perf_counter() - started, symbol=symbol)
+
+
+def fetch_candles(symbol: str, resolution: str, start: int, end: int) -> dict:
+    """
+    Finnhub /stock/candle bars between two unix times: {"s": "ok", "t": [...],
+    "o", "h", "l", "c", "v"} or {"s": "no_data"}. Errors come back as
+    {"error": str}, with the HTTP "status" when the API refused the call (403:
+    the plan has no candle access).
+    """
+    try:
+        r = CLIENT.get(
+            f"{FINNHUB_BASE}/stock/candle",
+            endpoint="finnhub.candle",
+            params={"symbol": symbol, "resolution": resolution, "from": start, "to": end, "token": FINNHUB_KEY},
+        )
+        if 400 <= r.status_code < 500:
+            return {
+                "error":       f"HTTP {r.status_code} {r.reason}",
+                "status":      r.status_code,
+                "retry_after": float(r.headers.get("Retry-After") or 0),
+            }
+        r.raise_for_status()
+        return r.json()
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def fetch_symbol_list(exchange: str = "US") -> list:
+    """Finnhub /stock/symbol: every {"symbol", "description", ...} listed on one exchange. Raises on error."""
+    r = CLIENT.get(
+        f"{FINNHUB_BASE}/stock/symbol",
+        endpoint="finnhub.symbols",
+        params={"exchange": exchange, "token": FINNHUB_KEY},
+    )
+    r.raise_for_status()
+    return r.json()
+
+
+class QuoteProvider:
+    """Base class: a source of quotes. Subclasses override fetch() or fetch_many()."""
+
+    label     = "provider"
+    max_batch = 1        # symbols per fetch_many() call
+    metered   = True     # calls count against the API budget
+    ttl       = 30.0     # default seconds a quote is cached for
+    streams   = False    # the Finnhub trade WebSocket can overlay these quotes
+
+    def fetch(self, symbol: str) -> dict:
+        return self.fetch_many([symbol])[symbol]
+
+    def fetch_many(self, symbols: list) -> dict:
+        """symbol -> quote for every symbol asked for. Errors are returned per symbol, not raised."""
+        return {sym: self.fetch(sym) for sym in symbols}
+
+    def candles(self, symbol: str, resolution: str, start: int, end: int) -> dict:
+        """Bars in the /stock/candle shape (see fetch_candles()), or {"error": str}."""
+        return {"error": f"{self.label} has no candle history"}
+
+    def describe(self) -> str:
+        return self.label
+
+
+class FinnhubProvider(QuoteProvider):
+    """Finnhub REST /quote. There is no multi-symbol quote endpoint, so batches are single symbols."""
+
+    label   = "Finnhub"
+    streams = True
+
+    def fetch(self, symbol: str) -> dict:
+        return fetch_quote(symbol)
+
+    def candles(self, symbol: str, resolution: str, start: int, end: int) -> dict:
+        return fetch_candles(symbol, resolution, start, end)
+
+    def describe(self) -> str:
+        return "Finnhub free tier ~15 min delay"
+
+
+# ── Replay ────────────────────────────────────────────────────────────────────
+def load_ticks(path: Path) -> dict:
+    """
+    symbol -> (times, prices) arrays sorted by time, from a JSON-lines replay
+    file. The parsed arrays are cached beside it as <file>.npz and reused
+    while that is newer than the file, so only the first load pays for JSON.
+    """
+    path  = Path(path)
+    cache = path.with_name(path.name + ".npz")
+    if cache.exists() and cache.stat().st_mtime >= path.stat().st_mtime:
+        with np.load(cache) as z:
+            names, bounds, times, prices = z["names"].tolist(), z["bounds"], z["times"], z["prices"]
+    else:
+        with open(path) as f:
+            rows = json.loads("[" + ",".join(line for line in f if line.strip()) + "]")
+        ids    = {}
+        col    = np.fromiter((ids.setdefault(r["s"], len(ids)) for r in rows), dtype=np.int64, count=len(rows))
+        times  = np.fromiter((r["t"] for r in rows), dtype=np.float64, count=len(rows))
+        prices = np.fromiter((r["p"] for r in rows), dtype=np.float64, count=len(rows))
+        del rows
+        order  = np.lexsort((times, col))                    # by symbol, then time
+        col, times, prices = col[order], times[order], prices[order]
+        names  = list(ids)
+        bounds = np.searchsorted(col, np.arange(len(names) + 1))
+        try:
+            with open(cache, "wb") as f:
+                np.savez(f, names=np.array(names), bounds=bounds, times=times, prices=prices)
+        except OSError:
+            pass     # read-only directory: parse again next time
+    return {sym: (times[bounds[i]:bounds[i + 1]], prices[bounds[i]:bounds[i + 1]]) for i, sym in enumerate(names)}
+
+
+class ReplayProvider(QuoteProvider):
+    """
+    Recorded ticks played back `speed` times faster than real time.
+
+    Each quote is the last tick at or before the replay clock, with the high and
+    low so far and the symbol's first recorded price as open and previous close.
+    Its "t" is the wall-clock time the tick was played, so history and charts
+    see a steady live feed. With `loop`, playback restarts at the end of the
+    file. `on_tick(symbol, t, price)` optionally receives every tick played
+    since the previous fetch of that symbol, not just the latest.
+    """
+
+    label     = "Replay"
+    max_batch = REPLAY_BATCH
+    metered   = False
+    ttl       = 1.0      # free to call, so only coalesce sessions refreshing together
+
+    def __init__(self, path: Path, speed: float = 1.0, loop: bool = True, on_tick=None):
+        self.path    = Path(path)
+        self.speed   = float(speed)
+        self.loop    = loop
+        self.on_tick = on_tick
+        self._ticks  = load_ticks(self.path)
+        self._high   = {s: np.maximum.accumulate(p) for s, (_, p) in self._ticks.items()}
+        self._low    = {s: np.minimum.accumulate(p) for s, (_, p) in self._ticks.items()}
+        starts       = [t[0] for t, _ in self._ticks.values() if len(t)]
+        ends         = [t[-1] for t, _ in self._ticks.values() if len(t)]
+        self.t0      = min(starts, default=0.0)
+        self.span    = max(ends, default=0.0) - self.t0 + 1e-6
+        self.ticks   = sum(len(t) for t, _ in self._ticks.values())
+        self.played  = 0       # ticks passed by the clock so far, over all fetched symbols
+        self._lock   = threading.Lock()
+        self._cursor = {}      # symbol -> (loop, index) of the last tick handed out
+        self._wall0  = time.time()
+        self._mono0  = time.monotonic()
+
+    def clock(self) -> tuple[int, float]:
+        """(loop number, recorded time) the replay has reached."""
+        elapsed = (time.monotonic() - self._mono0) * self.speed
+        if self.loop:
+            return int(elapsed // self.span), self.t0 + elapsed % self.span
+        return 0, self.t0 + elapsed
+
+    def _wall(self, loop: int, t):
+        return self._wall0 + (loop * self.span + t - self.t0) / self.speed
+
+    def fetch_many(self, symbols: list) -> dict:
+        loop, now = self.clock()
+        quotes    = {}
+        with self._lock:
+            for sym in symbols:
+                if sym not in self._ticks:
+                    quotes[sym] = {"error": f"{sym} is not in {self.path.name}"}
+                    continue
+                times, prices = self._ticks[sym]
+                lp, i = loop, int(np.searchsorted(times, now, side="right")) - 1
+                if i < 0 and loop:
+                    lp, i = loop - 1, len(times) - 1   # no tick yet this loop: still the last one of the previous
+                if i < 0:
+                    quotes[sym] = {"c": 0, "t": 0}     # not trading yet
+                    continue
+                self._advance(sym, lp, i)
+                first = float(prices[0])
+                quotes[sym] = {
+                    "c":  float(prices[i]),
+                    "o":  first,
+                    "pc": first,
+                    "h":  float(self._high[sym][i]),
+                    "l":  float(self._low[sym][i]),
+                    "d":  float(prices[i]) - first,
+                    "dp": (float(prices[i]) / first - 1) * 100 if first else 0.0,
+                    "t":  self._wall(lp, float(times[i])),
+                }
+        return quotes
+
+    def _advance(self, sym: str, loop: int, i: int) -> None:
+        """Count, and pass to on_tick, the ticks between this symbol's cursor and index i."""
+        prev_loop, prev_i = self._cursor.get(sym, (loop, -1))
+        self._cursor[sym] = (loop, i)
+        times, prices = self._ticks[sym]
+        if prev_loop != loop:        # wrapped: the tail of the last loop, then the head of this one
+            spans = [(prev_loop, prev_i + 1, len(times)), (loop, 0, i + 1)]
+        else:
+            spans = [(loop, prev_i + 1, i + 1)]
+        for lp, a, b in spans:
+            if b <= a:
+                continue
+            self.played += b - a
+            if self.on_tick is not None:
+                for t, p in zip(self._wall(lp, times[a:b]).tolist(), prices[a:b].tolist()):
+                    self.on_tick(sym, t, p)
+
+    def symbols(self) -> list:
+        return sorted(self._ticks)
+
+    def describe(self) -> str:
+        return f"Replay of {self.path.name} at {self.speed:g}× ({self.ticks:,} ticks, {len(self._ticks)} symbols)"
+
+
+def provider_key(settings: dict) -> tuple:
+    """Hashable identity of a "market_data" section: equal keys make equivalent providers."""
+    if settings.get("provider") == "replay":
+        return ("replay", settings.get("replay_file", ""), float(settings.get("replay_speed", 1.0)),
+                bool(settings.get("replay_loop", True)))
+    return ("finnhub",)
+
+
+def make_provider(settings: dict) -> QuoteProvider:
+    """The provider described by the config's "market_data" section. Raises OSError/ValueError for a bad replay file."""
+    if settings.get("provider") == "replay":
+        if not settings.get("replay_file"):
+            raise ValueError("no replay file set")
+        return ReplayProvider(settings["replay_file"], settings.get("replay_speed", 1.0),
+                              settings.get("replay_loop", True))
+    return FinnhubProvider()
+
+
+# ── Replay files ──────────────────────────────────────────────────────────────
+def export_history(store, out: Path, symbols=None, hours: float | None = None) -> int:
+    """Write ticks from a TickStore to a replay file. Returns the number of ticks written."""
+    start = time.time() - hours * 3600 if hours else 0.0
+    n = 0
+    with open(out, "w") as f:
+        for sym, ts, price in store.window(symbols or store.symbols(), start):
+            f.write(json.dumps({"s": sym, "t": ts, "p": price}) + "\n")
+            n += 1
+    return n
+
+
+def generate_ticks(out: Path, symbols: int, hours: float, rate: float, volatility: float = 0.0005,
+                   seed: int | None = None) -> int:
+    """Write a random-walk replay file: `rate` ticks per second per symbol. Returns ticks written."""
+    rng   = np.random.default_rng(seed)
+    steps = max(1, int(hours * 3600 * rate))
+    t0    = time.time() - hours * 3600
+    n     = 0
+    with open(out, "w") as f:
+        for k in range(symbols):
+            sym    = f"R{k:04d}"
+            prices = 100 * np.exp(np.cumsum(rng.normal(0, volatility, steps)))
+            times  = t0 + np.arange(steps) / rate + rng.uniform(0, 1 / rate, steps)
+            f.writelines(f'{{"s": "{sym}", "t": {t:.3f}, "p": {p:.4f}}}\n'
+                         for t, p in zip(times.tolist(), prices.tolist()))
+            n += steps
+    return n
+
+
+def replay_benchmark(path: Path, speed: float, seconds: float, symbols: int | None, alert_pct: float,
+                     interval: float) -> dict:
+    """
+    Drive ticks from a replay file through the quote cache, price rings and
+    alert engine (with an in-memory cooldown store) for `seconds`, polling
+    every `interval` seconds, and report throughput.
+    """
+    import tempfile
+
+    from stockwatch.alerts import AlertEngine
+    from stockwatch.cooldown import CooldownStore
+    from stockwatch.quotes import QuoteScheduler, fetch_quotes
+    from stockwatch.ringbuffer import PriceRings
+
+    rings    = PriceRings()
+    provider = ReplayProvider(path, speed, loop=True, on_tick=rings.append)
+    watched  = provider.symbols()[:symbols] if symbols else provider.symbols()
+    stocks   = [{"symbol": s, "name": s, "alert_pct": alert_pct} for s in watched]
+    sched    = QuoteScheduler(provider, base_ttl=0)
+    engine   = AlertEngine(cooldown=60)
+    alerts   = polls = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        cooldowns = CooldownStore(Path(tmp) / "cooldowns.db")
+        started   = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            tick = time.perf_counter()
+            quotes, _ = fetch_quotes(sched.get_many, watched, 1, batch=provider.max_batch)
+            alerts += len(engine.evaluate(stocks, quotes, cooldowns, prices_at=rings.prices_at))
+            polls  += 1
+            time.sleep(max(0.0, interval - (time.perf_counter() - tick)))
+        elapsed = time.perf_counter() - started
+        cooldowns.close()
+    return {
+        "symbols":        len(watched),
+        "polls":          polls,
+        "ticks":          provider.played,
+        "ticks_per_sec":  provider.played / elapsed,
+        "quotes_per_sec": polls * len(watched) / elapsed,
+        "alerts":         alerts,
+        "seconds":        elapsed,
+    }
+
+
+def main():
+    ap  = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    ex = sub.add_parser("export", help="write the tick history database out as a replay file")
+    ex.add_argument("--history", type=Path, default=Path("stockwatch_history.db"))
+    ex.add_argument("--symbols", nargs="*", default=None)
+    ex.add_argument("--hours",   type=float, default=None, help="only the last N hours")
+    ex.add_argument("--out",     type=Path, default=Path("ticks.jsonl"))
+
+    gen = sub.add_parser("generate", help="write a synthetic random-walk replay file")
+    gen.add_argument("--symbols", type=int,   default=50)
+    gen.add_argument("--hours",   type=float, default=6.5)
+    gen.add_argument("--rate",    type=float, default=0.2, help="ticks per second per symbol")
+    gen.add_argument("--seed",    type=int,   default=None)
+    gen.add_argument("--out",     type=Path,  default=Path("ticks.jsonl"))
+
+    rp = sub.add_parser("replay", help="push a replay file through the alert pipeline and report throughput")
+    rp.add_argument("file",       type=Path)
+    rp.add_argument("--speed",    type=float, default=600)
+    rp.add_argument("--seconds",  type=float, default=20)
+    rp.add_argument("--symbols",  type=int,   default=None, help="watch only the first N symbols")
+    rp.add_argument("--alert-pct", type=float, default=1.0)
+    rp.add_argument("--interval", type=float, default=0.05, help="seconds between polls")
+    args = ap.parse_args()
+
+    if args.command == "export":
+        from stockwatch.history import TickStore
+        n = export_history(TickStore(args.history), args.out, args.symbols, args.hours)
+        print(f"wrote {n:,} ticks to {args.out}")
+    elif args.command == "generate":
+        n = generate_ticks(args.out, args.symbols, args.hours, args.rate, seed=args.seed)
+        print(f"wrote {n:,} ticks to {args.out}")
+    else:
+        r = replay_benchmark(args.file, args.speed, args.seconds, args.symbols, args.alert_pct, args.interval)
+        print(f"{r['symbols']} symbols, {r['polls']} polls in {r['seconds']:.1f}s: "
+              f"{r['ticks_per_sec']:,.0f} ticks/s replayed, {r['quotes_per_sec']:,.0f} quotes/s evaluated, "
+              f"{r['alerts']} alerts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+The process-wide quote cache and its rate-limited scheduler.
+
+One QuoteCache instance is shared by every Streamlit session in the server
+process, so N open dashboards watching the same ticker cost one HTTP call per
+TTL window instead of N. Concurrent misses for the same symbol are coalesced
+("single-flight"): the first caller fetches, the rest wait for its result.
+
+QuoteScheduler sits in front of the cache and keeps the process inside the
+provider's per-minute budget: every real call takes a token from a shared
+bucket, 429s pause the bucket, and symbols far from their alert threshold get
+longer TTLs so the budget goes to the quotes that can actually fire alerts.
+Quotes themselves come from a QuoteProvider (see stockwatch.providers), in
+batches of up to its `max_batch` symbols.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from stockwatch.metrics import METRICS
+from stockwatch.providers import FinnhubProvider, QuoteProvider
+from stockwatch.ratelimit import TokenBucket
+
+
+class QuoteDeferred(Exception):
+    """
+    Raised by a fetch function that decided not to call the API right now, for
+    the whole batch; an instance in its result dict defers just that symbol.
+    """
+
+
+class _Flight:
+    """A fetch in progress; followers block on `done` and read `result`."""
+
+    def __init__(self):
+        self.done   = threading.Event()
+        self.result = None
+
+
+class QuoteCache:
+    """
+    Thread-safe TTL cache with single-flight fetches and hit/miss counters.
+
+    `fetch_many(symbols)` returns symbol -> quote for one batch; get_many()
+    hands it every symbol of a lookup that is neither fresh nor already being
+    fetched by another caller, in a single call.
+    """
+
+    def __init__(self, fetch_many, ttl: float = 30.0):
+        self._fetch    = fetch_many
+        self.ttl       = ttl
+        self._lock     = threading.Lock()
+        self._entries  = {}   # symbol -> (fetched_at, quote or error)
+        self._good     = {}   # symbol -> last good quote, kept through later errors as the stale fallback
+        self._inflight = {}   # symbol -> _Flight
+        self.hits      = 0
+        self.misses    = 0    # misses sent to the provider
+        self.coalesced = 0    # misses that piggy-backed on another caller's call
+        self.deferred  = 0    # misses answered with a stale quote (fetch deferred)
+
+    def get(self, symbol: str, ttl: float | None = None) -> dict:
+        """Return a cached quote younger than `ttl` (default: the cache TTL), else fetch."""
+        return self.get_many([symbol], ttl)[symbol]
+
+    def get_many(self, symbols: list, ttl=None) -> dict:
+        """
+        symbol -> quote for every symbol, fetching the stale ones in one batch.
+        `ttl` is a number of seconds or a function of the symbol; None means
+        the cache TTL.
+        """
+        ttl     = self.ttl if ttl is None else ttl
+        max_age = ttl if callable(ttl) else (lambda _: ttl)
+        now     = time.monotonic()
+        results, leads, follows = {}, [], []
+        with self._lock:
+            for sym in dict.fromkeys(symbols):
+                entry = self._entries.get(sym)
+                if entry and now - entry[0] < max_age(sym):
+                    results[sym] = entry[1]
+                elif sym in self._inflight:
+                    follows.append((sym, self._inflight[sym]))
+                else:
+                    self._inflight[sym] = _Flight()
+                    leads.append(sym)
+            self.hits      += len(results)
+            self.misses    += len(leads)
+            self.coalesced += len(follows)
+        for result, n in (("hit", len(results)), ("miss", len(leads)), ("coalesced", len(follows))):
+            if n:
+                METRICS.inc("stockwatch_quote_cache_total", n, result=result)
+
+        if leads:
+            results.update(self._fetch_leads(leads))
+        for sym, flight in follows:
+            flight.done.wait()
+            results[sym] = flight.result
+        return {sym: results[sym] for sym in symbols}
+
+    def _fetch_leads(self, symbols: list) -> dict:
+        """Fetch symbols this caller leads, store the results and release their followers."""
+        try:
+            fetched = self._fetch(symbols)
+        except QuoteDeferred as e:
+            fetched = dict.fromkeys(symbols, e)
+        except Exception as e:
+            fetched = dict.fromkeys(symbols, {"error": str(e)})
+        out, flights = {}, []
+        with self._lock:
+            now = time.monotonic()
+            for sym in symbols:
+                result = fetched.get(sym, {"error": "no quote returned"})
+                if isinstance(result, QuoteDeferred):
+                    # Serve the last good quote, flagged stale, and retry on the next lookup
+                    self.deferred += 1
+                    METRICS.inc("stockwatch_quote_cache_total", result="deferred")
+                    good   = self._good.get(sym)
+                    result = {**good, "stale": True} if good else {"error": f"deferred: {result}"}
+                else:
+                    self._entries[sym] = (now, result)
+                    if "error" not in result:
+                        self._good[sym] = result
+                flight        = self._inflight.pop(sym)
+                flight.result = out[sym] = result
+                flights.append(flight)
+        for flight in flights:
+            flight.done.set()
+        return out
+
+    def has_quote(self, symbol: str) -> bool:
+        """True if a good (non-error) quote of any age is cached for `symbol`."""
+        with self._lock:
+            return symbol in self._good
+
+    def invalidate(self, symbols) -> None:
+        """Expire cached quotes for the given symbols only (kept as a stale fallback)."""
+        with self._lock:
+            for sym in symbols:
+                if sym in self._entries:
+                    self._entries[sym] = (float("-inf"), self._entries[sym][1])
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "hits":      self.hits,
+                "misses":    self.misses,
+                "coalesced": self.coalesced,
+                "deferred":  self.deferred,
+                "entries":   len(self._entries),
+                "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
+
+
+class QuoteScheduler:
+    """
+    Rate-limit-aware front end to a QuoteCache over a QuoteProvider.
+
+    TTLs scale with how close a symbol's last move is to its alert threshold:
+    at or past the threshold it uses `base_ttl` (default: the provider's), a
+    flat symbol stretches to `base_ttl * max_stretch`. Each call to a metered
+    provider takes a token from the bucket, however many symbols it carries;
+    when none is available a batch whose symbols all have cached quotes is
+    deferred (served stale), otherwise it waits up to `max_wait` for its turn.
+    """
+
+    def __init__(self, provider: QuoteProvider | None = None, calls_per_minute: float = 55, burst: float = 10,
+                 base_ttl: float | None = None, max_stretch: float = 4.0, max_wait: float = 15.0):
+        self.provider     = provider or FinnhubProvider()
+        self.burst        = burst
+        self.bucket       = TokenBucket(calls_per_minute / 60.0, min(burst, calls_per_minute))
+        self.base_ttl     = self.provider.ttl if base_ttl is None else base_ttl
+        self.cache        = QuoteCache(self._budgeted_fetch, ttl=self.base_ttl)
+        self.max_stretch  = max_stretch
+        self.max_wait     = max_wait
+        self.rate_limited = 0        # HTTP 429 responses seen
+        self._strikes     = 0        # consecutive 429s, for exponential backoff
+        self._proximity   = {}       # symbol -> |move| / alert_pct from the last observation
+
+    def set_budget(self, calls_per_minute: float) -> None:
+        """Re-size the bucket for a new budget; the burst shrinks with it, as in __init__."""
+        self.bucket.configure(calls_per_minute / 60.0, min(self.burst, calls_per_minute))
+
+    def _budgeted_fetch(self, symbols: list) -> dict:
+        if self.provider.metered:
+            cached = all(self.cache.has_quote(s) for s in symbols)
+            if not self.bucket.acquire(timeout=0.0 if cached else self.max_wait):
+                raise QuoteDeferred("API budget exhausted")
+        quotes  = self.provider.fetch_many(symbols)
+        limited = [s for s, q in quotes.items() if q.get("rate_limited")]
+        if not limited:
+            self._strikes = 0
+            return quotes
+        self.rate_limited += len(limited)
+        self._strikes     += 1
+        retry_after        = max(quotes[s].get("retry_after") or 0 for s in limited)
+        self.bucket.pause(retry_after or min(2 ** self._strikes, 60))
+        backoff = QuoteDeferred(f"rate limited by {self.provider.label} (HTTP 429), backing off")
+        return {**quotes, **dict.fromkeys(limited, backoff)}
+
+    def ttl_for(self, symbol: str) -> float:
+        prox = self._proximity.get(symbol)
+        if prox is None:
+            return self.base_ttl
+        return self.base_ttl * (1 + (self.max_stretch - 1) * (1 - min(prox, 1.0)))
+
+    def get(self, symbol: str, ttl: float | None = None) -> dict:
+        return self.get_many([symbol], ttl)[symbol]
+
+    def get_many(self, symbols: list, ttl: float | None = None) -> dict:
+        """symbol -> quote; stale symbols go to the provider together, in one budgeted call."""
+        return self.cache.get_many(symbols, self.ttl_for if ttl is None else ttl)
+
+    def observe(self, stocks: list, quotes: dict) -> None:
+        """Record how close each stock is to its alert threshold (drives its TTL)."""
+        for stock in stocks:
+            q = quotes.get(stock["symbol"], {})
+            if not q.get("c") or not stock.get("alert_pct"):
+                continue
+            ref = q.get("o") or q.get("pc") or q["c"]
+            move = abs(q["c"] - ref) / ref * 100 if ref else 0.0
+            self._proximity[stock["symbol"]] = move / stock["alert_pct"]
+
+    def prioritise(self, symbols: list) -> list:
+        """Order symbols nearest-to-threshold first so they get budget before quiet ones."""
+        return sorted(symbols, key=lambda s: -self._proximity.get(s, 1.0))
+
+    def invalidate(self, symbols) -> None:
+        self.cache.invalidate(symbols)
+
+    def stats(self) -> dict:
+        return {
+            **self.cache.stats(),
+            "rate_limited":   self.rate_limited,
+            "tokens":         self.bucket.available(),
+            "backoff":        self.bucket.paused_for(),
+            "calls_per_min":  self.bucket.rate * 60,
+        }
+
+
+def fetch_quotes(get_many, symbols: list, max_workers: int, batch: int = 1) -> tuple[dict, dict]:
+    """
+    Call `get_many(chunk)` for the symbols in chunks of `batch`, concurrently
+    through a bounded thread pool. Returns (quotes, timing) where timing holds
+    the wall-clock time of the whole fetch, the summed per-chunk latency (what
+    a sequential loop would have cost) and the number of chunks requested.
+    """
+    def timed(chunk: list) -> tuple[dict, float]:
+        t0 = time.perf_counter()
+        q  = get_many(chunk)
+        return q, time.perf_counter() - t0
+
+    t_start = time.perf_counter()
+    batch   = max(1, int(batch))
+    chunks  = [symbols[i:i + batch] for i in range(0, len(symbols), batch)]
+    results = []
+    if chunks:
+        workers = max(1, min(int(max_workers), len(chunks)))
+        if workers == 1:
+            results = [timed(chunk) for chunk in chunks]
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="quote") as pool:
+                results = list(pool.map(timed, chunks))
+    quotes = {sym: q for part, _ in results for sym, q in part.items()}
+    timing = {
+        "wall":       time.perf_counter() - t_start,
+        "sequential": sum(lat for _, lat in results),
+        "symbols":    len(symbols),
+        "requests":   len(chunks),
+    }
+    return quotes, timing
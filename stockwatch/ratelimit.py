@@ -0,0 +1,66 @@
+"""
+Token-bucket rate limiting for outbound API calls.
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second, bursting up to `capacity`.
+    `pause()` empties the bucket and blocks acquisition for a while, which is
+    how callers back off after an HTTP 429.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate          = rate
+        self.capacity      = capacity
+        self._tokens       = capacity
+        self._updated      = time.monotonic()
+        self._paused_until = 0.0
+        self._lock         = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens  = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: float = 0.0) -> bool:
+        """Take one token, waiting up to `timeout` seconds. Returns False if none came."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def configure(self, rate: float, capacity: float) -> None:
+        """Change the rate and burst; tokens above the new capacity are dropped."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate     = rate
+            self.capacity = capacity
+            self._tokens  = min(self._tokens, capacity)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens       = 0.0
+            self._updated      = now
+
+    def available(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return 0.0 if now < self._paused_until else self._tokens
+
+    def paused_for(self) -> float:
+        with self._lock:
+            return max(0.0, self._paused_until - time.monotonic())
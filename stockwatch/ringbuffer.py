@@ -0,0 +1,197 @@
+"""
+In-memory price history: one fixed-depth ring buffer per symbol.
+
+Each RingBuffer holds float64 time and price arrays of length 2 × depth and
+writes every tick twice (at slot i and i + depth). The newest n ticks are
+therefore always one contiguous slice, so windowed reads are zero-copy NumPy
+views, and appends are O(1) with no allocation.
+
+PriceRings keeps every symbol's arrays as one row of a shared pair of 2-D
+arrays, so prices_at() can look up many symbols at many times with a single
+vectorized binary search instead of one searchsorted per symbol. Sessions
+append and read concurrently, so PriceRings' readers take its lock and
+return copies rather than views.
+"""
+
+import itertools
+import threading
+
+import numpy as np
+
+
+class RingBuffer:
+    """Fixed-depth (time, price) history for one symbol, optionally over caller-owned arrays."""
+
+    def __init__(self, depth: int, t: np.ndarray | None = None, p: np.ndarray | None = None, row: int = -1):
+        self.depth = int(depth)
+        self._t    = np.zeros(2 * self.depth, dtype=np.float64) if t is None else t
+        self._p    = np.zeros(2 * self.depth, dtype=np.float64) if p is None else p
+        self.row   = row   # row in the owning PriceRings' arrays
+        self._head = 0     # next slot to write, in [0, depth)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, t: float, price: float) -> bool:
+        """Add a tick; ticks not newer than the last one are ignored. O(1)."""
+        if self._size and t <= self._t[self._head - 1 + self.depth]:
+            return False
+        i = self._head
+        self._t[i] = self._t[i + self.depth] = t
+        self._p[i] = self._p[i + self.depth] = price
+        self._head = (i + 1) % self.depth
+        self._size = min(self._size + 1, self.depth)
+        return True
+
+    def view(self, n: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Read-only (times, prices) views of the newest `n` ticks, oldest first.
+        Views alias the buffer, so copy them if they must outlive later appends.
+        """
+        n   = self._size if n is None else min(int(n), self._size)
+        end = self._head + self.depth
+        t, p = self._t[end - n:end], self._p[end - n:end]
+        t.flags.writeable = p.flags.writeable = False
+        return t, p
+
+    def since(self, start: float) -> tuple[np.ndarray, np.ndarray]:
+        """Zero-copy views of the ticks with time >= start."""
+        t, p = self.view()
+        i    = int(np.searchsorted(t, start, side="left"))
+        return t[i:], p[i:]
+
+    def oldest(self) -> float | None:
+        return float(self.view()[0][0]) if self._size else None
+
+    def latest(self) -> tuple[float, float] | None:
+        if not self._size:
+            return None
+        i = self._head - 1 + self.depth
+        return float(self._t[i]), float(self._p[i])
+
+
+class PriceRings:
+    """Thread-safe map of symbol -> RingBuffer, shared by every session in the process."""
+
+    def __init__(self, depth: int = 4096):
+        self.depth     = int(depth)
+        self._lock     = threading.Lock()
+        self._rings    = {}
+        self._complete = set()   # symbols whose ring was seeded with their entire stored history
+        self._rows     = {}      # symbol -> row of its ring in the arrays below
+        self._t        = np.zeros((0, 2 * self.depth), dtype=np.float64)   # one row per ring
+        self._p        = np.zeros((0, 2 * self.depth), dtype=np.float64)
+        self._state    = np.zeros((0, 2), dtype=np.intp)                     # (head, size) per row
+
+    def ring(self, symbol: str) -> RingBuffer:
+        ring = self._rings.get(symbol)
+        if ring is None:
+            with self._lock:
+                ring = self._rings.get(symbol)
+                if ring is None:
+                    row = len(self._rings)
+                    if row == len(self._t):
+                        self._grow()
+                    ring = self._rings[symbol] = RingBuffer(self.depth, self._t[row], self._p[row], row)
+                    self._rows[symbol] = row
+        return ring
+
+    def _grow(self) -> None:
+        """Double the row capacity (caller holds the lock); untouched rows cost no memory until written."""
+        rows   = max(16, 2 * len(self._t))
+        t, p   = np.zeros((rows, 2 * self.depth)), np.zeros((rows, 2 * self.depth))
+        state  = np.zeros((rows, 2), dtype=np.intp)
+        used   = len(self._rings)
+        t[:used], p[:used], state[:used] = self._t[:used], self._p[:used], self._state[:used]
+        self._t, self._p, self._state    = t, p, state
+        for ring in self._rings.values():
+            ring._t, ring._p = t[ring.row], p[ring.row]
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._rings
+
+    def append(self, symbol: str, t: float, price: float) -> bool:
+        ring = self.ring(symbol)
+        with self._lock:
+            if not ring.append(t, price):
+                return False
+            self._state[ring.row] = ring._head, ring._size
+            return True
+
+    def record_quotes(self, quotes: dict, now: float) -> None:
+        for sym, q in quotes.items():
+            if q.get("c") and "error" not in q:
+                self.append(sym, float(q.get("t") or now), float(q["c"]))
+
+    def warm(self, symbol: str, ticks) -> None:
+        """Seed a new symbol's ring from stored (ts, price) ticks, oldest first."""
+        ticks = list(ticks)
+        for t, price in ticks[-self.depth:]:
+            self.append(symbol, t, price)
+        if len(ticks) < self.depth:
+            self._complete.add(symbol)
+
+    def covers(self, symbol: str, start: float) -> bool:
+        """True if the ring holds every known tick from `start` onwards."""
+        with self._lock:    # size and head must come from the same append
+            ring = self._rings.get(symbol)
+            if ring is None:
+                return False
+            if symbol in self._complete and len(ring) < ring.depth:
+                return True   # nothing has been evicted yet, and nothing older exists on disk
+            oldest = ring.oldest()
+        return oldest is not None and oldest <= start
+
+    def since(self, symbol: str, start: float) -> tuple[np.ndarray, np.ndarray]:
+        """Copies of the ticks with time >= start, taken under the lock (appends and _grow() run concurrently)."""
+        ring = self.ring(symbol)
+        with self._lock:
+            t, p = ring.since(start)
+            return t.copy(), p.copy()
+
+    def price_at(self, symbol: str, t: float) -> float:
+        """Price of the last tick at or before `t`, or NaN if the ring doesn't reach back that far."""
+        with self._lock:
+            ring = self._rings.get(symbol)
+            if ring is None:
+                return float("nan")
+            times, prices = ring.view()
+            i = int(np.searchsorted(times, t, side="right")) - 1
+            return float(prices[i]) if i >= 0 else float("nan")
+
+    def prices_at(self, symbols, times) -> np.ndarray:
+        """
+        price_at() for many (symbol, time) pairs at once: one binary search
+        over every ring in lockstep, ~log2(depth) NumPy steps whatever the
+        number of symbols. NaN where there is no ring or it doesn't reach back.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        out   = np.full(len(times), np.nan)
+        rows  = np.fromiter(map(self._rows.get, symbols, itertools.repeat(-1)), dtype=np.intp, count=len(times))
+        with self._lock:     # heads, sizes and the arrays must agree with each other
+            if not len(self._state):
+                return out   # no rings yet, and row -1 would not index anything
+            state     = self._state[rows]
+            idx       = np.flatnonzero((rows >= 0) & (state[:, 1] > 0))
+            if not len(idx):
+                return out
+            rows      = rows[idx]
+            end       = state[idx, 0] + self.depth
+            first     = end - state[idx, 1]
+            t         = times[idx]
+            lo, hi    = first.copy(), end.copy()
+            while True:      # lo = first slot whose time is > t, per ring
+                active = lo < hi
+                if not active.any():
+                    break
+                mid   = (lo + hi) // 2
+                le    = self._t[rows, mid] <= t
+                lo    = np.where(active & le, mid + 1, lo)
+                hi    = np.where(active & ~le, mid, hi)
+            found      = lo > first
+            out[idx[found]] = self._p[rows[found], lo[found] - 1]
+        return out
+
+    def nbytes(self) -> int:
+        return len(self._rings) * 2 * self._t.shape[1] * self._t.itemsize
@@ -0,0 +1,122 @@
+"""
+Streaming trade ingestion over the Finnhub WebSocket API.
+
+A TradeStream runs in a daemon thread, subscribes to trade updates for the
+watched symbols and keeps a PriceTable of the latest traded price per symbol.
+REST /quote is still used for the reference fields (open, prev close, high,
+low); `overlay_quote` merges the live price on top of that.
+"""
+
+import json
+import threading
+import time
+from importlib.util import find_spec
+
+from stockwatch.providers import FINNHUB_KEY
+
+# websockets is only imported once a stream actually starts
+STREAMING_AVAILABLE = find_spec("websockets") is not None
+
+FINNHUB_WS_URL = f"wss://ws.finnhub.io?token={FINNHUB_KEY}"
+
+# While streaming, REST only supplies open / prev close / high / low, so it can be much staler
+REFERENCE_TTL = 300
+
+
+class PriceTable:
+    """Latest traded price per symbol, safe to read from any thread."""
+
+    def __init__(self):
+        self._lock   = threading.Lock()
+        self._prices = {}   # symbol -> (price, trade_ts_seconds, received_at)
+
+    def update(self, symbol: str, price: float, ts: float) -> None:
+        with self._lock:
+            current = self._prices.get(symbol)
+            if current is None or ts >= current[1]:
+                self._prices[symbol] = (price, ts, time.time())
+
+    def get(self, symbol: str) -> tuple | None:
+        with self._lock:
+            return self._prices.get(symbol)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._prices)
+
+
+def overlay_quote(quote: dict, live: tuple | None) -> dict:
+    """Return `quote` with its current price replaced by the live trade price."""
+    if live is None:
+        return quote
+    price, ts, _ = live
+    if "error" in quote:
+        # No reference fields yet; show the live price without a day change
+        return {"c": price, "t": int(ts), "live": True}
+    merged = {**quote, "c": price, "t": int(ts), "live": True}
+    if quote.get("h"):
+        merged["h"] = max(quote["h"], price)
+    if quote.get("l"):
+        merged["l"] = min(quote["l"], price)
+    return merged
+
+
+class TradeStream(threading.Thread):
+    """Background WebSocket subscriber feeding a PriceTable, with reconnect backoff."""
+
+    def __init__(self, url: str = FINNHUB_WS_URL, table: PriceTable | None = None, on_trade=None):
+        super().__init__(name="trade-stream", daemon=True)
+        self.url         = url
+        self.table       = table or PriceTable()
+        self.on_trade    = on_trade   # optional callback(symbol, ts, price) for every trade
+        self.status      = "starting"
+        self.trades      = 0
+        self._lock       = threading.Lock()
+        self._symbols    = set()
+        self._stop_event = threading.Event()   # not _stop: that would shadow Thread._stop()
+
+    def subscribe(self, symbols) -> None:
+        """Add symbols to the subscription set; new ones are sent on the next loop."""
+        with self._lock:
+            self._symbols.update(symbols)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def run(self):
+        from websockets.sync.client import connect as ws_connect
+        backoff = 1.0
+        while not self._stop_event.is_set():
+            try:
+                with ws_connect(self.url, open_timeout=10) as ws:
+                    self.status = "connected"
+                    backoff     = 1.0
+                    sent        = set()
+                    while not self._stop_event.is_set():
+                        with self._lock:
+                            pending = self._symbols - sent
+                        for sym in pending:
+                            ws.send(json.dumps({"type": "subscribe", "symbol": sym}))
+                            sent.add(sym)
+                        try:
+                            raw = ws.recv(timeout=1.0)
+                        except TimeoutError:
+                            continue
+                        self._handle(raw)
+            except Exception as e:
+                self.status = f"reconnecting ({e.__class__.__name__}: {e})"
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, 60.0)
+        self.status = "stopped"
+
+    def _handle(self, raw) -> None:
+        msg = json.loads(raw)
+        if msg.get("type") != "trade":
+            return   # "ping" keep-alives and subscription errors
+        for trade in msg.get("data", []):
+            # Finnhub trade: {"s": symbol, "p": price, "t": epoch ms, "v": volume}
+            sym, price, ts = trade["s"], float(trade["p"]), trade["t"] / 1000.0
+            self.table.update(sym, price, ts)
+            if self.on_trade is not None:
+                self.on_trade(sym, ts, price)
+            self.trades += 1
@@ -0,0 +1,166 @@
+"""
+Local symbol index for ticker and company-name autocomplete.
+
+SymbolCatalog downloads the exchange listing from Finnhub's /stock/symbol
+once, keeps it in SYMBOL_FILE and refreshes it in the background when it is
+older than REFRESH_DAYS. SymbolIndex holds two sorted key arrays: the tickers,
+and every word-suffix of every company name ("APPLE INC" also as "INC"), so
+"appl", "apple in" and "alphabet" all resolve with a pair of bisects. A
+lookup costs microseconds and never touches the network.
+
+    python -m stockwatch.symbols --download          # fetch the listing now
+    python -m stockwatch.symbols apple               # query the local index
+"""
+
+import argparse
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from stockwatch.config import atomic_write_json
+from stockwatch.providers import fetch_symbol_list
+
+SYMBOL_FILE  = Path("stockwatch_symbols.json")
+EXCHANGES    = ("US",)      # Finnhub exchange codes in the listing
+REFRESH_DAYS = 7
+RETRY_AFTER  = 600          # seconds between attempts after a failed download
+STOPWORDS    = {"INC", "CORP", "CO", "LTD", "PLC", "LLC", "LP", "SA", "AG", "NV", "THE", "OF", "AND", "&",
+                "CLASS", "A", "B", "C", "HOLDINGS", "GROUP", "TRUST", "FUND", "ETF", "-"}
+
+log = logging.getLogger("stockwatch.symbols")
+
+_END = "\U0010ffff"   # sorts after every character: prefix + _END bounds a prefix range
+
+
+class SymbolIndex:
+    """Sorted-array prefix index over (symbol, company name) pairs."""
+
+    def __init__(self, entries):
+        self.names   = {}                     # symbol -> company name
+        for sym, name in entries:
+            self.names.setdefault(sym, name)
+        self.symbols = sorted(self.names, key=str.upper)
+        self._keys   = [s.upper() for s in self.symbols]
+        words        = []
+        for sym, name in self.names.items():
+            parts = name.upper().split()
+            words.extend((" ".join(parts[i:]), sym) for i in range(len(parts)) if parts[i] not in STOPWORDS)
+        words.sort()
+        self._words     = [w for w, _ in words]
+        self._word_syms = [s for _, s in words]
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def search(self, query: str, limit: int = 8) -> list[tuple[str, str]]:
+        """
+        Up to `limit` (symbol, name) pairs: tickers starting with the query
+        first (an exact ticker leads), then companies with a name word
+        starting with it.
+        """
+        q = " ".join(query.upper().split())
+        if not q:
+            return []
+        lo    = bisect_left(self._keys, q)
+        hi    = bisect_left(self._keys, q + _END, lo)
+        found = {sym: self.names[sym] for sym in self.symbols[lo:min(hi, lo + limit)]}
+        lo = bisect_left(self._words, q)
+        hi = bisect_left(self._words, q + _END, lo)
+        for i in range(lo, hi):
+            if len(found) >= limit:
+                break
+            found.setdefault(self._word_syms[i], self.names[self._word_syms[i]])
+        return list(found.items())[:limit]
+
+    def name_for(self, symbol: str) -> str:
+        """Company name of an exact ticker, or ""."""
+        return self.names.get(symbol.upper().strip(), "")
+
+
+class SymbolCatalog:
+    """The persisted exchange listing and its index, downloaded in the background when missing or stale."""
+
+    def __init__(self, path: Path = SYMBOL_FILE, exchanges=EXCHANGES, max_age: float = REFRESH_DAYS * 86400,
+                 download=fetch_symbol_list):
+        self.path      = Path(path)
+        self.exchanges = tuple(exchanges)
+        self.max_age   = max_age
+        self._download = download
+        self._lock     = threading.Lock()
+        self._thread   = None
+        self._failed   = 0.0      # time.time() of the last failed download
+        self.index     = SymbolIndex([])
+        self.updated   = None     # time.time() the listing was downloaded
+        self.error     = None     # why the last download failed
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.index   = SymbolIndex(saved.get("symbols", []))
+        self.updated = saved.get("downloaded_at")
+
+    def stale(self) -> bool:
+        return self.updated is None or time.time() - self.updated > self.max_age
+
+    def ensure(self) -> bool:
+        """Start a background download if the listing is missing or stale. True while one is running."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return True
+            if not self.stale() or time.time() - self._failed < RETRY_AFTER:
+                return False
+            self._thread = threading.Thread(target=self.download, name="symbol-listing", daemon=True)
+            self._thread.start()
+            return True
+
+    def download(self) -> int:
+        """Fetch every exchange's listing, save it and swap in a new index. Returns the number of symbols."""
+        try:
+            entries = [(row["symbol"], row.get("description") or "")
+                       for exchange in self.exchanges for row in self._download(exchange) if row.get("symbol")]
+        except Exception as e:
+            log.warning("symbol listing download failed: %s", e)
+            self.error, self._failed = str(e), time.time()
+            return 0
+        now = time.time()
+        atomic_write_json(self.path, {"downloaded_at": now, "exchanges": list(self.exchanges), "symbols": entries})
+        self.index, self.updated, self.error = SymbolIndex(entries), now, None
+        return len(self.index)
+
+    def search(self, query: str, limit: int = 8) -> list[tuple[str, str]]:
+        return self.index.search(query, limit)
+
+    def name_for(self, symbol: str) -> str:
+        return self.index.name_for(symbol)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("query",      nargs="?", default="", help="prefix of a ticker or company name")
+    ap.add_argument("--download", action="store_true",   help="download the listing now")
+    ap.add_argument("--file",     type=Path, default=SYMBOL_FILE)
+    ap.add_argument("--limit",    type=int,  default=8)
+    args = ap.parse_args()
+
+    catalog = SymbolCatalog(args.file)
+    if args.download or catalog.updated is None:
+        n = catalog.download()
+        print(f"downloaded {n:,} symbols to {args.file}" if n else f"download failed: {catalog.error}")
+    if args.query:
+        started = time.perf_counter()
+        matches = catalog.search(args.query, args.limit)
+        elapsed = (time.perf_counter() - started) * 1e6
+        for sym, name in matches:
+            print(f"{sym:<12} {name}")
+        print(f"{len(matches)} of {len(catalog.index):,} symbols in {elapsed:.0f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Watchlist views that stay cheap at hundreds of symbols.
+
+quote_frame() flattens the watchlist and its quotes into one DataFrame with
+the derived columns (move from open, alert state, status) computed
+column-wise, which drives both the sortable table view and the card grid.
+CardRenderer turns rows into the card HTML and memoises it per symbol, so a
+refresh only rebuilds the cards whose quote or alert state changed; a page of
+cards is emitted as one batched grid instead of one element per card.
+"""
+
+import html
+import threading
+
+import numpy as np
+import pandas as pd
+
+from stockwatch.alerts import currency_for
+
+LARGE_WATCHLIST = 60      # "auto" view switches from cards to the table above this many symbols
+SORT_ORDERS     = ["Watchlist order", "Alerts first", "Biggest move", "Symbol"]
+
+_QUOTE_FIELDS = {"c": "price", "o": "day_open", "pc": "prev_close", "h": "high", "l": "low"}
+
+
+def quote_frame(stocks: list, quotes: dict, breached=()) -> pd.DataFrame:
+    """
+    One row per watched stock: symbol, name, alert_pct, price, day_open,
+    prev_close, high, low, ref, change_abs, change_pct, alert, live, status
+    ("ok" | "error" | "no data") and error, in watchlist order.
+    """
+    rows = []
+    for stock in stocks:
+        q = quotes.get(stock["symbol"]) or {}
+        rows.append({
+            "symbol":    stock["symbol"],
+            "name":      stock.get("name", ""),
+            "alert_pct": stock.get("alert_pct", 0.0),
+            **{col: q.get(key) for key, col in _QUOTE_FIELDS.items()},
+            "live":      bool(q.get("live")),
+            "error":     q.get("error", ""),
+            "empty":     not q,
+        })
+    df = pd.DataFrame(rows, columns=["symbol", "name", "alert_pct", *_QUOTE_FIELDS.values(), "live", "error", "empty"])
+    for col in _QUOTE_FIELDS.values():
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+
+    price = df["price"]
+    # Same fallbacks as a single card: missing high/low/prev close show the price,
+    # and the move is measured from the open, else the previous close, else flat
+    df["prev_close"] = df["prev_close"].fillna(price)
+    df["day_open"]   = df["day_open"].fillna(df["prev_close"])
+    df["high"]       = df["high"].fillna(price)
+    df["low"]        = df["low"].fillna(price)
+    ref              = df["day_open"].where(df["day_open"] != 0, df["prev_close"])
+    df["ref"]        = ref.where(ref != 0, price)
+    df["change_abs"] = price - df["ref"]
+    df["change_pct"] = np.where(df["ref"] != 0, df["change_abs"] / df["ref"] * 100, 0.0)
+    df["alert"]      = df["symbol"].isin(set(breached))
+    df["status"]     = np.select(
+        [df["error"] != "", df["empty"] | price.fillna(0).eq(0)], ["error", "no data"], default="ok")
+    return df.drop(columns="empty")
+
+
+def sort_frame(df: pd.DataFrame, order: str) -> pd.DataFrame:
+    """Reorder quote_frame() rows by one of SORT_ORDERS (stable, so ties keep watchlist order)."""
+    if order == "Alerts first":
+        return df.sort_values("alert", ascending=False, kind="stable")
+    if order == "Biggest move":
+        return df.iloc[np.argsort(-df["change_pct"].abs().fillna(-1).to_numpy(), kind="stable")]
+    if order == "Symbol":
+        return df.sort_values("symbol", kind="stable")
+    return df
+
+
+class CardRenderer:
+    """Per-symbol memo of card HTML, keyed on everything the card displays."""
+
+    def __init__(self):
+        self._lock   = threading.Lock()
+        self._cards  = {}    # symbol -> (signature, html)
+        self.built   = 0
+        self.reused  = 0
+
+    def card(self, row) -> str:
+        """HTML for one quote_frame() row (an itertuples() record)."""
+        sig = repr(row)   # every displayed field; repr() so NaN prices compare equal
+        with self._lock:
+            hit = self._cards.get(row.symbol)
+            if hit is not None and hit[0] == sig:
+                self.reused += 1
+                return hit[1]
+        markup = _card_html(row)
+        with self._lock:
+            self._cards[row.symbol] = (sig, markup)
+            self.built += 1
+        return markup
+
+    def grid(self, df: pd.DataFrame) -> str:
+        """All rows of `df` as one responsive card grid."""
+        return '<div class="card-grid">' + "".join(self.card(r) for r in df.itertuples(index=False)) + "</div>"
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"cached": len(self._cards), "built": self.built, "reused": self.reused}
+
+
+def _card_html(r) -> str:
+    sym, name = html.escape(r.symbol), html.escape(r.name)
+    head      = f'<div class="ticker-symbol">{sym}</div><div class="company-name">{name}</div>'
+    if r.status == "error":
+        return f'<div class="metric-card">{head}<div class="change-neg">❌ {html.escape(r.error)}</div></div>'
+    if r.status == "no data":
+        return (f'<div class="metric-card">{head}<div class="change-neutral">'
+                f'⚠️ No data (market closed or invalid symbol)</div></div>')
+
+    cur       = currency_for(r.symbol)
+    color_cls = "change-pos" if r.change_pct > 0 else ("change-neg" if r.change_pct < 0 else "change-neutral")
+    arrow     = "▲" if r.change_pct > 0 else ("▼" if r.change_pct < 0 else "—")
+    badge     = ('<span class="badge badge-alert">⚡ ALERT</span>'
+                 if r.alert else '<span class="badge badge-ok">✓ NORMAL</span>')
+    if r.live:
+        badge += ' <span class="badge badge-ok">● LIVE</span>'
+    return (
+        f'<div class="metric-card{" alert-card" if r.alert else ""}">{head}'
+        f'<div class="price-big {color_cls}">{cur}{r.price:,.3f}</div>'
+        f'<div style="margin-top:8px" class="{color_cls}">'
+        f'{arrow} {abs(r.change_abs):.3f} &nbsp;({abs(r.change_pct):.2f}%)</div>'
+        f'<hr style="border-color:#1e2d40;margin:12px 0"/>'
+        f'<div style="font-size:0.75rem;color:#64748b;font-family:\'Space Mono\',monospace">'
+        f'H: {cur}{r.high:,.3f} &nbsp;|&nbsp; L: {cur}{r.low:,.3f}<br>'
+        f'Prev close: {cur}{r.prev_close:,.3f}<br>'
+        f'Alert threshold: ±{r.alert_pct:.1f}%</div>'
+        f'<div style="margin-top:10px">{badge}</div></div>'
+    )
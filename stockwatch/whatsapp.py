@@ -0,0 +1,201 @@
+"""
+WhatsApp delivery through GREEN API.
+
+Every helper takes the "whatsapp" section of the config
+({"id_instance", "api_token", "recipients"}) so it can run outside Streamlit.
+
+GREEN API clients are cached per credential pair, and InstanceStateMonitor
+polls getStateInstance in the background so senders can tell, without a
+round-trip, whether the instance is authorised.
+"""
+
+import os
+import threading
+import time
+from importlib.util import find_spec
+
+from stockwatch.httpclient import CLIENT
+from stockwatch.metrics import METRICS
+
+GREENAPI_BASE = os.environ.get("STOCKWATCH_GREENAPI_BASE", "https://api.green-api.com")   # override for mock_http
+STATE_POLL    = 60    # seconds between background getStateInstance checks
+
+# Instance states in which sendMessage cannot succeed; anything else (including
+# a failed check) is treated as sendable and left to the normal retry logic
+UNSENDABLE_STATES = {"notAuthorized", "blocked", "sleepMode", "starting"}
+
+# Package: whatsapp-api-client-python  (pip name)
+# Module:  whatsapp_api_client_python  (import name)
+# Both are only probed here: the SDK pulls in aiohttp, which costs a few hundred
+# ms at startup, so it is imported when the first client is created
+WA_AVAILABLE = find_spec("whatsapp_api_client_python") is not None
+QR_AVAILABLE = find_spec("qrcode") is not None
+
+
+def credentials(wa: dict) -> tuple[str, str]:
+    return wa.get("id_instance", "").strip(), wa.get("api_token", "").strip()
+
+
+def fmt_phone_for_greenapi(phone: str) -> str:
+    """Convert +447700900000 → 447700900000@c.us"""
+    clean = phone.replace("+", "").replace(" ", "").replace("-", "")
+    return f"{clean}@c.us"
+
+
+_clients      = {}
+_clients_lock = threading.Lock()
+
+
+def can_send(wa: dict) -> bool:
+    """Whether a client can be built for these credentials, without importing the SDK."""
+    id_inst, api_tok = credentials(wa)
+    return bool(id_inst and api_tok and WA_AVAILABLE)
+
+
+def get_green_api_client(wa: dict):
+    """Return the long-lived GreenAPI client for these credentials, or None if credentials missing."""
+    if not can_send(wa):
+        return None
+    id_inst, api_tok = credentials(wa)
+    with _clients_lock:
+        client = _clients.get((id_inst, api_tok))
+        if client is None:
+            from whatsapp_api_client_python import API as GreenAPI
+            client = GreenAPI.GreenAPI(id_inst, api_tok, host=GREENAPI_BASE,
+                                       host_timeout=CLIENT.timeouts["greenapi.send"])
+            # The SDK's own session sends "Connection: close" and retries 429s itself;
+            # use the pooled keep-alive session and let DeliveryQueue own retries
+            client.session = CLIENT.session(GREENAPI_BASE)
+            _clients[(id_inst, api_tok)] = client
+    return client
+
+
+def get_qr_from_greenapi(wa: dict) -> bytes | str | None:
+    """
+    Call GREEN API's QR endpoint and return PNG bytes, or None on failure.
+    Endpoint: GET /waInstance{id}/qr/{token}
+    """
+    id_inst, api_tok = credentials(wa)
+    if not id_inst or not api_tok:
+        return None
+    try:
+        url = f"{GREENAPI_BASE}/waInstance{id_inst}/qr/{api_tok}"
+        r = CLIENT.get(url, endpoint="greenapi.qr")
+        data = r.json()
+        # Response: {"type": "qrCode", "message": "<base64>"}
+        # or       {"type": "alreadyLogged", ...}
+        # or       {"type": "alreadyLogged", ...}
+        if data.get("type") == "qrCode" and QR_AVAILABLE:
+            import base64
+            qr_b64 = data["message"]
+            png_bytes = base64.b64decode(qr_b64)
+            return png_bytes
+        elif data.get("type") in ("alreadyLogged", "accountDeleted"):
+            return data.get("type")  # sentinel string
+    except Exception:
+        pass
+    return None
+
+
+def check_greenapi_state(wa: dict) -> str:
+    """Return GREEN API account state: 'authorized', 'notAuthorized', or 'error'."""
+    id_inst, api_tok = credentials(wa)
+    if not id_inst or not api_tok:
+        return "no_credentials"
+    try:
+        url = f"{GREENAPI_BASE}/waInstance{id_inst}/getStateInstance/{api_tok}"
+        r = CLIENT.get(url, endpoint="greenapi.state")
+        state = r.json().get("stateInstance", "error")
+        return state
+    except Exception:
+        return "error"
+
+
+def send_one(client, phone: str, message: str) -> tuple[bool, str, bool]:
+    """
+    Send `message` to one phone number. Returns (ok, error, retryable):
+    network failures, HTTP 429 and 5xx are worth retrying, other errors are not.
+    """
+    try:
+        with METRICS.span("send"):
+            resp = client.sending.sendMessage(fmt_phone_for_greenapi(phone), message)
+    except Exception as e:
+        return False, str(e), True
+    if resp.code == 200:
+        return True, "", False
+    if resp.code is None:   # the client swallows connection errors and returns no status
+        return False, resp.error or "no response", True
+    return False, f"HTTP {resp.code}", resp.code == 429 or resp.code >= 500
+
+
+def send_whatsapp_messages(message: str, recipients: list, wa: dict) -> list:
+    """Send message to all recipients, one at a time. Returns list of (name, phone, ok, error)."""
+    client = get_green_api_client(wa)
+    if client is None:
+        return [(r["name"], r["phone"], False, "Client not configured") for r in recipients]
+
+    results = []
+    for rec in recipients:
+        ok, err, _ = send_one(client, rec["phone"], message)
+        results.append((rec["name"], rec["phone"], ok, err))
+    return results
+
+
+class InstanceStateMonitor:
+    """
+    Background getStateInstance poller. Credentials passed to watch() are
+    checked every `interval` seconds on one daemon thread; state() and
+    sendable() answer from the cache.
+    """
+
+    def __init__(self, interval: float = STATE_POLL, check=check_greenapi_state):
+        self.interval = interval
+        self._check   = check
+        self._lock    = threading.Lock()
+        self._wake    = threading.Event()
+        self._watched = {}    # (id_instance, api_token) -> wa dict
+        self._states  = {}    # (id_instance, api_token) -> (state, checked_at)
+        threading.Thread(target=self._run, name="greenapi-state", daemon=True).start()
+
+    def watch(self, wa: dict) -> None:
+        """Start polling these credentials (no-op if already watched)."""
+        key = credentials(wa)
+        if not all(key):
+            return
+        with self._lock:
+            if key in self._watched:
+                return
+            self._watched[key] = {"id_instance": key[0], "api_token": key[1]}
+        self._wake.set()      # check new credentials straight away
+
+    def refresh(self, wa: dict) -> str:
+        """Check now, synchronously, and cache the result."""
+        state = self._check(wa)
+        key   = credentials(wa)
+        if all(key):
+            with self._lock:
+                self._states[key] = (state, time.time())
+        return state
+
+    def state(self, wa: dict) -> tuple[str | None, float | None]:
+        """(last known state, when it was checked); (None, None) before the first check."""
+        with self._lock:
+            return self._states.get(credentials(wa), (None, None))
+
+    def sendable(self, wa: dict) -> bool:
+        """False only when the last check says the instance cannot send."""
+        return self.state(wa)[0] not in UNSENDABLE_STATES
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                now = time.time()
+                due = [wa for key, wa in self._watched.items()
+                       if now - self._states.get(key, (None, float("-inf")))[1] >= self.interval]
+            for wa in due:
+                self.refresh(wa)
+            with self._lock:
+                next_due = min((self._states.get(key, (None, 0.0))[1] + self.interval for key in self._watched),
+                               default=time.time() + self.interval)
+            self._wake.wait(max(0.0, next_due - time.time()))
+            self._wake.clear()
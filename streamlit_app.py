@@ -4,28 +4,32 @@ pip install streamlit requests pandas whatsapp-api-client-python qrcode Pillow
 """
 
 import streamlit as st
-import requests
 import time
 import json
-import io
 import pandas as pd
 from datetime import datetime
-from pathlib import Path
 
-# ── GREEN API / WhatsApp import ───────────────────────────────────────────────
-# Package: whatsapp-api-client-python  (pip name)
-# Module:  whatsapp_api_client_python  (import name)
-try:
-    from whatsapp_api_client_python import API as GreenAPI
-    WA_AVAILABLE = True
-except ImportError:
-    WA_AVAILABLE = False
-
-try:
-    import qrcode
-    QR_AVAILABLE = True
-except ImportError:
-    QR_AVAILABLE = False
+from stockwatch.alerts import AlertEngine, build_alert_message, describe_rule
+from stockwatch.candles import CandleBackfiller, CandleStore
+from stockwatch.config import (DEFAULT_CONFIG, apply_config_changes, config_store, copy_config, default_config,
+                               describe_changes, diff_config, normalise_config, serialise_config, tenant_config_path,
+                               tenant_name)
+from stockwatch.cooldown import CooldownStore
+from stockwatch.delivery import DeliveryQueue, DigestCoalescer
+from stockwatch.monitor import read_monitor_state, tenant_state_path
+from stockwatch.outbox import Outbox
+from stockwatch.providers import PROVIDERS, make_provider, provider_key
+from stockwatch.history import TickStore
+from stockwatch.httpclient import CLIENT as http_client
+from stockwatch.metrics import METRICS, METRICS_FILE
+from stockwatch.quotes import QuoteScheduler, fetch_quotes
+from stockwatch.ringbuffer import PriceRings
+from stockwatch.watchlist import LARGE_WATCHLIST, SORT_ORDERS, CardRenderer, quote_frame, sort_frame
+from stockwatch.symbols import SymbolCatalog
+from stockwatch.streaming import FINNHUB_WS_URL, REFERENCE_TTL, STREAMING_AVAILABLE, TradeStream, overlay_quote
+from stockwatch.whatsapp import WA_AVAILABLE, InstanceStateMonitor, get_qr_from_greenapi
+
+script_started = time.perf_counter()
 
 # ── Page config ───────────────────────────────────────────────────────────────
 st.set_page_config(
@@ -48,6 +52,8 @@ h1,h2,h3{font-family:'Space Mono',monospace;}
 .metric-card{background:var(--surface);border:1px solid var(--border);border-radius:12px;
   padding:20px 24px;position:relative;overflow:hidden;transition:border-color 0.3s;margin-bottom:16px;}
 .metric-card:hover{border-color:var(--accent);}
+.card-grid{display:grid;grid-template-columns:repeat(auto-fill,minmax(260px,1fr));gap:16px;margin-bottom:16px;}
+.card-grid .metric-card{margin-bottom:0;}
 .metric-card::before{content:'';position:absolute;top:0;left:0;right:0;height:2px;
   background:linear-gradient(90deg,var(--accent),transparent);}
 .metric-card.alert-card::before{background:linear-gradient(90deg,var(--red),var(--yellow));
@@ -82,172 +88,272 @@ h1,h2,h3{font-family:'Space Mono',monospace;}
 """, unsafe_allow_html=True)
 
 # ── Constants ─────────────────────────────────────────────────────────────────
-FINNHUB_KEY  = "d6c5mt1r01qsiik0ricgd6c5mt1r01qsiik0rid0"
-FINNHUB_BASE = "https://finnhub.io/api/v1"
-CONFIG_FILE  = Path("stockwatch_config.json")
-
-DEFAULT_CONFIG = {
-    "stocks": [
-        {"symbol": "CSCO",  "name": "Cisco Systems",    "alert_pct": 2.0},
-        {"symbol": "GSK",   "name": "GSK plc",           "alert_pct": 2.0},
-        {"symbol": "GOOGL", "name": "Alphabet (Google)", "alert_pct": 2.0},
-    ],
-    "whatsapp": {
-        "id_instance":    "",   # GREEN API Instance ID
-        "api_token":      "",   # GREEN API Token
-        "recipients":     [],   # [{"name": str, "phone": str}]
-    },
-    "refresh_interval": 60,
-}
-
-# ── Config helpers ────────────────────────────────────────────────────────────
-def load_config() -> dict:
-    if CONFIG_FILE.exists():
-        try:
-            with open(CONFIG_FILE) as f:
-                saved = json.load(f)
-            return {
-                "stocks":           saved.get("stocks",           DEFAULT_CONFIG["stocks"]),
-                "whatsapp":         {**DEFAULT_CONFIG["whatsapp"], **saved.get("whatsapp", {})},
-                "refresh_interval": saved.get("refresh_interval", 60),
-            }
-        except Exception:
-            pass
-    return json.loads(json.dumps(DEFAULT_CONFIG))
-
-
-def serialise_config(cfg: dict) -> dict:
-    return {
-        "stocks":           cfg["stocks"],
-        "whatsapp":         cfg["whatsapp"],
-        "refresh_interval": cfg["refresh_interval"],
-    }
-
-
-def save_config(cfg: dict):
-    with open(CONFIG_FILE, "w") as f:
-        json.dump(serialise_config(cfg), f, indent=2)
-
+HISTORY_WINDOWS = {"Last hour": 3600, "Last 6 hours": 6 * 3600, "Last 24 hours": 86400, "Last 7 days": 7 * 86400}
+CANDLE_WINDOWS  = {"Last 5 days (5-min candles)": ("5", 5 * 86400), "Last year (daily candles)": ("D", 365 * 86400)}
+METRICS_EVERY   = 10    # seconds between rewrites of the Prometheus text file
+
+# ── User namespace ────────────────────────────────────────────────────────────
+# ?user=<name> selects a per-user config (stockwatch_users/<name>/); without it
+# the shared stockwatch_config.json is used. This namespaces watchlists, it does
+# not authenticate: put the app behind a login if users must not see each other
+try:
+    tenant = tenant_name(st.query_params.get("user", ""))
+except ValueError as e:
+    st.error(f"❌ {e}")
+    st.stop()
+if st.session_state.get("tenant", tenant) != tenant:
+    for key in ("config", "config_base", "alert_engine", "wa_status_msg", "save_msg", "rules_editor"):
+        st.session_state.pop(key, None)
+    for key in [k for k in st.session_state if str(k).startswith("pct_")]:
+        del st.session_state[key]
+st.session_state.tenant = tenant
 
 # ── Session state ─────────────────────────────────────────────────────────────
-if "config"        not in st.session_state: st.session_state.config        = load_config()
-if "price_history" not in st.session_state: st.session_state.price_history = {}
-if "alerts_sent"   not in st.session_state: st.session_state.alerts_sent   = {}
+config_file = config_store(tenant_config_path(tenant))   # process-wide, mtime-cached view of this user's config
+if "config" not in st.session_state:
+    st.session_state.config_base = config_file.snapshot()   # (on-disk config, version) last synced with
+    st.session_state.config      = copy_config(st.session_state.config_base[0])
 if "last_refresh"  not in st.session_state: st.session_state.last_refresh  = None
 if "save_msg"      not in st.session_state: st.session_state.save_msg      = ""
 if "wa_status_msg" not in st.session_state: st.session_state.wa_status_msg = {}  # {phone: (ok, msg)}
+if "render_ms"     not in st.session_state: st.session_state.render_ms     = {}  # {"full"|"tick": ms}
+if "alert_engine"  not in st.session_state: st.session_state.alert_engine  = AlertEngine()
 
 cfg = st.session_state.config
 
+
+def deployment_config() -> dict:
+    """
+    Settings that drive process-wide objects (the shared API budget, history
+    retention, ring depth). Only the default user sets them, as in the headless monitor;
+    a ?user= tenant reads the default config and cannot change them.
+    """
+    return cfg if not tenant else config_store().snapshot()[0]
+
+
+def forget_stock_widgets(symbols) -> None:
+    """Drop widget state tied to these stocks so the widgets re-read the config."""
+    for sym in symbols:
+        st.session_state.pop(f"pct_{sym}", None)
+    st.session_state.pop("rules_editor", None)
+
+
+# ── Config hot reload ─────────────────────────────────────────────────────────
+# Edits to the file from another tab or a text editor are folded into this
+# session's config: only the stocks, recipients and settings that changed on
+# disk are touched, so unsaved local edits to anything else survive
+disk_cfg, disk_version = config_file.snapshot()
+base_cfg, base_version = st.session_state.config_base
+if disk_version != base_version:
+    changes = diff_config(base_cfg, disk_cfg)
+    summary = describe_changes(changes)
+    if summary:
+        apply_config_changes(cfg, changes)
+        stocks = changes["stocks"]
+        forget_stock_widgets([s["symbol"] for s in stocks["changed"]] + stocks["removed"])
+        st.toast(f"📂 Config file changed on disk: {summary}")
+    st.session_state.config_base = (disk_cfg, disk_version)
+
 # ── Helpers ───────────────────────────────────────────────────────────────────
-@st.cache_data(ttl=30)
-def get_quote(symbol: str) -> dict:
-    try:
-        r = requests.get(
-            f"{FINNHUB_BASE}/quote",
-            params={"symbol": symbol, "token": FINNHUB_KEY},
-            timeout=8,
-        )
-        r.raise_for_status()
-        return r.json()
-    except Exception as e:
-        return {"error": str(e)}
+@st.cache_resource
+def get_quote_scheduler(source: tuple, _market: dict) -> QuoteScheduler:
+    """
+    One rate-limited quote cache per server process and market-data source
+    (keyed by provider_key()), shared by every browser session and every
+    user: a symbol on fifty users' watchlists is fetched once.
+    """
+    return QuoteScheduler(make_provider(_market))
 
 
-def pct_change(current: float, reference: float) -> float:
-    return 0.0 if reference == 0 else ((current - reference) / reference) * 100
+@st.cache_resource
+def get_tick_store() -> TickStore:
+    """Process-wide handle on the on-disk tick history (also written by the monitor)."""
+    return TickStore()
 
 
-def fmt_phone_for_greenapi(phone: str) -> str:
-    """Convert +447700900000 → 447700900000@c.us"""
-    clean = phone.replace("+", "").replace(" ", "").replace("-", "")
-    return f"{clean}@c.us"
+@st.cache_resource
+def get_candle_store() -> CandleStore:
+    """Process-wide handle on the memory-mapped candle cache (also filled by the monitor)."""
+    return CandleStore()
 
 
-def build_alert_message(alerts: list) -> str:
-    lines = ["🚨 *StockWatch Pro Alert*\n"]
-    for a in alerts:
-        direction = "⬆️ UP" if a["change"] > 0 else "⬇️ DOWN"
-        lines.append(
-            f"*{a['symbol']}* ({a['name']})\n"
-            f"Price: {a['currency']}{a['price']:.2f}  |  "
-            f"Change: {direction} {abs(a['change']):.2f}%\n"
-            f"Threshold: ±{a['threshold']:.1f}%"
-        )
-    lines.append(f"\n_Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} UTC_")
-    return "\n\n".join(lines)
+@st.cache_resource
+def get_candle_backfiller(_store: CandleStore) -> CandleBackfiller:
+    """Background candle downloader shared by every session; each symbol's history is fetched once."""
+    return CandleBackfiller(_store)
+
+
+@st.cache_resource
+def get_symbol_catalog() -> SymbolCatalog:
+    """The local ticker/company index behind Add Stock's autocomplete, loaded once per process."""
+    return SymbolCatalog()
+
+
+@st.cache_resource(max_entries=1)
+def get_price_rings(depth: int) -> PriceRings:
+    """Process-wide in-memory tick rings (one per symbol) in front of the tick store; a new depth replaces them."""
+    return PriceRings(depth)
+
+
+@st.cache_resource
+def get_instance_state() -> InstanceStateMonitor:
+    """Background GREEN API getStateInstance poller, shared by every session."""
+    return InstanceStateMonitor()
 
 
-def get_green_api_client():
-    """Return a configured GreenAPI client, or None if credentials missing."""
-    id_inst  = cfg["whatsapp"].get("id_instance", "").strip()
-    api_tok  = cfg["whatsapp"].get("api_token",   "").strip()
-    if not id_inst or not api_tok or not WA_AVAILABLE:
-        return None
-    return GreenAPI.GreenAPI(id_inst, api_tok)
+@st.cache_resource
+def get_delivery_queue(_state: InstanceStateMonitor) -> DeliveryQueue:
+    """Process-wide pool of background WhatsApp senders, journaled to the on-disk outbox."""
+    return DeliveryQueue(outbox=Outbox(), state=_state)
 
 
-def get_qr_from_greenapi() -> bytes | None:
+@st.cache_resource
+def get_alert_digest(_queue: DeliveryQueue) -> DigestCoalescer:
+    """Per-recipient digest window in front of the delivery queue."""
+    return DigestCoalescer(_queue)
+
+
+@st.cache_resource
+def get_cooldown_store() -> CooldownStore:
+    """Alert cooldowns shared by every session in this process and by the monitor."""
+    return CooldownStore()
+
+
+@st.cache_resource(max_entries=8)
+def get_history_chart(symbols: tuple, window: int, source: str):
+    """Incremental chart buffer per (watchlist, window, source), shared by every session showing it."""
+    from stockwatch.chart import HistoryChart
+    return HistoryChart(symbols, window)
+
+
+@st.cache_resource
+def get_card_renderer() -> CardRenderer:
+    """Card HTML memo shared by every session, so unchanged cards are never rebuilt."""
+    return CardRenderer()
+
+
+@st.cache_resource
+def get_trade_stream(url: str) -> TradeStream:
     """
-    Call GREEN API's QR endpoint and return PNG bytes, or None on failure.
-    Endpoint: GET /waInstance{id}/qr/{token}
+    One WebSocket trade subscriber per stream URL, shared by every session.
+    Callers point its on_trade at the current price rings on every run.
     """
-    id_inst = cfg["whatsapp"].get("id_instance", "").strip()
-    api_tok = cfg["whatsapp"].get("api_token",   "").strip()
-    if not id_inst or not api_tok:
-        return None
-    try:
-        url = f"https://api.green-api.com/waInstance{id_inst}/qr/{api_tok}"
-        r = requests.get(url, timeout=10)
-        data = r.json()
-        # Response: {"type": "qrCode", "message": "<base64>"}
-        # or       {"type": "alreadyLogged", ...}
-        # or       {"type": "alreadyLogged", ...}
-        if data.get("type") == "qrCode" and QR_AVAILABLE:
-            import base64
-            qr_b64 = data["message"]
-            png_bytes = base64.b64decode(qr_b64)
-            return png_bytes
-        elif data.get("type") in ("alreadyLogged", "accountDeleted"):
-            return data.get("type")  # sentinel string
-    except Exception:
-        pass
-    return None
-
-
-def check_greenapi_state() -> str:
-    """Return GREEN API account state: 'authorized', 'notAuthorized', or 'error'."""
-    id_inst = cfg["whatsapp"].get("id_instance", "").strip()
-    api_tok = cfg["whatsapp"].get("api_token",   "").strip()
-    if not id_inst or not api_tok:
-        return "no_credentials"
-    try:
-        url = f"https://api.green-api.com/waInstance{id_inst}/getStateInstance/{api_tok}"
-        r = requests.get(url, timeout=8)
-        state = r.json().get("stateInstance", "error")
-        return state
-    except Exception:
-        return "error"
-
-
-def send_whatsapp_messages(message: str, recipients: list) -> list:
-    """Send message to all recipients. Returns list of (name, phone, ok, error)."""
-    client = get_green_api_client()
-    if client is None:
-        return [(r["name"], r["phone"], False, "Client not configured") for r in recipients]
-
-    results = []
-    for rec in recipients:
-        chat_id = fmt_phone_for_greenapi(rec["phone"])
-        try:
-            resp = client.sending.sendMessage(chat_id, message)
-            if resp.code == 200:
-                results.append((rec["name"], rec["phone"], True, ""))
+    stream = TradeStream(url)
+    stream.start()
+    return stream
+
+
+tick_store      = get_tick_store()
+candle_store    = get_candle_store()
+candle_backfill = get_candle_backfiller(candle_store)
+symbol_catalog  = get_symbol_catalog()
+price_rings     = get_price_rings(int(deployment_config()["ring_depth"]))
+instance_state  = get_instance_state()
+delivery_queue  = get_delivery_queue(instance_state)
+cooldown_store  = get_cooldown_store().for_tenant(tenant)
+alert_digest    = get_alert_digest(delivery_queue)
+card_renderer   = get_card_renderer()
+trade_stream    = None   # set before the fetch loop when streaming mode is on
+
+
+def receipt_recorder(status: dict):
+    """
+    Callback for DeliveryQueue that writes receipts into this session's
+    wa_status_msg. It runs on a worker thread, so it closes over the dict
+    itself rather than touching st.session_state.
+    """
+    def record(name, phone, ok, err):
+        status[phone] = (ok, err, datetime.now())
+    return record
+
+
+def warm_rings(symbols) -> None:
+    """Seed the ring of any symbol seen for the first time from the on-disk history."""
+    for sym in symbols:
+        if sym not in price_rings:
+            price_rings.warm(sym, tick_store.latest(sym, price_rings.depth))
+
+
+def history_chart(symbols: list, window: int, from_memory: bool) -> tuple:
+    """
+    The shared chart buffer for this watchlist and window, brought up to date
+    with only the ticks added since it was last read. Fed from the in-memory
+    rings when they cover the whole window, otherwise from the SQLite tick
+    store. Returns (chart, source).
+    """
+    now    = time.time()
+    memory = from_memory and symbols and all(price_rings.covers(s, now - window) for s in symbols)
+    source = "memory" if memory else "disk"
+    chart  = get_history_chart(tuple(symbols), window, source)
+    if memory:
+        chart.update_from_rings(price_rings, now)
+    else:
+        chart.update_from_store(tick_store, now)
+    return chart, source
+
+
+def get_quotes(symbols: list) -> dict:
+    if trade_stream is None:
+        return quote_scheduler.get_many(symbols)
+    quotes = quote_scheduler.get_many(symbols, ttl=REFERENCE_TTL)
+    return {sym: overlay_quote(q, trade_stream.table.get(sym)) for sym, q in quotes.items()}
+
+
+def pick_symbol():
+    """on_change for the autocomplete matches: fill the ticker and name fields from the chosen one."""
+    match = st.session_state.get("symbol_match")
+    if match:
+        st.session_state.new_symbol = match
+        st.session_state.new_name   = symbol_catalog.name_for(match)
+
+
+def fill_name():
+    """on_change for a typed ticker: fill an empty name from the symbol index."""
+    symbol = st.session_state.new_symbol.upper().strip()
+    if symbol and not st.session_state.get("new_name"):
+        st.session_state.new_name = symbol_catalog.name_for(symbol)
+
+
+def add_stock_panel():
+    """
+    Symbol search and the Add Stock fields. Runs as a fragment, so each pause
+    in typing reruns only this panel; matches come from the local symbol index.
+    """
+    if st.session_state.pop("add_stock_done", False):
+        for key in ("symbol_query", "symbol_match", "new_symbol", "new_name"):
+            st.session_state.pop(key, None)
+    downloading = symbol_catalog.ensure()
+    query = st.text_input(
+        "Search", type="search", live="200ms", key="symbol_query", label_visibility="collapsed",
+        placeholder="🔎 Ticker or company, e.g. appl",
+        on_change=lambda: st.session_state.pop("symbol_match", None),
+    )
+    matches = symbol_catalog.search(query) if query else []
+    if matches:
+        names = dict(matches)
+        st.selectbox("Matches", list(names), index=None, key="symbol_match", on_change=pick_symbol,
+                     format_func=lambda sym: f"{sym} · {names[sym]}", placeholder=f"{len(names)} matches — pick one")
+    elif query and len(symbol_catalog.index):
+        st.caption("No match in the symbol index; enter the ticker and name below.")
+    if downloading:
+        st.caption("Downloading the symbol list for autocomplete…")
+    elif not len(symbol_catalog.index) and symbol_catalog.error:
+        st.caption(f"Symbol list unavailable ({symbol_catalog.error}); enter the ticker and name by hand.")
+
+    ns = st.text_input("Ticker", key="new_symbol", placeholder="e.g. AAPL", on_change=fill_name).upper().strip()
+    nn = st.text_input("Name",   key="new_name",   placeholder="filled in from the symbol index")
+    na = st.number_input("Alert %", min_value=0.1, max_value=50.0, value=2.0, step=0.5)
+    if st.button("Add Stock", use_container_width=True):
+        nn = nn or symbol_catalog.name_for(ns)
+        if ns and nn:
+            if ns not in [s["symbol"] for s in cfg["stocks"]]:
+                cfg["stocks"].append({"symbol": ns, "name": nn, "alert_pct": na})
+                st.session_state.add_stock_done = True
+                st.rerun()
             else:
-                results.append((rec["name"], rec["phone"], False, f"HTTP {resp.code}"))
-        except Exception as e:
-            results.append((rec["name"], rec["phone"], False, str(e)))
-    return results
+                st.warning(f"{ns} already in list.")
+        else:
+            st.error("Ticker and name required.")
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -255,6 +361,8 @@ def send_whatsapp_messages(message: str, recipients: list) -> list:
 # ═══════════════════════════════════════════════════════════════════════════════
 with st.sidebar:
     st.markdown("## ⚙️ Configuration")
+    if tenant:
+        st.caption(f"👤 User **{tenant}** · `{tenant_config_path(tenant)}`")
     st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
 
     # ── Config persistence ────────────────────────────────────────────────────
@@ -262,16 +370,20 @@ with st.sidebar:
     col_sv, col_rl = st.columns(2)
     with col_sv:
         if st.button("💾 Save", use_container_width=True):
-            save_config(cfg)
+            config_file.save(cfg)
+            st.session_state.config_base = config_file.snapshot()
             st.session_state.save_msg = f"Saved {datetime.now().strftime('%H:%M:%S')}"
     with col_rl:
         if st.button("📂 Reload", use_container_width=True):
-            st.session_state.config = load_config()
-            cfg = st.session_state.config
-            st.session_state.save_msg = f"Reloaded {datetime.now().strftime('%H:%M:%S')}"
+            forget_stock_widgets(s["symbol"] for s in cfg["stocks"])
+            st.session_state.config_base = config_file.snapshot()
+            st.session_state.config      = copy_config(st.session_state.config_base[0])
+            st.session_state.save_msg    = f"Reloaded {datetime.now().strftime('%H:%M:%S')}"
             st.rerun()
     if st.session_state.save_msg:
         st.caption(f"✅ {st.session_state.save_msg}")
+    if config_file.error:
+        st.warning(f"⚠️ Config file not reloaded — {config_file.error}")
 
     cfg_json = json.dumps(serialise_config(cfg), indent=2)
     st.download_button("⬇️ Download config.json", data=cfg_json,
@@ -282,11 +394,7 @@ with st.sidebar:
     if uploaded:
         try:
             imp = json.load(uploaded)
-            st.session_state.config = {
-                "stocks":           imp.get("stocks",           DEFAULT_CONFIG["stocks"]),
-                "whatsapp":         {**DEFAULT_CONFIG["whatsapp"], **imp.get("whatsapp", {})},
-                "refresh_interval": imp.get("refresh_interval", 60),
-            }
+            st.session_state.config = copy_config(normalise_config(imp))
             cfg = st.session_state.config
             st.success("Config imported!")
             st.rerun()
@@ -314,18 +422,23 @@ with st.sidebar:
     cfg["whatsapp"]["api_token"]   = api_tok.strip()
 
     cred_ok = bool(id_inst.strip() and api_tok.strip())
+    if cred_ok:
+        instance_state.watch(cfg["whatsapp"])   # polled in the background from now on
 
     if st.button("🔍 Check Connection Status", use_container_width=True, disabled=not cred_ok):
         with st.spinner("Checking..."):
-            state = check_greenapi_state()
-        if state == "authorized":
-            st.success("✅ WhatsApp authorised & ready")
-        elif state == "notAuthorized":
-            st.warning("⚠️ Not authorised — scan the QR in the main panel")
-        elif state == "no_credentials":
-            st.error("Enter Instance ID and API Token first")
-        else:
-            st.error(f"Error checking state: {state}")
+            instance_state.refresh(cfg["whatsapp"])
+    state, checked_at = instance_state.state(cfg["whatsapp"]) if cred_ok else (None, None)
+    if state == "authorized":
+        st.success("✅ WhatsApp authorised & ready")
+    elif state == "notAuthorized":
+        st.warning("⚠️ Not authorised — scan the QR in the main panel. Alerts are held until you do.")
+    elif state in ("blocked", "sleepMode", "starting"):
+        st.warning(f"⚠️ Instance is {state} — alerts are held until it can send.")
+    elif state is not None:
+        st.error(f"Error checking state: {state}")
+    if checked_at:
+        st.caption(f"Instance state checked {time.time() - checked_at:.0f}s ago · re-checked every minute")
 
     if not WA_AVAILABLE:
         st.error("❌ Package missing — run:\n```\npip install whatsapp-api-client-python\n```")
@@ -361,6 +474,41 @@ with st.sidebar:
 
     st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
 
+    # ── Market data ───────────────────────────────────────────────────────────
+    st.markdown("### 📡 Market data")
+    market = cfg["market_data"]
+    market["provider"] = st.selectbox(
+        "Quote source",
+        options=list(PROVIDERS),
+        index=list(PROVIDERS).index(market["provider"]) if market.get("provider") in PROVIDERS else 0,
+        format_func=PROVIDERS.get,
+        help="Replay plays back recorded ticks offline, for demos and load tests.",
+    )
+    if market["provider"] == "replay":
+        market["replay_file"] = st.text_input(
+            "Replay file",
+            value=market.get("replay_file", ""),
+            placeholder="ticks.jsonl",
+            help="JSON lines of {\"s\": symbol, \"t\": unix time, \"p\": price}. "
+                 "`python -m stockwatch.providers export` writes one from the tick history.",
+        ).strip()
+        market["replay_speed"] = float(st.number_input(
+            "Replay speed (× real time)",
+            min_value=0.1, max_value=100_000.0,
+            value=float(market.get("replay_speed", DEFAULT_CONFIG["market_data"]["replay_speed"])),
+            step=10.0,
+        ))
+        market["replay_loop"] = st.checkbox("Loop at end of file", value=bool(market.get("replay_loop", True)))
+    try:
+        quote_scheduler = get_quote_scheduler(provider_key(market), market)
+    except (OSError, ValueError) as e:
+        st.error(f"Can't replay: {e}. Using Finnhub.")
+        quote_scheduler = get_quote_scheduler(("finnhub",), {})
+    if not quote_scheduler.provider.metered:
+        st.caption(quote_scheduler.provider.describe())
+
+    st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
+
     # ── Refresh ───────────────────────────────────────────────────────────────
     st.markdown("### 🔄 Refresh")
     cfg["refresh_interval"] = st.selectbox(
@@ -369,9 +517,98 @@ with st.sidebar:
         index=[30, 60, 120, 300].index(int(cfg.get("refresh_interval", 60))),
         format_func=lambda x: f"{x} seconds",
     )
+    cfg["fetch_concurrency"] = int(st.number_input(
+        "Max concurrent fetches",
+        min_value=1, max_value=64,
+        value=int(cfg.get("fetch_concurrency", DEFAULT_CONFIG["fetch_concurrency"])),
+        step=1,
+        help="Upper bound on simultaneous Finnhub quote requests per refresh.",
+    ))
     auto_refresh = st.checkbox("Enable auto-refresh", value=False)
+    deployment = deployment_config()
+    shared_note = "" if not tenant else " Shared by every user; set in the default config."
+    budget = int(st.number_input(
+        "API budget (calls / min)",
+        min_value=1, max_value=100_000,
+        value=int(deployment.get("calls_per_minute", DEFAULT_CONFIG["calls_per_minute"])),
+        step=5, disabled=bool(tenant),
+        help="Finnhub's free tier allows 60 calls per minute. Symbols near their alert "
+             "threshold are polled first and most often; quiet ones are stretched out." + shared_note,
+    ))
+    retention = int(st.number_input(
+        "History retention (days)",
+        min_value=1, max_value=3650,
+        value=int(deployment.get("history_retention_days", DEFAULT_CONFIG["history_retention_days"])),
+        disabled=bool(tenant),
+        help="Ticks older than this are deleted from the on-disk history; ticks older "
+             "than a day are thinned to one per minute." + shared_note,
+    ))
+    if not tenant:
+        cfg["calls_per_minute"], cfg["history_retention_days"] = budget, retention
+    depth = int(st.number_input(
+        "In-memory ticks per symbol",
+        min_value=64, max_value=1_000_000,
+        value=int(deployment.get("ring_depth", DEFAULT_CONFIG["ring_depth"])),
+        step=1024, disabled=bool(tenant),
+        help="Depth of each symbol's in-memory ring buffer (16 bytes per tick ×2). "
+             "Chart windows it fully covers are served from memory instead of disk." + shared_note,
+    ))
+    if not tenant:
+        cfg["ring_depth"] = depth
+    cfg["candle_backfill"] = st.checkbox(
+        "Backfill candle history",
+        value=bool(cfg.get("candle_backfill", DEFAULT_CONFIG["candle_backfill"])),
+        help="Download 5 days of 5-minute and a year of daily candles for each watched symbol once, "
+             "then only the new bars. They feed the multi-day charts and rolling-window rules, and "
+             "use at most a tenth of the quote API budget. Finnhub's free tier has no candle access.",
+    )
+    cfg["alert_cooldown_mins"] = float(st.number_input(
+        "Alert cooldown (min)",
+        min_value=0.0, max_value=1440.0,
+        value=float(cfg.get("alert_cooldown_mins", DEFAULT_CONFIG["alert_cooldown_mins"])),
+        step=1.0,
+        help="Minimum gap between alerts for the same symbol, shared by every open dashboard "
+             "and the monitor. A stock's own cooldown in Advanced alert rules overrides it.",
+    ))
+    cfg["digest_window_secs"] = int(st.number_input(
+        "Alert digest window (s)",
+        min_value=0, max_value=600,
+        value=int(cfg.get("digest_window_secs", DEFAULT_CONFIG["digest_window_secs"])),
+        step=5,
+        help="Alerts for a recipient within this window are sent as one WhatsApp message. "
+             "0 sends each cycle's alerts straight away; urgent stocks always skip the wait.",
+    ))
+    cfg["streaming"]["enabled"] = st.checkbox(
+        "📡 Stream live trades (WebSocket)",
+        value=bool(cfg["streaming"].get("enabled")) and STREAMING_AVAILABLE,
+        disabled=not STREAMING_AVAILABLE,
+        help="Prices update from trade messages as they arrive; REST is only used for open / prev close.",
+    )
+    if cfg["streaming"]["enabled"]:
+        cfg["streaming"]["url"] = st.text_input(
+            "Stream URL",
+            value=cfg["streaming"].get("url", ""),
+            placeholder="blank = wss://ws.finnhub.io",
+            help="Use ws://127.0.0.1:8765 with `python -m stockwatch.mock_ws` to test offline.",
+        ).strip()
+    if not STREAMING_AVAILABLE:
+        st.caption("Streaming needs `pip install websockets`.")
+    views = ["auto", "cards", "table"]
+    cfg["watchlist_view"] = st.selectbox(
+        "Watchlist view",
+        options=views,
+        index=views.index(cfg.get("watchlist_view", "auto")) if cfg.get("watchlist_view") in views else 0,
+        format_func={"auto": f"Auto (table above {LARGE_WATCHLIST} symbols)", "cards": "Cards",
+                     "table": "Sortable table"}.get,
+    )
+    cfg["cards_per_page"] = int(st.number_input(
+        "Cards per page",
+        min_value=3, max_value=300,
+        value=int(cfg.get("cards_per_page", DEFAULT_CONFIG["cards_per_page"])),
+        step=3,
+    ))
     if st.button("🔃 Refresh Now", use_container_width=True):
-        st.cache_data.clear()
+        quote_scheduler.invalidate(s["symbol"] for s in cfg["stocks"])
         st.session_state.last_refresh = datetime.now()
         st.rerun()
 
@@ -379,19 +616,7 @@ with st.sidebar:
 
     # ── Watchlist ─────────────────────────────────────────────────────────────
     st.markdown("### ➕ Add Stock")
-    with st.form("add_stock", clear_on_submit=True):
-        ns = st.text_input("Ticker",  placeholder="e.g. AAPL").upper().strip()
-        nn = st.text_input("Name",    placeholder="e.g. Apple Inc.")
-        na = st.number_input("Alert %", min_value=0.1, max_value=50.0, value=2.0, step=0.5)
-        if st.form_submit_button("Add Stock"):
-            if ns and nn:
-                if ns not in [s["symbol"] for s in cfg["stocks"]]:
-                    cfg["stocks"].append({"symbol": ns, "name": nn, "alert_pct": na})
-                    st.rerun()
-                else:
-                    st.warning(f"{ns} already in list.")
-            else:
-                st.error("Ticker and name required.")
+    st.fragment(add_stock_panel)()
 
     st.markdown("### 📋 Watchlist")
     to_del_s = []
@@ -402,7 +627,7 @@ with st.sidebar:
                 f"{stock['symbol']} alert %",
                 min_value=0.1, max_value=50.0,
                 value=float(stock["alert_pct"]),
-                step=0.5, key=f"pct_{idx}",
+                step=0.5, key=f"pct_{stock['symbol']}",
             )
             cfg["stocks"][idx]["alert_pct"] = new_pct
         with sc2:
@@ -414,10 +639,44 @@ with st.sidebar:
     if to_del_s:
         st.rerun()
 
+    # Built only while open (on_change="rerun" makes the expander report its state)
+    with st.expander("⚙️ Advanced alert rules", key="rules_open", on_change="rerun") as rules_panel:
+        if rules_panel.open:
+            st.caption("Optional per-stock rules, evaluated alongside the % move from open. "
+                       "Leave a cell blank to disable that rule.")
+            rule_keys = ["alert_pct_prev", "price_above", "price_below", "window_pct", "window_mins", "cooldown_mins"]
+            rules_df  = pd.DataFrame(
+                [{k: s.get(k) for k in rule_keys} for s in cfg["stocks"]],
+                index=[s["symbol"] for s in cfg["stocks"]], columns=rule_keys, dtype=float,
+            )
+            rules_df["urgent"] = [bool(s.get("urgent")) for s in cfg["stocks"]]
+            edited = st.data_editor(
+                rules_df, key="rules_editor", use_container_width=True,
+                column_config={
+                    "alert_pct_prev": st.column_config.NumberColumn("% vs prev close", min_value=0.1),
+                    "price_above":    st.column_config.NumberColumn("Price above",     min_value=0.0),
+                    "price_below":    st.column_config.NumberColumn("Price below",     min_value=0.0),
+                    "window_pct":     st.column_config.NumberColumn("% in window",     min_value=0.1),
+                    "window_mins":    st.column_config.NumberColumn("Window (min)",    min_value=1.0),
+                    "cooldown_mins":  st.column_config.NumberColumn("Cooldown (min)",  min_value=0.0),
+                    "urgent":         st.column_config.CheckboxColumn("Urgent", help="Skip the digest window"),
+                },
+            )
+            for stock, (_, row) in zip(cfg["stocks"], edited.iterrows()):
+                for k in rule_keys:
+                    if pd.isna(row[k]):
+                        stock.pop(k, None)
+                    else:
+                        stock[k] = float(row[k])
+                if row["urgent"]:
+                    stock["urgent"] = True
+                else:
+                    stock.pop("urgent", None)
+
     if st.button("↺ Reset to Defaults", use_container_width=True):
-        st.session_state.config        = json.loads(json.dumps(DEFAULT_CONFIG))
-        st.session_state.price_history = {}
-        st.session_state.alerts_sent   = {}
+        forget_stock_widgets(s["symbol"] for s in cfg["stocks"])
+        st.session_state.config        = default_config()
+        st.session_state.alert_engine  = AlertEngine()
         st.rerun()
 
 
@@ -437,9 +696,6 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-ts = st.session_state.last_refresh or datetime.now()
-st.caption(f"Last data: {ts.strftime('%Y-%m-%d %H:%M:%S')} UTC  |  Finnhub free tier ~15 min delay")
-
 # ── WhatsApp / GREEN API setup panel ─────────────────────────────────────────
 cred_entered = bool(
     cfg["whatsapp"].get("id_instance", "").strip() and
@@ -469,7 +725,7 @@ if cred_entered:
         with qr_col:
             if st.button("🔄 Fetch QR from GREEN API"):
                 with st.spinner("Fetching QR…"):
-                    result = get_qr_from_greenapi()
+                    result = get_qr_from_greenapi(cfg["whatsapp"])
                 if result == "alreadyLogged":
                     st.success("✅ Already authorised — no QR needed.")
                 elif isinstance(result, bytes):
@@ -487,76 +743,165 @@ if cred_entered:
 > You can also scan directly in the [GREEN API console](https://console.green-api.com) — both routes work.
             """)
 
-# ── Fetch quotes & detect alerts ──────────────────────────────────────────────
-quotes           = {}
-alerts_triggered = []
-
-for stock in cfg["stocks"]:
-    sym = stock["symbol"]
-    q   = get_quote(sym)
-    quotes[sym] = q
-
-    if "c" in q and q["c"] and q["c"] != 0:
-        price      = q["c"]
-        prev_close = q.get("pc", price)
-        ref        = q.get("o") or prev_close or price
-        change     = pct_change(price, ref)
-
-        hist = st.session_state.price_history.setdefault(sym, [])
-        if not hist or hist[-1] != price:
-            hist.append(price)
-            if len(hist) > 200:
-                hist.pop(0)
-
-        if abs(change) >= stock["alert_pct"]:
-            last = st.session_state.alerts_sent.get(sym, 0)
-            if time.time() - last > 600:
-                st.session_state.alerts_sent[sym] = time.time()
-                currency = "£" if sym.endswith(".L") else "$"
-                alert_entry = {
-                    "symbol":    sym,
-                    "name":      stock["name"],
-                    "price":     price,
-                    "change":    change,
-                    "threshold": stock["alert_pct"],
-                    "currency":  currency,
-                }
-                alerts_triggered.append(alert_entry)
-
-                # ── AUTO-SEND: fire immediately, no button click needed ────────
-                auto_recipients = cfg["whatsapp"].get("recipients", [])
-                if auto_recipients and WA_AVAILABLE:
-                    id_inst = cfg["whatsapp"].get("id_instance", "").strip()
-                    api_tok = cfg["whatsapp"].get("api_token",   "").strip()
-                    if id_inst and api_tok:
-                        single_msg = build_alert_message([alert_entry])
-                        results    = send_whatsapp_messages(single_msg, auto_recipients)
-                        # Store results in session state so the UI can display them
-                        for name, phone, ok, err in results:
-                            st.session_state.wa_status_msg[phone] = (ok, err, datetime.now())
-
-# ── Alert panel ───────────────────────────────────────────────────────────────
-if alerts_triggered:
-    st.markdown("---")
-    st.markdown("### 🚨 Price Alerts Triggered")
-
-    for a in alerts_triggered:
-        direction = "⬆️ UP" if a["change"] > 0 else "⬇️ DOWN"
-        st.markdown(
-            f'<div class="alert-box"><b>{a["symbol"]}</b> — {a["name"]} is {direction} '
-            f'<b>{abs(a["change"]):.2f}%</b> '
-            f'(price: {a["currency"]}{a["price"]:.2f} | threshold ±{a["threshold"]:.1f}%)</div>',
-            unsafe_allow_html=True,
+# ── Live panel (auto-refreshing fragment) ─────────────────────────────────────
+def live_panel():
+    """
+    Quotes, alerts, cards and history. Runs as a fragment, so auto-refresh
+    re-executes only this function on a timer; the sidebar, CSS and static
+    panels are not recomputed.
+    """
+    global trade_stream
+    tick_started = time.perf_counter()
+    if config_file.snapshot()[1] != st.session_state.config_base[1]:
+        st.rerun()   # the file changed under an auto-refresh tick: re-run the whole page to fold it in
+
+    # Auto-refresh ticks don't invalidate: the scheduler's per-symbol TTLs decide
+    # which quotes are due, so quiet symbols don't eat the API budget every tick
+    if auto_refresh:
+        st.session_state.last_refresh = datetime.now()
+    deployment = deployment_config()
+    quote_scheduler.set_budget(deployment["calls_per_minute"])
+    tick_store.retention_days = deployment["history_retention_days"]
+
+    ts = st.session_state.last_refresh or datetime.now()
+    st.caption(f"Last data: {ts.strftime('%Y-%m-%d %H:%M:%S')} UTC  |  {quote_scheduler.provider.describe()}")
+    fetch_status = st.empty()   # filled in once the quote batch has been timed
+
+    # ── Fetch quotes & detect alerts ──────────────────────────────────────────
+    # When the headless monitor (python -m stockwatch.monitor) is running, it owns
+    # fetching, alerting and sending; this session only displays its published state.
+    monitor_state = read_monitor_state(tenant_state_path(tenant))
+
+    if monitor_state:
+        quotes           = monitor_state["quotes"]
+        fetch_timing     = monitor_state["fetch_timing"]
+        alerts_triggered = [a for a in monitor_state["alerts"]
+                            if time.time() - a.get("ts", 0) < cfg["alert_cooldown_mins"] * 60]
+        breached         = set(monitor_state.get("breached", []))
+        st.session_state.wa_status_msg = {
+            phone: (ok, err, datetime.fromisoformat(sent_at))
+            for phone, (ok, err, sent_at) in monitor_state["receipts"].items()
+        }
+        st.info(
+            f"🛰️ Headless monitor active (pid {monitor_state['pid']}, cycle {monitor_state['cycle']}, "
+            f"updated {monitor_state['age']:.0f}s ago) — this dashboard is a read-only view and alerts "
+            f"are sent by the monitor. Save the config to apply watchlist changes to it."
         )
+    else:
+        warm_rings(s["symbol"] for s in cfg["stocks"])
+        if cfg["candle_backfill"]:
+            candle_backfill.request([s["symbol"] for s in cfg["stocks"]], quote_scheduler)
+        if cfg["streaming"]["enabled"] and STREAMING_AVAILABLE and quote_scheduler.provider.streams:
+            trade_stream = get_trade_stream(cfg["streaming"]["url"] or FINNHUB_WS_URL)
+            trade_stream.on_trade = price_rings.append   # follows the rings when a new depth replaces them
+            trade_stream.subscribe(s["symbol"] for s in cfg["stocks"])
+
+        with METRICS.span("fetch"):
+            symbols              = quote_scheduler.prioritise([s["symbol"] for s in cfg["stocks"]])
+            quotes, fetch_timing = fetch_quotes(get_quotes, symbols, cfg["fetch_concurrency"],
+                                                batch=quote_scheduler.provider.max_batch)
+            quote_scheduler.observe(cfg["stocks"], quotes)
+        with METRICS.span("history"):
+            tick_store.record_quotes(quotes)
+            price_rings.record_quotes(quotes, time.time())
+        with METRICS.span("alerts"):
+            engine           = st.session_state.alert_engine
+            engine.cooldown  = cfg["alert_cooldown_mins"] * 60
+            # Candles only back the rings when backfill is on; otherwise keep the one batched lookup
+            prices_at        = (candle_store.backed_prices_at(price_rings.prices_at) if cfg["candle_backfill"]
+                                else price_rings.prices_at)
+            new_alerts       = engine.evaluate(cfg["stocks"], quotes, cooldown_store, prices_at=prices_at)
+            breached         = engine.breached
+            # Show every alert still in cooldown, whichever session (or monitor) sent it
+            watched          = {s["symbol"] for s in cfg["stocks"]}
+            alerts_triggered = [a for a in cooldown_store.recent(engine.cooldown) if a["symbol"] in watched]
+
+        # ── AUTO-SEND: queue immediately, no button click needed ─────────────────
+        # Sends run on the delivery queue's workers; receipts land in
+        # wa_status_msg as they arrive and show up on the next refresh
+        auto_recipients = cfg["whatsapp"].get("recipients", [])
+        if auto_recipients and WA_AVAILABLE and cred_entered:
+            with METRICS.span("deliver"):
+                on_receipt = receipt_recorder(st.session_state.wa_status_msg)
+                # Anything a previous run left undelivered in the outbox goes out first
+                delivery_queue.replay(cfg["whatsapp"], on_receipt=on_receipt)
+                # Each recipient gets one digest per window rather than one message per alert
+                alert_digest.add(new_alerts, auto_recipients, cfg["whatsapp"], on_receipt=on_receipt,
+                                 window=cfg["digest_window_secs"])
+
+    if fetch_timing["symbols"]:
+        speedup  = fetch_timing["sequential"] / fetch_timing["wall"] if fetch_timing["wall"] > 0 else 1.0
+        requests = fetch_timing.get("requests", fetch_timing["symbols"])
+        status   = (
+            f"⏱️ Fetched {fetch_timing['symbols']} quotes in {requests} requests, {fetch_timing['wall']:.2f} s "
+            f"(sequential would take ~{fetch_timing['sequential']:.2f} s · {speedup:.1f}× speed-up · "
+            f"{min(cfg['fetch_concurrency'], requests)} workers)"
+        )
+        if not monitor_state:
+            cache   = quote_scheduler.stats()
+            status += (f"  |  Shared cache: {cache['hits']} hits · {cache['misses']} misses · "
+                       f"{cache['coalesced']} coalesced · {cache['hit_ratio']:.0%} hit ratio")
+            if quote_scheduler.provider.metered:
+                status += (f"  |  Budget: {cache['tokens']:.0f} tokens · {cache['calls_per_min']:.0f}/min · "
+                           f"{cache['deferred']} deferred · {cache['rate_limited']} × HTTP 429"
+                           + (f" · backing off {cache['backoff']:.0f}s" if cache["backoff"] else ""))
+            for host, h in http_client.stats().items():
+                status += (f"  |  {host}: {h['calls']} calls over {h['connections']} conn · "
+                           f"p50 {h['p50_ms']:.0f} ms · p95 {h['p95_ms']:.0f} ms")
+        fetch_status.caption(status)
+    if trade_stream is not None:
+        live = sum(1 for q in quotes.values() if q.get("live"))
+        st.caption(f"📡 Trade stream: {trade_stream.status} · {trade_stream.trades:,} trades received · "
+                   f"{live}/{len(quotes)} symbols live")
+
+    # ── Alert panel ───────────────────────────────────────────────────────────
+    if alerts_triggered:
+        st.markdown("---")
+        st.markdown("### 🚨 Price Alerts Triggered")
+
+        for a in alerts_triggered:
+            direction = "⬆️ UP" if a["change"] > 0 else "⬇️ DOWN"
+            st.markdown(
+                f'<div class="alert-box"><b>{a["symbol"]}</b> — {a["name"]} is {direction} '
+                f'<b>{abs(a["change"]):.2f}%</b> '
+                f'(price: {a["currency"]}{a["price"]:.2f} | {describe_rule(a)})</div>',
+                unsafe_allow_html=True,
+            )
 
-    alert_msg  = build_alert_message(alerts_triggered)
-    recipients = cfg["whatsapp"].get("recipients", [])
-
-    # ── Show auto-send delivery receipts ─────────────────────────────────────
-    # (Populated automatically during the quote-fetch loop above — no click needed)
-    if st.session_state.wa_status_msg:
+        alert_msg  = build_alert_message(alerts_triggered)
+        recipients = cfg["whatsapp"].get("recipients", [])
+
+        # ── Manual re-send (fallback / force-resend) ──────────────────────────────
+        if monitor_state:
+            pass   # the monitor owns sending; nothing to re-send from a read-only view
+        elif recipients and cred_entered and WA_AVAILABLE:
+            if st.button("📲 Re-send Alerts Manually",
+                         help="Alerts are sent automatically on every refresh cycle. Use this to force an immediate re-send."):
+                st.session_state.wa_status_msg.clear()
+                queued = delivery_queue.enqueue(alert_msg, recipients, cfg["whatsapp"],
+                                                on_receipt=receipt_recorder(st.session_state.wa_status_msg))
+                st.info(f"📤 Queued {queued} message(s) — receipts appear below as they arrive.")
+        elif not recipients:
+            st.info("💡 Add recipients in the sidebar to enable WhatsApp alerts.")
+        elif not cred_entered:
+            st.warning("⚠️ Enter GREEN API credentials in the sidebar to enable automatic sending.")
+
+        with st.expander("📋 Message preview"):
+            st.code(alert_msg, language=None)
+        st.markdown("---")
+
+    # ── Delivery receipts ─────────────────────────────────────────────────────
+    # Filled in by the delivery queue's workers (or the monitor) as sends finish,
+    # so they can arrive on a later refresh than the alert that caused them
+    queue_stats = delivery_queue.stats()
+    digests     = 0 if monitor_state else alert_digest.stats()["open"]
+    pending     = 0 if monitor_state else queue_stats["queued"] + queue_stats["in_flight"]
+    if st.session_state.wa_status_msg or pending or digests:
+        recipients = cfg["whatsapp"].get("recipients", [])
         st.markdown("**📬 Auto-send delivery receipts:**")
-        for phone, (ok, err, sent_at) in st.session_state.wa_status_msg.items():
+        if pending or digests:
+            st.caption(f"📤 {pending} send(s) queued or in flight · {digests} digest(s) collecting alerts")
+        for phone, (ok, err, sent_at) in list(st.session_state.wa_status_msg.items()):
             name = next(
                 (r["name"] for r in recipients
                  if r["phone"].replace("+","").replace(" ","").replace("-","")
@@ -569,74 +914,128 @@ if alerts_triggered:
             else:
                 st.error(f"❌ Auto-send failed — **{name}** ({phone}): {err}")
 
-    # ── Manual re-send (fallback / force-resend) ──────────────────────────────
-    if recipients and cred_entered and WA_AVAILABLE:
-        if st.button("📲 Re-send Alerts Manually",
-                     help="Alerts are sent automatically on every refresh cycle. Use this to force an immediate re-send."):
-            with st.spinner("Sending…"):
-                results = send_whatsapp_messages(alert_msg, recipients)
-            st.session_state.wa_status_msg = {}
-            for name, phone, ok, err in results:
-                if ok:
-                    st.success(f"✅ Sent to {name} ({phone})")
-                else:
-                    st.error(f"❌ Failed — {name} ({phone}): {err}")
-    elif not recipients:
-        st.info("💡 Add recipients in the sidebar to enable WhatsApp alerts.")
-    elif not cred_entered:
-        st.warning("⚠️ Enter GREEN API credentials in the sidebar to enable automatic sending.")
-
-    with st.expander("📋 Message preview"):
-        st.code(alert_msg, language=None)
+    # ── Watchlist: card grid or sortable table ────────────────────────────────
+    with METRICS.span("cards"):
+        frame = quote_frame(cfg["stocks"], quotes, breached)
+        view  = cfg["watchlist_view"]
+        if view == "auto":
+            view = "table" if len(frame) > LARGE_WATCHLIST else "cards"
+
+        if view == "table":
+            # The grid is virtualised and sortable by clicking a column header
+            st.dataframe(
+                frame[["symbol", "name", "price", "change_pct", "change_abs", "high", "low", "prev_close",
+                       "alert_pct", "alert", "live", "status"]],
+                hide_index=True,
+                use_container_width=True,
+                height=min(36 + 35 * len(frame), 720),
+                column_config={
+                    "symbol":     st.column_config.TextColumn("Symbol"),
+                    "name":       st.column_config.TextColumn("Name"),
+                    "price":      st.column_config.NumberColumn("Price", format="%.3f"),
+                    "change_pct": st.column_config.NumberColumn("Move %", format="%+.2f%%"),
+                    "change_abs": st.column_config.NumberColumn("Move", format="%+.3f"),
+                    "high":       st.column_config.NumberColumn("High", format="%.3f"),
+                    "low":        st.column_config.NumberColumn("Low", format="%.3f"),
+                    "prev_close": st.column_config.NumberColumn("Prev close", format="%.3f"),
+                    "alert_pct":  st.column_config.NumberColumn("Threshold ±%", format="%.1f"),
+                    "alert":      st.column_config.CheckboxColumn("⚡ Alert"),
+                    "live":       st.column_config.CheckboxColumn("● Live"),
+                    "status":     st.column_config.TextColumn("Status"),
+                },
+            )
+        elif len(frame):
+            per_page = cfg["cards_per_page"]
+            pages    = -(-len(frame) // per_page)
+            c_sort, c_page = st.columns([3, 1])
+            order = c_sort.selectbox("Sort cards", SORT_ORDERS, key="card_sort")
+            page  = c_page.number_input("Page", min_value=1, max_value=pages, value=1,
+                                        key="card_page") if pages > 1 else 1
+            start = (int(page) - 1) * per_page
+            shown = sort_frame(frame, order).iloc[start:start + per_page]
+            # One element for the whole page; only cards whose quote changed are rebuilt
+            st.markdown(card_renderer.grid(shown), unsafe_allow_html=True)
+            if pages > 1:
+                st.caption(f"Showing {start + 1}–{start + len(shown)} of {len(frame):,} symbols "
+                           f"({int(frame['alert'].sum())} alerting)")
+
+    # ── Price history ─────────────────────────────────────────────────────────
     st.markdown("---")
+    with st.expander("📊 Price history", key="history_open", on_change="rerun") as history_panel:
+        if history_panel.open:
+            with METRICS.span("chart"):
+                from stockwatch.chart import format_prices   # imported (as is altair) on first open
+                window  = st.selectbox("Window", [*HISTORY_WINDOWS, *CANDLE_WINDOWS], index=1, key="history_window")
+                symbols = [s["symbol"] for s in cfg["stocks"]]
+                if window in CANDLE_WINDOWS:
+                    resolution, span = CANDLE_WINDOWS[window]
+                    df = candle_store.closes(symbols, resolution, time.time() - span)
+                    backfill = candle_backfill.stats()
+                    detail   = (f"candle cache in {candle_store.root} ({candle_store.nbytes() / 1e6:.1f} MB on disk) · "
+                                f"backfill: {backfill['pending']} queued · {backfill['calls']:,} calls · "
+                                f"{backfill['bars']:,} bars downloaded"
+                                + (f" · {backfill['errors']} symbols failing" if backfill["errors"] else "")
+                                + "".join(f" · ⚠️ disabled for {label}: {why}" for label, why in backfill["denied"].items()))
+                else:
+                    # The monitor writes ticks to disk only, so a read-only view always reads the store
+                    chart, source = history_chart(symbols, HISTORY_WINDOWS[window], from_memory=not monitor_state)
+                    df     = chart.frame()
+                    detail = (f"{chart.ticks():,} ticks in window (from {source}, +{chart.added:,} this refresh) · "
+                              f"{0 if df is None else len(df):,} points at {chart.width:.0f} s resolution · "
+                              f"history in {tick_store.path} · {price_rings.nbytes() / 1e6:.1f} MB in memory rings")
+                if df is not None:
+                    st.line_chart(df)
+                    st.dataframe(format_prices(df.tail(20)), use_container_width=True)
+                    st.caption(detail)
+                elif window in CANDLE_WINDOWS:
+                    st.caption(f"No candles cached for this window yet · {detail}")
+                else:
+                    st.caption("No ticks recorded in this window yet.")
+
+    # ── Raw quotes ────────────────────────────────────────────────────────────
+    with st.expander(f"🔍 Raw {quote_scheduler.provider.label} quotes", key="raw_open", on_change="rerun") as raw_panel:
+        if raw_panel.open:
+            st.json(quotes)
+
+    # ── Diagnostics ───────────────────────────────────────────────────────────
+    with st.expander("🩺 Diagnostics", key="diagnostics_open", on_change="rerun") as diagnostics_panel:
+        if diagnostics_panel.open:
+            stages = METRICS.stages()
+            if stages:
+                st.markdown("**Stage timings** (this server process, recent runs)")
+                st.dataframe(pd.DataFrame.from_dict(stages, orient="index").sort_index().round(1),
+                             use_container_width=True)
+            fetches = METRICS.summary("stockwatch_quote_fetch_seconds", "symbol")
+            if fetches:
+                st.markdown("**Slowest symbols** (Finnhub /quote calls, by p95)")
+                st.dataframe(pd.DataFrame.from_dict(fetches, orient="index")
+                             .sort_values("p95_ms", ascending=False).head(10).round(1),
+                             use_container_width=True)
+            cache = METRICS.counters("stockwatch_quote_cache_total", "result")
+            sends = METRICS.counters("stockwatch_sends_total", "result")
+            cards = card_renderer.stats()
+            st.caption(
+                "Quote cache: " + (" · ".join(f"{v:,.0f} {k}" for k, v in sorted(cache.items())) or "no lookups")
+                + "  |  WhatsApp: " + (" · ".join(f"{v:,.0f} {k}" for k, v in sorted(sends.items())) or "no sends")
+                + f"  |  Cards: {cards['built']:,} built · {cards['reused']:,} reused"
+            )
+            st.download_button("⬇️ Prometheus metrics", METRICS.render(), file_name=METRICS_FILE.name,
+                               mime="text/plain")
+            st.caption(f"Also rewritten to `{METRICS_FILE}` every {METRICS_EVERY} s for node_exporter's textfile "
+                       f"collector. The headless monitor writes its own to `stockwatch_monitor.prom`.")
+
+    render_ms         = st.session_state.render_ms
+    render_ms["tick"] = (time.perf_counter() - tick_started) * 1000
+    METRICS.observe("stockwatch_stage_seconds", render_ms["tick"] / 1000, stage="panel")
+    METRICS.export(METRICS_FILE, every=METRICS_EVERY)
+    st.caption(
+        f"🧩 Live panel rendered in {render_ms['tick']:.0f} ms"
+        + (f" · last full-page run {render_ms['full']:.0f} ms" if "full" in render_ms else "")
+        + (f" · auto-refresh every {cfg['refresh_interval']} s (this panel only)" if auto_refresh else "")
+    )
 
-# ── Stock cards ───────────────────────────────────────────────────────────────
-cols = st.columns(min(len(cfg["stocks"]), 3))
-
-for idx, stock in enumerate(cfg["stocks"]):
-    sym = stock["symbol"]
-    q   = quotes.get(sym, {})
-    with cols[idx % 3]:
-        if "error" in q:
-            st.error(f"❌ {sym}: {q['error']}")
-            continue
-        if not q or q.get("c", 0) == 0:
-            st.warning(f"⚠️ {sym}: No data (market closed or invalid symbol)")
-            continue
-
-        price      = q["c"]
-        prev_close = q.get("pc", price)
-        day_open   = q.get("o",  prev_close)
-        day_high   = q.get("h",  price)
-        day_low    = q.get("l",  price)
-        ref        = day_open or prev_close or price
-        change_pct = pct_change(price, ref)
-        change_abs = price - ref
-        is_alert   = abs(change_pct) >= stock["alert_pct"]
-        currency   = "£" if sym.endswith(".L") else "$"
-        color_cls  = "change-pos" if change_pct > 0 else ("change-neg" if change_pct < 0 else "change-neutral")
-        arrow      = "▲" if change_pct > 0 else ("▼" if change_pct < 0 else "—")
-        badge      = ('<span class="badge badge-alert">⚡ ALERT</span>'
-                      if is_alert else '<span class="badge badge-ok">✓ NORMAL</span>')
-
-        st.markdown(
-            f"""<div class="metric-card {'alert-card' if is_alert else ''}">
-              <div class="ticker-symbol">{sym}</div>
-              <div class="company-name">{stock['name']}</div>
-              <div class="price-big {color_cls}">{currency}{price:,.3f}</div>
-              <div style="margin-top:8px" class="{color_cls}">
-                {arrow} {abs(change_abs):.3f} &nbsp;({abs(change_pct):.2f}%)
-              </div>
-              <hr style="border-color:#1e2d40;margin:12px 0"/>
-              <div style="font-size:0.75rem;color:#64748b;font-family:'Space Mono',monospace">
-                H: {currency}{day_high:,.3f} &nbsp;|&nbsp; L: {currency}{day_low:,.3f}<br>
-                Prev close: {currency}{prev_close:,.3f}<br>
-                Alert threshold: ±{stock['alert_pct']:.1f}%
-              </div>
-              <div style="margin-top:10px">{badge}</div>
-            </div>""",
-            unsafe_allow_html=True,
-        )
+
+st.fragment(run_every=cfg["refresh_interval"] if auto_refresh else None)(live_panel)()
 
 # ── Recipients display ────────────────────────────────────────────────────────
 recipients = cfg["whatsapp"].get("recipients", [])
@@ -653,23 +1052,6 @@ if recipients:
                 unsafe_allow_html=True,
             )
 
-# ── Price history ─────────────────────────────────────────────────────────────
-if any(st.session_state.price_history.values()):
-    st.markdown("---")
-    with st.expander("📊 In-session price history"):
-        df_data = {}
-        max_len = max(len(v) for v in st.session_state.price_history.values())
-        for sym, hist in st.session_state.price_history.items():
-            df_data[sym] = [None] * (max_len - len(hist)) + hist
-        df = pd.DataFrame(df_data)
-        df.index = range(1, len(df) + 1)
-        df.index.name = "Tick"
-        st.line_chart(df)
-        st.dataframe(
-            df.tail(20).style.format(lambda x: f"{x:.3f}" if x is not None else "—"),
-            use_container_width=True,
-        )
-
 # ── Config / debug ────────────────────────────────────────────────────────────
 with st.expander("🛠️ Current config (JSON)"):
     # Don't show the API token in plain text in the UI
@@ -677,12 +1059,6 @@ with st.expander("🛠️ Current config (JSON)"):
     safe_cfg["whatsapp"] = {**safe_cfg["whatsapp"], "api_token": "••••••••" if safe_cfg["whatsapp"].get("api_token") else ""}
     st.json(safe_cfg)
 
-with st.expander("🔍 Raw Finnhub API response"):
-    st.json(quotes)
-
-# ── Auto-refresh ──────────────────────────────────────────────────────────────
-if auto_refresh:
-    time.sleep(cfg["refresh_interval"])
-    st.cache_data.clear()
-    st.session_state.last_refresh = datetime.now()
-    st.rerun()
+# ── Render timing ─────────────────────────────────────────────────────────────
+st.session_state.render_ms["full"] = (time.perf_counter() - script_started) * 1000
+METRICS.observe("stockwatch_stage_seconds", st.session_state.render_ms["full"] / 1000, stage="page")
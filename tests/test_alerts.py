@@ -0,0 +1,135 @@
+import numpy as np
+
+from stockwatch.alerts import AlertEngine, build_alert_message, describe_rule
+
+
+class FakeCooldowns:
+    """CooldownStore stand-in: grants every claim unless told otherwise, and records what was asked."""
+
+    def __init__(self):
+        self.deny  = {}       # symbol -> rules another session already sent
+        self.calls = []
+
+    def claim(self, candidates, now=None):
+        self.calls.append(candidates)
+        claimed = {s for s in candidates if s not in self.deny}
+        return claimed, {s: self.deny[s] for s in candidates if s in self.deny}
+
+
+def _quote(price, open_=100.0, pc=100.0):
+    return {"c": price, "o": open_, "pc": pc}
+
+
+def _fired(engine, stocks, prices, cooldowns=None, **kw):
+    quotes = {s: _quote(p) for s, p in prices.items()}
+    alerts = engine.evaluate(stocks, quotes, cooldowns or FakeCooldowns(), now=1_000_000.0, **kw)
+    return [(a["symbol"], a["rule"]) for a in alerts]
+
+
+# ── Hysteresis ────────────────────────────────────────────────────────────────
+def test_pct_rule_latches_until_it_falls_below_rearm_ratio():
+    engine = AlertEngine(rearm_ratio=0.75)
+    stocks = [{"symbol": "AAPL", "name": "Apple", "alert_pct": 2.0}]
+
+    assert _fired(engine, stocks, {"AAPL": 102.5}) == [("AAPL", "pct_open")]
+    assert _fired(engine, stocks, {"AAPL": 103.0}) == []          # still breached, latched
+    assert _fired(engine, stocks, {"AAPL": 101.8}) == []          # ratio 0.9, above re-arm
+    assert _fired(engine, stocks, {"AAPL": 102.1}) == []
+    assert _fired(engine, stocks, {"AAPL": 101.0}) == []          # ratio 0.5: re-armed
+    assert _fired(engine, stocks, {"AAPL": 102.1}) == [("AAPL", "pct_open")]
+    assert engine.breached == {"AAPL"}
+
+
+def test_price_level_rearms_outside_band():
+    engine = AlertEngine(level_band_pct=0.5)
+    stocks = [{"symbol": "X", "alert_pct": 90.0, "price_above": 150.0}]
+
+    assert _fired(engine, stocks, {"X": 151.0}) == [("X", "price_above")]
+    assert _fired(engine, stocks, {"X": 149.5}) == []             # inside the 0.5% band: still latched
+    assert _fired(engine, stocks, {"X": 151.0}) == []
+    assert _fired(engine, stocks, {"X": 149.0}) == []             # below the band: re-armed
+    assert _fired(engine, stocks, {"X": 150.0}) == [("X", "price_above")]
+
+
+def test_latches_follow_symbols_when_the_watchlist_changes():
+    engine = AlertEngine()
+    a, b   = {"symbol": "A", "alert_pct": 2.0}, {"symbol": "B", "alert_pct": 2.0}
+
+    assert sorted(_fired(engine, [a, b], {"A": 103.0, "B": 103.0})) == [("A", "pct_open"), ("B", "pct_open")]
+    assert _fired(engine, [b, a], {"A": 103.0, "B": 103.0}) == []          # reordered: still latched
+    assert _fired(engine, [b], {"B": 103.0}) == []
+    assert _fired(engine, [a, b], {"A": 103.0, "B": 103.0}) == [("A", "pct_open")]   # A was dropped and re-added
+
+
+# ── Cooldown claims ───────────────────────────────────────────────────────────
+def test_rule_held_back_by_cooldown_stays_armed():
+    engine    = AlertEngine()
+    stocks    = [{"symbol": "A", "alert_pct": 2.0}]
+    cooldowns = FakeCooldowns()
+
+    cooldowns.deny = {"A": set()}              # cooling down after an alert on some other rule
+    assert _fired(engine, stocks, {"A": 103.0}, cooldowns) == []
+    cooldowns.deny = {}
+    assert _fired(engine, stocks, {"A": 103.0}, cooldowns) == [("A", "pct_open")]
+
+
+def test_rule_sent_by_another_session_counts_as_fired():
+    engine    = AlertEngine()
+    stocks    = [{"symbol": "A", "alert_pct": 2.0}]
+    cooldowns = FakeCooldowns()
+
+    cooldowns.deny = {"A": {"pct_open"}}
+    assert _fired(engine, stocks, {"A": 103.0}, cooldowns) == []
+    cooldowns.deny = {}
+    assert _fired(engine, stocks, {"A": 103.0}, cooldowns) == []          # latched, not re-sent
+
+
+def test_per_stock_cooldown_is_passed_to_the_claim():
+    engine    = AlertEngine(cooldown=600)
+    cooldowns = FakeCooldowns()
+    stocks    = [{"symbol": "A", "alert_pct": 2.0, "cooldown_mins": 5}, {"symbol": "B", "alert_pct": 2.0}]
+    _fired(engine, stocks, {"A": 103.0, "B": 103.0}, cooldowns)
+    assert {s: c for s, (c, _) in cooldowns.calls[0].items()} == {"A": 300.0, "B": 600.0}
+
+
+# ── Rules ─────────────────────────────────────────────────────────────────────
+def test_window_rule_uses_one_batched_prices_at_call():
+    engine   = AlertEngine()
+    stocks   = [{"symbol": "A", "alert_pct": 50.0, "window_pct": 1.0, "window_mins": 10},
+                {"symbol": "B", "alert_pct": 50.0, "window_pct": 1.0, "window_mins": 30},
+                {"symbol": "C", "alert_pct": 50.0}]
+    requests = []
+
+    def prices_at(symbols, times):
+        requests.append((symbols, list(times)))
+        return np.array([100.0, np.nan])        # B's history doesn't reach back
+
+    alerts = engine.evaluate(stocks, {s: _quote(102.0) for s in "ABC"}, FakeCooldowns(),
+                             now=1_000_000.0, prices_at=prices_at)
+    assert requests == [(["A", "B"], [1_000_000.0 - 600, 1_000_000.0 - 1800])]
+    assert [(a["symbol"], a["rule"], a["window"]) for a in alerts] == [("A", "window_move", 10.0)]
+    assert describe_rule(alerts[0]) == "±1.0% in 10 min"
+
+
+def test_window_rule_never_fires_without_prices_at():
+    engine = AlertEngine()
+    stocks = [{"symbol": "A", "alert_pct": 50.0, "window_pct": 1.0, "window_mins": 10}]
+    assert _fired(engine, stocks, {"A": 200.0}) == [("A", "pct_open")]
+
+
+def test_missing_quotes_and_open_fall_back_safely():
+    engine = AlertEngine()
+    stocks = [{"symbol": "A", "alert_pct": 2.0, "alert_pct_prev": 2.0}, {"symbol": "B", "alert_pct": 2.0}]
+    quotes = {"A": {"c": 103.0, "o": 0, "pc": 100.0}}        # no open yet: measure from previous close
+    alerts = engine.evaluate(stocks, quotes, FakeCooldowns(), now=1_000_000.0)
+    assert sorted(a["rule"] for a in alerts) == ["pct_open", "pct_prev_close"]
+    assert engine.evaluate([], quotes, FakeCooldowns()) == [] and engine.breached == set()
+
+
+def test_urgent_flag_and_message():
+    engine = AlertEngine()
+    stocks = [{"symbol": "VOD.L", "name": "Vodafone", "alert_pct": 2.0, "urgent": True}]
+    alerts = engine.evaluate(stocks, {"VOD.L": _quote(97.0)}, FakeCooldowns(), now=1_000_000.0)
+    assert alerts[0]["urgent"] and alerts[0]["currency"] == "£"
+    message = build_alert_message(alerts)
+    assert "*VOD.L* (Vodafone)" in message and "DOWN 3.00%" in message
@@ -0,0 +1,44 @@
+import json
+import time
+
+import pytest
+
+from stockwatch import mock_http, providers, whatsapp
+from stockwatch.bench import APP_PATH, bench_config
+
+AppTest = pytest.importorskip("streamlit.testing.v1").AppTest
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    import streamlit as st
+
+    server, url = mock_http.start_background()
+    monkeypatch.setattr(providers, "FINNHUB_BASE", f"{url}/api/v1")
+    monkeypatch.setattr(whatsapp, "GREENAPI_BASE", url)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "stockwatch_config.json").write_text(json.dumps(bench_config(3, 0, 4)))
+    st.cache_resource.clear()
+    yield AppTest.from_file(str(APP_PATH), default_timeout=60), server
+    st.cache_resource.clear()
+    server.shutdown()
+    server.server_close()
+
+
+def _captions(at):
+    return " ".join(str(c.value) for c in at.caption)
+
+
+# ── Live panel fragment ───────────────────────────────────────────────────────
+def test_auto_refresh_runs_the_live_panel_as_a_fragment_without_blocking(app):
+    at, server = app
+    at.run()
+    assert not at.exception
+    assert server.snapshot().get("finnhub.quote") == 3
+    assert "auto-refresh every" not in _captions(at)
+
+    started = time.monotonic()
+    next(c for c in at.checkbox if c.label == "Enable auto-refresh").check().run()
+    assert not at.exception
+    assert time.monotonic() - started < 30          # the run returns; it does not sleep out the 60 s interval
+    assert "auto-refresh every 60 s (this panel only)" in _captions(at)
@@ -0,0 +1,144 @@
+import math
+import time
+
+import numpy as np
+import pytest
+
+from stockwatch.candles import COLUMNS, CandleBackfiller, CandleFetchError, CandleStore
+from stockwatch.providers import QuoteProvider
+from stockwatch.quotes import QuoteScheduler
+
+DAY = 86400
+
+
+def _bars(times, closes):
+    times = np.asarray(times, dtype=np.float64)
+    return np.column_stack([times, closes, closes, closes, closes, np.ones(len(times))])
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CandleStore(tmp_path / "candles")
+
+
+# ── Reads ─────────────────────────────────────────────────────────────────────
+def test_price_at_prefers_intraday_bars_that_have_finished(store):
+    store._write("AAPL", "5", _bars([10_000, 10_300, 10_600], [1.0, 2.0, 3.0]))
+    store._write("AAPL", "D", _bars([-DAY], [9.0]))   # closed at t=0
+
+    assert store.price_at("AAPL", 10_600) == 2.0         # the 10_600 bar is still open
+    assert store.price_at("AAPL", 10_900) == 3.0
+    assert store.price_at("AAPL", 9_000) == 9.0          # before the intraday bars: daily close
+    assert math.isnan(store.price_at("AAPL", -100))
+    assert math.isnan(store.price_at("MSFT", 10_900))
+
+
+def test_backed_prices_at_only_looks_up_what_the_rings_miss(store):
+    store._write("AAPL", "5", _bars([10_000, 10_300], [1.0, 2.0]))
+    store._write("MSFT", "D", _bars([0], [7.0]))
+    asked = []
+
+    def rings(symbols, times):
+        asked.append(list(symbols))
+        return np.array([np.nan, 50.0, np.nan, np.nan, np.nan])
+
+    symbols = ["AAPL", "AAPL", "AAPL", "MSFT", "GOOGL"]
+    times   = [10_650, 10_650, 10_350, DAY + 5, 10_650]
+    prices  = store.backed_prices_at(rings)(symbols, times)
+
+    assert asked == [symbols]
+    np.testing.assert_array_equal(prices, [2.0, 50.0, 1.0, 7.0, np.nan])
+    for i in (0, 2, 3, 4):
+        assert prices[i] == store.price_at(symbols[i], times[i]) or math.isnan(prices[i])
+
+
+# ── Backfill ──────────────────────────────────────────────────────────────────
+class CandleProvider(QuoteProvider):
+    """Unmetered provider serving canned bars (or a canned error) and recording every candle request."""
+
+    label   = "candles"
+    metered = False
+
+    def __init__(self, bars=None, error=None):
+        self.bars     = bars if bars is not None else {}
+        self.error    = error
+        self.requests = []
+
+    def fetch_many(self, symbols):
+        return {}
+
+    def candles(self, symbol, resolution, start, end):
+        self.requests.append((symbol, resolution, start, end))
+        if self.error:
+            return self.error
+        bars = self.bars.get((symbol, resolution), np.empty((0, len(COLUMNS))))
+        bars = bars[(bars[:, 0] >= start) & (bars[:, 0] <= end)]
+        if not len(bars):
+            return {"s": "no_data"}
+        return {k: bars[:, i].tolist() for i, k in enumerate(COLUMNS)} | {"s": "ok"}
+
+
+def test_backfill_fetches_only_the_tail_and_merges_it(store):
+    now      = 100 * DAY
+    provider = CandleProvider({("AAPL", "D"): _bars([now - 3 * DAY, now - 2 * DAY, now - DAY], [1.0, 2.0, 3.0])})
+    assert store.backfill("AAPL", "D", provider.candles, now=now) == 3
+    assert provider.requests[-1][2:] == (now - 365 * DAY, now)
+
+    provider.bars[("AAPL", "D")] = _bars([now - DAY, now], [3.5, 4.0])          # last bar revised, one new
+    assert store.backfill("AAPL", "D", provider.candles, now=now + 60) == 2
+    assert provider.requests[-1][2] == now - DAY                                # from the last stored bar on
+    assert store.load("AAPL", "D")[:, 4].tolist() == [1.0, 2.0, 3.5, 4.0]
+
+
+def test_backfill_drops_bars_past_retention(store):
+    now = 100 * DAY
+    store._write("AAPL", "5", _bars([now - 10 * DAY, now - 4 * DAY], [1.0, 2.0]))
+    provider = CandleProvider({("AAPL", "5"): _bars([now - 300], [3.0])})
+    store.backfill("AAPL", "5", provider.candles, now=now)
+    assert store.load("AAPL", "5")[:, 4].tolist() == [2.0, 3.0]                 # 5-minute bars keep 5 days
+
+
+def test_backfill_raises_with_the_provider_status(store):
+    provider = CandleProvider(error={"error": "slow down", "status": 429, "retry_after": 7})
+    with pytest.raises(CandleFetchError) as e:
+        store.backfill("AAPL", "D", provider.candles)
+    assert (e.value.status, e.value.retry_after) == (429, 7)
+    assert not len(store.load("AAPL", "D"))
+
+
+def test_backfiller_fills_every_resolution_and_skips_fresh_series(store):
+    now      = time.time()
+    provider = CandleProvider({("AAPL", "5"): _bars([now - 600], [1.0]), ("AAPL", "D"): _bars([now - DAY], [2.0])})
+    filler   = CandleBackfiller(store)
+    assert filler.request(["AAPL"], QuoteScheduler(provider)) == 2
+    assert filler.join(5)
+    assert filler.stats() == {"pending": 0, "calls": 2, "bars": 2, "errors": 0, "denied": {}}
+    assert filler.request(["AAPL"], QuoteScheduler(provider)) == 0            # not due again yet
+
+
+def test_backfiller_stops_asking_a_provider_that_denies_candles(store):
+    provider = CandleProvider(error={"error": "no access", "status": 403})
+    filler   = CandleBackfiller(store)
+    filler.request(["AAPL", "MSFT"], QuoteScheduler(provider))
+    assert filler.join(5)
+    assert len(provider.requests) == 1 and "candles" in filler.denied
+    assert filler.request(["GOOGL"], QuoteScheduler(provider)) == 0
+
+
+def test_backfiller_pauses_the_quote_budget_on_429(store):
+    provider  = CandleProvider(error={"error": "slow down", "status": 429, "retry_after": 30})
+    scheduler = QuoteScheduler(provider)
+    filler    = CandleBackfiller(store)
+    filler.request(["AAPL"], scheduler)
+    assert filler.join(5)
+    assert scheduler.bucket.paused_for() > 20
+    assert not filler.denied and filler.errors == {"AAPL": "slow down"}
+
+
+def test_backfiller_never_retries_other_client_errors(store):
+    provider = CandleProvider(error={"error": "bad symbol", "status": 422})
+    filler   = CandleBackfiller(store)
+    filler.request(["NOPE"], QuoteScheduler(provider))
+    assert filler.join(5)
+    assert filler._due[("NOPE", "D")] == float("inf")
+    assert filler.request(["NOPE"], QuoteScheduler(provider)) == 0
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+from stockwatch.chart import HistoryChart, format_prices
+from stockwatch.history import TickStore
+from stockwatch.ringbuffer import PriceRings
+
+T0 = 1_000_000.0       # a multiple of the bucket width, so bucket edges are easy to read
+
+
+def _rings(ticks):
+    rings = PriceRings(depth=64)
+    for sym, t, p in ticks:
+        rings.append(sym, t, p)
+    return rings
+
+
+# ── Buckets ───────────────────────────────────────────────────────────────────
+def test_buckets_keep_the_last_price_and_forward_fill():
+    rings = _rings([("A", T0 + 1, 1.0), ("A", T0 + 5, 2.0), ("A", T0 + 35, 3.0), ("B", T0 + 12, 9.0)])
+    chart = HistoryChart(["A", "B"], window=100, points=10)
+    assert chart.update_from_rings(rings, now=T0 + 40) == 4
+    df = chart.frame()
+    assert df.index[0] == pd.Timestamp(T0, unit="s") and df.index[-1] == pd.Timestamp(T0 + 40, unit="s")
+    assert df["A"].tolist() == [2.0, 2.0, 2.0, 3.0, 3.0]
+    assert np.isnan(df["B"].iloc[0]) and df["B"].tolist()[1:] == [9.0] * 4
+    assert chart.ticks() == 4
+
+
+def test_updates_only_read_new_ticks():
+    rings = _rings([("A", T0 + 1, 1.0)])
+    chart = HistoryChart(["A"], window=100, points=10)
+    chart.update_from_rings(rings, now=T0 + 10)
+    assert chart.update_from_rings(rings, now=T0 + 10) == 0
+    rings.append("A", T0 + 15, 2.0)
+    assert chart.update_from_rings(rings, now=T0 + 20) == 1
+    assert chart.frame()["A"].tolist() == [1.0, 2.0, 2.0]
+
+
+def test_sliding_window_carries_the_last_price_forward():
+    rings = _rings([("A", T0 + 1, 1.0), ("A", T0 + 15, 2.0)])
+    chart = HistoryChart(["A"], window=100, points=10)
+    chart.update_from_rings(rings, now=T0 + 20)
+    chart.update_from_rings(rings, now=T0 + 130)              # both ticks have left the window
+    df = chart.frame()
+    assert len(df) == 10 and df["A"].tolist() == [2.0] * 10
+    assert chart.ticks() == 0
+
+
+def test_rings_and_tick_store_build_the_same_frame(tmp_path):
+    ticks = [("A", T0 + i * 3.7, 100.0 + i) for i in range(25)] + [("B", T0 + 50, 7.0)]
+    store = TickStore(tmp_path / "history.db")
+    store._last_compact = float("inf")                        # keep the synthetic ticks out of retention
+    store.append_many(ticks)
+    from_rings, from_store = HistoryChart(["A", "B"], 100, 10), HistoryChart(["A", "B"], 100, 10)
+    from_rings.update_from_rings(_rings(ticks), now=T0 + 95)
+    from_store.update_from_store(store, now=T0 + 95)
+    pd.testing.assert_frame_equal(from_rings.frame(), from_store.frame())
+    store.close()
+
+
+def test_empty_chart_and_price_formatting():
+    chart = HistoryChart(["A"], window=100, points=10)
+    assert chart.frame() is None
+    chart.update_from_rings(PriceRings(depth=4), now=T0)
+    assert chart.frame() is None
+    df = pd.DataFrame({"A": [1.23456, np.nan]})
+    assert format_prices(df, 2)["A"].tolist() == ["1.23", "—"]
@@ -0,0 +1,140 @@
+import json
+import os
+
+import pytest
+
+from stockwatch.config import (ConfigStore, apply_config_changes, copy_config, default_config, describe_changes,
+                               diff_config, normalise_config)
+
+
+def _write(path, data):
+    path.write_text(json.dumps(data))
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))   # coarse-mtime filesystems
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ConfigStore(tmp_path / "config.json", check_every=0)
+
+
+# ── ConfigStore ───────────────────────────────────────────────────────────────
+def test_missing_file_serves_defaults(store):
+    cfg, version = store.snapshot()
+    assert cfg == default_config() and version == 1
+    assert store.snapshot() == (cfg, 1)                  # parsed once, shared until the file changes
+
+
+def test_reloads_when_the_file_changes(store):
+    _write(store.path, {"stocks": [{"symbol": "AAPL", "alert_pct": 1.0}], "refresh_interval": 30})
+    cfg, version = store.snapshot()
+    assert [s["symbol"] for s in cfg["stocks"]] == ["AAPL"]
+    assert cfg["refresh_interval"] == 30 and cfg["calls_per_minute"] == 55    # gaps filled from defaults
+
+    _write(store.path, {"stocks": [], "refresh_interval": 90})
+    cfg2, version2 = store.snapshot()
+    assert cfg2["refresh_interval"] == 90 and version2 == version + 1
+    assert cfg["refresh_interval"] == 30                 # earlier snapshots are never mutated
+
+
+@pytest.mark.parametrize("bad", ["{not json", "[]", '"x"', '{"whatsapp": []}'])
+def test_bad_file_keeps_the_last_good_config(store, bad):
+    _write(store.path, {"refresh_interval": 45})
+    good, version = store.snapshot()
+
+    store.path.write_text(bad)
+    os.utime(store.path, ns=(0, os.stat(store.path).st_mtime_ns + 2_000_000))
+    assert store.snapshot() == (good, version)
+    assert store.error and str(store.path) in store.error
+
+    _write(store.path, {"refresh_interval": 50})
+    assert store.snapshot()[0]["refresh_interval"] == 50 and store.error is None
+
+
+def test_deleted_file_keeps_the_last_good_config(store):
+    cfg = copy_config(store.current())
+    cfg["stocks"] = [{"symbol": "AAPL", "alert_pct": 1.0}]
+    store.save(cfg)
+    good, version = store.snapshot()
+
+    store.path.unlink()                                  # transient delete, or an editor's non-atomic save
+    assert store.snapshot() == (good, version)
+    assert store.error and "missing" in store.error
+
+    _write(store.path, {"stocks": [{"symbol": "MSFT", "alert_pct": 1.0}]})
+    cfg, version2 = store.snapshot()
+    assert [s["symbol"] for s in cfg["stocks"]] == ["MSFT"] and version2 == version + 1
+    assert store.error is None
+
+
+def test_save_writes_atomically_and_bumps_version(store):
+    cfg = copy_config(store.current())
+    cfg["refresh_interval"] = 120
+    store.save(cfg)
+
+    snap, version = store.snapshot()
+    assert snap["refresh_interval"] == 120 and version == 2
+    assert json.loads(store.path.read_text())["refresh_interval"] == 120
+    assert [p.name for p in store.path.parent.iterdir()] == ["config.json"]    # no temp files left behind
+    assert snap is not cfg
+
+
+def test_normalise_rejects_non_objects():
+    with pytest.raises(ValueError):
+        normalise_config(["stocks"])
+
+
+# ── Incremental changes ───────────────────────────────────────────────────────
+def _base():
+    cfg = default_config()
+    cfg["whatsapp"]["recipients"] = [{"name": "Ann", "phone": "111"}, {"name": "Bob", "phone": "222"}]
+    return cfg
+
+
+def test_diff_config_by_symbol_phone_and_setting():
+    old, new = _base(), _base()
+    new["stocks"] = [s for s in new["stocks"] if s["symbol"] != "GSK"] + [{"symbol": "AAPL", "alert_pct": 1.0}]
+    new["stocks"][0]["alert_pct"] = 3.0                  # CSCO
+    new["whatsapp"]["recipients"][1]["name"] = "Robert"
+    new["whatsapp"]["api_token"] = "secret"
+    new["refresh_interval"] = 30
+
+    changes = diff_config(old, new)
+    assert changes["stocks"]["added"] == [{"symbol": "AAPL", "alert_pct": 1.0}]
+    assert changes["stocks"]["removed"] == ["GSK"]
+    assert [s["symbol"] for s in changes["stocks"]["changed"]] == ["CSCO"]
+    assert changes["recipients"]["changed"] == [{"name": "Robert", "phone": "222"}]
+    assert changes["settings"] == {"whatsapp.api_token": "secret", "refresh_interval": 30}
+    assert describe_changes(changes) == "+AAPL, −GSK, ~CSCO, ~Robert, refresh_interval, whatsapp.api_token"
+    assert describe_changes(diff_config(old, old)) == ""
+
+
+def test_apply_changes_keeps_unrelated_local_edits():
+    old, disk = _base(), _base()
+    disk["stocks"].append({"symbol": "AAPL", "alert_pct": 1.0})
+    disk["streaming"] = {"enabled": True, "url": "ws://x"}
+    changes = diff_config(old, disk)
+
+    session = copy_config(old)
+    session["stocks"][1]["alert_pct"] = 9.0              # unsaved edit to a stock the other tab didn't touch
+    session["cards_per_page"] = 12
+    apply_config_changes(session, changes)
+
+    assert [s["symbol"] for s in session["stocks"]] == ["CSCO", "GSK", "GOOGL", "AAPL"]
+    assert session["stocks"][1]["alert_pct"] == 9.0
+    assert session["cards_per_page"] == 12
+    assert session["streaming"] == {"enabled": True, "url": "ws://x"}
+    assert session["streaming"] is not disk["streaming"]
+
+
+def test_apply_changes_replays_removals_and_edits():
+    old, disk = _base(), _base()
+    disk["stocks"] = disk["stocks"][1:]
+    disk["stocks"][0]["alert_pct"] = 5.0
+    disk["whatsapp"]["recipients"] = [{"name": "Cat", "phone": "333"}]
+
+    session = copy_config(old)
+    apply_config_changes(session, diff_config(old, disk))
+    assert session["stocks"] == disk["stocks"]
+    assert session["whatsapp"]["recipients"] == [{"name": "Cat", "phone": "333"}]
+    assert session["stocks"][0] is not disk["stocks"][0]
@@ -0,0 +1,78 @@
+import sqlite3
+import threading
+
+import pytest
+
+from stockwatch.cooldown import CooldownStore
+
+
+def _alerts(*rules):
+    return [{"symbol": "AAPL", "rule": r} for r in rules]
+
+
+@pytest.fixture
+def db(tmp_path):
+    return tmp_path / "outbox.db"
+
+
+def test_claim_respects_cooldown_and_reports_what_was_sent(db):
+    store = CooldownStore(db)
+    assert store.claim({"AAPL": (600, _alerts("pct_open"))}, now=1000) == ({"AAPL"}, {})
+    assert store.claim({"AAPL": (600, _alerts("price_above"))}, now=1300) == (set(), {"AAPL": {"pct_open"}})
+    assert store.claim({"AAPL": (600, _alerts("price_above"))}, now=1600) == ({"AAPL"}, {})
+    assert store.last_sent() == {"AAPL": 1600}
+    assert store.recent(100, now=1650) == _alerts("price_above")
+
+
+def test_concurrent_sessions_exactly_one_wins(db):
+    stores  = [CooldownStore(db) for _ in range(8)]     # one connection each, like separate processes
+    barrier = threading.Barrier(len(stores))
+    won     = []
+
+    def session(store):
+        barrier.wait()
+        claimed, _ = store.claim({"AAPL": (600, _alerts("pct_open")), "MSFT": (600, [])}, now=5000)
+        won.append(claimed)
+
+    threads = [threading.Thread(target=session, args=(s,)) for s in stores]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+
+    assert len(won) == len(stores)
+    assert [c for c in won if c] == [{"AAPL", "MSFT"}]  # whole batch claimed by one session, in one transaction
+
+
+def test_tenants_cool_down_independently(db):
+    alice = CooldownStore(db, tenant="alice")
+    bob   = alice.for_tenant("bob")
+    assert alice.claim({"AAPL": (600, [])}, now=1000)[0] == {"AAPL"}
+    assert bob.claim({"AAPL": (600, [])}, now=1000)[0] == {"AAPL"}
+    assert alice.claim({"AAPL": (600, [])}, now=1100)[0] == set()
+
+    bob.clear()
+    assert bob.last_sent() == {} and alice.last_sent() == {"AAPL": 1000}
+
+
+def test_failed_claim_rolls_back_the_whole_batch(db):
+    store = CooldownStore(db)
+    bad   = {"AAPL": (600, _alerts("pct_open")), "MSFT": (600, [object()])}    # not JSON-serialisable
+    with pytest.raises(TypeError):
+        store.claim(bad, now=1000)
+
+    assert not store._conn.in_transaction
+    assert store.last_sent() == {}                       # AAPL's claim was undone with the rest
+    assert store.claim({"AAPL": (600, [])}, now=1000)[0] == {"AAPL"}
+
+
+def test_migrates_pre_tenant_table(db):
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE alert_cooldowns (symbol TEXT PRIMARY KEY, last_ts REAL NOT NULL, alerts TEXT NOT NULL)")
+    conn.execute("INSERT INTO alert_cooldowns VALUES ('AAPL', 1000, '[]')")
+    conn.commit()
+    conn.close()
+
+    store = CooldownStore(db)
+    assert store.last_sent() == {"AAPL": 1000}
+    assert store.for_tenant("alice").last_sent() == {}
@@ -0,0 +1,191 @@
+import threading
+import time
+
+import pytest
+
+from stockwatch import delivery
+from stockwatch.delivery import DeliveryQueue, DigestCoalescer
+
+ANN = {"name": "Ann", "phone": "111"}
+BOB = {"name": "Bob", "phone": "222"}
+WA  = {"id_instance": "inst-1", "api_token": "token"}
+
+
+class RecordingQueue:
+    """DeliveryQueue stand-in that records every enqueue_many call."""
+
+    def __init__(self):
+        self.calls = []
+        self.sent  = threading.Event()
+
+    def enqueue_many(self, messages, recipients, wa, on_receipt=None):
+        self.calls.append((messages, [r["phone"] for r in recipients], wa))
+        self.sent.set()
+        return len(messages) * len(recipients)
+
+
+class ScriptedSend:
+    """send_one stand-in answering each phone from a script of (ok, err, retryable) results, the last repeating."""
+
+    def __init__(self, script=None):
+        self.script = script or {}
+        self.calls  = []
+        self.lock   = threading.Lock()
+
+    def __call__(self, client, phone, message):
+        with self.lock:
+            n = sum(p == phone for p, _ in self.calls)
+            self.calls.append((phone, message))
+        results = self.script.get(phone, [(True, "", False)])
+        return results[min(n, len(results) - 1)]
+
+
+class Receipts(list):
+    """on_receipt callback that collects (phone, ok, error) tuples."""
+
+    def __call__(self, name, phone, ok, err):
+        self.append((phone, ok, err))
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    monkeypatch.setattr(delivery, "can_send", lambda wa: True)
+    monkeypatch.setattr(delivery, "get_green_api_client", lambda wa: object())
+
+
+def _queue(send, **options):
+    return DeliveryQueue(workers=2, sends_per_second=1000, burst=1000, base_delay=0.01, send=send, **options)
+
+
+def _alert(symbol, urgent=False):
+    return {"symbol": symbol, "name": symbol, "price": 101.0, "change": 2.5, "threshold": 2.0,
+            "currency": "$", "rule": "pct_open", "urgent": urgent}
+
+
+def _symbols(message):
+    return [s for s in ("AAPL", "MSFT", "GOOGL") if f"*{s}*" in message]
+
+
+# ── Digest windows ────────────────────────────────────────────────────────────
+def test_alerts_within_the_window_become_one_message():
+    queue  = RecordingQueue()
+    digest = DigestCoalescer(queue, window=60)
+    digest.add([_alert("AAPL")], [ANN], WA)
+    digest.add([_alert("MSFT")], [ANN], WA)
+    assert queue.calls == [] and digest.stats()["open"] == 1
+
+    assert digest.flush() == 0                           # window still open
+    assert digest.flush(force=True) == 1
+    ((messages, phones, _),) = queue.calls
+    assert phones == ["111"] and _symbols(messages[0]) == ["AAPL", "MSFT"]
+    assert digest.stats() == {"alerts": 2, "messages": 1, "open": 0}
+
+
+def test_window_closes_on_its_own():
+    queue  = RecordingQueue()
+    digest = DigestCoalescer(queue, window=0.05)
+    digest.add([_alert("AAPL")], [ANN], WA)
+    assert queue.sent.wait(5)
+    assert len(queue.calls) == 1 and digest.stats()["open"] == 0
+
+
+def test_urgent_alerts_skip_the_window():
+    queue  = RecordingQueue()
+    digest = DigestCoalescer(queue, window=60)
+    digest.add([_alert("AAPL", urgent=True), _alert("MSFT")], [ANN], WA)
+
+    ((messages, _, _),) = queue.calls
+    assert _symbols(messages[0]) == ["AAPL"]
+    digest.flush(force=True)
+    assert _symbols(queue.calls[1][0][0]) == ["MSFT"]
+
+
+def test_zero_window_sends_at_once():
+    queue  = RecordingQueue()
+    digest = DigestCoalescer(queue, window=60)
+    digest.add([_alert("AAPL")], [ANN, BOB], WA, window=0)
+    assert queue.calls[0][1] == ["111", "222"] and digest.stats()["open"] == 0
+
+
+# ── Grouping ──────────────────────────────────────────────────────────────────
+def test_recipients_with_identical_digests_share_one_enqueue():
+    queue  = RecordingQueue()
+    digest = DigestCoalescer(queue, window=60)
+    digest.add([_alert("AAPL")], [ANN, BOB], WA)
+    digest.flush(force=True)
+    assert len(queue.calls) == 1 and queue.calls[0][1] == ["111", "222"]
+
+
+def test_different_digests_and_instances_are_kept_apart():
+    queue  = RecordingQueue()
+    digest = DigestCoalescer(queue, window=60)
+    other  = {"id_instance": "inst-2", "api_token": "token"}
+    digest.add([_alert("AAPL")], [ANN, BOB], WA)
+    digest.add([_alert("MSFT")], [BOB], WA)
+    digest.add([_alert("GOOGL")], [ANN], other)           # same phone, another user's account
+    assert digest.stats()["open"] == 3
+
+    digest.flush(force=True)
+    sent = sorted((wa["id_instance"], phones, _symbols(messages[0])) for messages, phones, wa in queue.calls)
+    assert sent == [("inst-1", ["111"], ["AAPL"]), ("inst-1", ["222"], ["AAPL", "MSFT"]),
+                    ("inst-2", ["111"], ["GOOGL"])]
+
+
+def test_nothing_to_send_is_a_no_op():
+    queue  = RecordingQueue()
+    digest = DigestCoalescer(queue, window=60)
+    digest.add([], [ANN], WA)
+    digest.add([_alert("AAPL")], [], WA)
+    assert digest.flush(force=True) == 0 and queue.calls == []
+
+
+# ── Delivery queue ────────────────────────────────────────────────────────────
+def test_every_recipient_gets_every_message(fake_client):
+    send     = ScriptedSend()
+    receipts = Receipts()
+    queue    = _queue(send)
+    assert queue.enqueue_many(["one", "two"], [ANN, BOB], WA, on_receipt=receipts) == 4
+    assert queue.join(5)
+    assert sorted(send.calls) == [("111", "one"), ("111", "two"), ("222", "one"), ("222", "two")]
+    assert sorted(receipts) == [("111", True, "")] * 2 + [("222", True, "")] * 2
+    assert queue.stats() == {"queued": 0, "in_flight": 0, "sent": 4, "failed": 0, "retries": 0}
+
+
+def test_transient_failures_are_retried_with_backoff(fake_client):
+    send     = ScriptedSend({"111": [(False, "HTTP 500", True), (False, "timeout", True), (True, "", False)]})
+    receipts = Receipts()
+    queue    = _queue(send)
+    queue.enqueue("hi", [ANN], WA, on_receipt=receipts)
+    assert queue.join(5)
+    assert len(send.calls) == 3 and receipts == [("111", True, "")]
+    assert queue.stats()["retries"] == 2
+
+
+def test_gives_up_after_max_attempts_or_a_permanent_error(fake_client):
+    send     = ScriptedSend({"111": [(False, "HTTP 500", True)], "222": [(False, "HTTP 400", False)]})
+    receipts = Receipts()
+    queue    = _queue(send, max_attempts=3)
+    queue.enqueue("hi", [ANN, BOB], WA, on_receipt=receipts)
+    assert queue.join(5)
+    assert [p for p, _ in send.calls].count("111") == 3 and [p for p, _ in send.calls].count("222") == 1
+    assert sorted(receipts) == [("111", False, "HTTP 500"), ("222", False, "HTTP 400")]
+
+
+def test_rate_limited_sends_pause_every_worker(fake_client):
+    send  = ScriptedSend({"111": [(False, "HTTP 429", True), (True, "", False)]})
+    queue = DeliveryQueue(workers=2, base_delay=2.0, send=send)
+    queue.enqueue("hi", [ANN], WA)
+    deadline = time.monotonic() + 5
+    while not queue.stats()["retries"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert queue.bucket.paused_for() > 1.5
+    assert queue.stats()["queued"] == 1
+
+
+def test_unconfigured_client_fails_every_recipient_at_once():
+    send     = ScriptedSend()
+    receipts = Receipts()
+    queue    = _queue(send)
+    assert queue.enqueue("hi", [ANN, BOB], {"id_instance": "", "api_token": ""}, on_receipt=receipts) == 0
+    assert receipts == [("111", False, "Client not configured"), ("222", False, "Client not configured")]
+    assert send.calls == [] and queue.stats()["failed"] == 2
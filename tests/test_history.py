@@ -0,0 +1,59 @@
+import sqlite3
+import time
+
+import pytest
+
+from stockwatch.history import TickStore
+
+DAY = 86400
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TickStore(tmp_path / "history.db")
+    yield store
+    store.close()
+
+
+# ── Writes and reads ──────────────────────────────────────────────────────────
+def test_record_quotes_skips_errors_and_repeated_trade_times(store):
+    now = time.time()
+    assert store.record_quotes({"AAPL": {"c": 100.0, "t": now - 60}, "MSFT": {"error": "down"},
+                                "GOOGL": {"c": 0}}) == 1
+    assert store.record_quotes({"AAPL": {"c": 101.0, "t": now - 60}}) == 0     # trade time hasn't moved
+    assert store.record_quotes({"AAPL": {"c": 102.0}}, now=now) == 1           # no trade time: stamped now
+    assert store.symbols() == ["AAPL"] and store.count() == 2
+    assert store.range("AAPL") == [(now - 60, 100.0), (now, 102.0)]
+
+
+def test_latest_and_since_many(store):
+    now = time.time()
+    store.append_many([("AAPL", now + i, 100.0 + i) for i in range(5)] + [("MSFT", now + 2, 7.0)])
+    assert store.latest("AAPL", 2) == [(now + 3, 103.0), (now + 4, 104.0)]
+    assert store.since_many({"AAPL": now + 2, "MSFT": now, "NOPE": 0}) == [
+        ("AAPL", now + 3, 103.0), ("AAPL", now + 4, 104.0), ("MSFT", now + 2, 7.0)]
+    assert [r[0] for r in store.window(["AAPL", "MSFT"], now + 1, now + 2)] == ["AAPL", "AAPL", "MSFT"]
+    assert store.window([], now) == []
+
+
+# ── Retention / compaction ────────────────────────────────────────────────────
+def test_compact_expires_old_ticks_and_thins_to_one_per_minute(store):
+    now = 100 * DAY
+    store._last_compact = time.time()          # keep append_many from compacting against the real clock
+    old = now - 2 * DAY
+    store.append_many([("AAPL", now - 40 * DAY, 1.0),                                        # past retention
+                       ("AAPL", old, 2.0), ("AAPL", old + 10, 3.0), ("AAPL", old + 70, 4.0), # thinned
+                       ("AAPL", now - 30, 5.0), ("AAPL", now - 20, 6.0)])                    # recent: kept
+
+    assert store.compact(now=now) == {"expired": 1, "thinned": 1}
+    assert [p for _, p in store.range("AAPL")] == [3.0, 4.0, 5.0, 6.0]
+
+
+def test_wal_lets_a_second_connection_read_while_the_store_writes(store):
+    store.append_many([("AAPL", time.time(), 1.0)])
+    reader = sqlite3.connect(store.path)
+    try:
+        assert reader.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert reader.execute("SELECT COUNT(*) FROM ticks").fetchone()[0] == 1
+    finally:
+        reader.close()
@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from stockwatch import mock_http
+from stockwatch.httpclient import DEFAULT_TIMEOUT, HttpClient
+
+
+@pytest.fixture
+def server():
+    server, url = mock_http.start_background()
+    yield server, url
+    server.shutdown()
+    server.server_close()
+
+
+def test_sequential_calls_reuse_one_connection(server):
+    srv, url = server
+    client   = HttpClient()
+    for _ in range(20):
+        assert client.get(f"{url}/api/v1/quote", endpoint="finnhub.quote", params={"symbol": "AAPL"}).ok
+    host  = url.split("//")[1]
+    stats = client.stats()[host]
+    assert stats["calls"] == 20 and stats["errors"] == 0
+    assert stats["connections"] == 1                                 # keep-alive, not a handshake per call
+    assert srv.snapshot() == {"finnhub.quote": 20}
+    assert client.session(url) is client.session(f"{url}/other")     # one session per host
+
+
+def test_concurrent_calls_reuse_pooled_connections(server):
+    _, url = server
+    client = HttpClient(pool_size=8)           # as large as the concurrency, so none is dropped and reopened
+    with ThreadPoolExecutor(8) as pool:
+        codes = list(pool.map(lambda _: client.get(f"{url}/api/v1/quote?symbol=MSFT").status_code, range(40)))
+    assert codes == [200] * 40
+    assert 1 <= client.stats()[url.split("//")[1]]["connections"] <= 8
+
+
+def test_server_errors_and_failures_are_counted(server):
+    srv, url = server
+    srv.error_rate = 1.0
+    client = HttpClient(timeouts={"finnhub.quote": 0.5})
+    assert client.timeouts["finnhub.quote"] == 0.5 and client.timeouts.get("nope", DEFAULT_TIMEOUT) == 10
+    assert client.get(f"{url}/api/v1/quote?symbol=AAPL", endpoint="finnhub.quote").status_code == 500
+    with pytest.raises(requests.ConnectionError):
+        client.get("http://127.0.0.1:9/api/v1/quote")                # discard port: refused
+    stats = client.stats()
+    assert stats[url.split("//")[1]]["errors"] == 1
+    assert (stats["127.0.0.1:9"]["calls"], stats["127.0.0.1:9"]["errors"]) == (1, 1)   # recorded even when it raises
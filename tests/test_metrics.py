@@ -0,0 +1,74 @@
+import pytest
+import requests
+
+from stockwatch.metrics import Metrics
+
+
+# ── Recording ─────────────────────────────────────────────────────────────────
+def test_span_times_the_block_even_when_it_raises():
+    metrics = Metrics()
+    with metrics.span("fetch"):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.span("fetch"):
+            raise ValueError
+    stages = metrics.stages()
+    assert list(stages) == ["fetch"] and stages["fetch"]["count"] == 2
+    assert 0 <= stages["fetch"]["p50_ms"] <= stages["fetch"]["max_ms"]
+
+
+def test_counters_and_summaries_are_kept_per_label():
+    metrics = Metrics()
+    metrics.inc("stockwatch_sends_total", result="sent")
+    metrics.inc("stockwatch_sends_total", 2, result="failed")
+    metrics.inc("stockwatch_sends_total", result="sent")
+    assert metrics.counters("stockwatch_sends_total", "result") == {"sent": 2.0, "failed": 2.0}
+    for seconds in (0.1, 0.2, 0.3):
+        metrics.observe("stockwatch_http_request_seconds", seconds, host="a")
+    summary = metrics.summary("stockwatch_http_request_seconds", "host")["a"]
+    assert summary["count"] == 3 and summary["last_ms"] == pytest.approx(300)
+    assert summary["avg_ms"] == pytest.approx(200) and summary["p50_ms"] == pytest.approx(200)
+
+
+# ── Export ────────────────────────────────────────────────────────────────────
+def test_render_is_prometheus_text_with_cumulative_buckets():
+    metrics = Metrics()
+    metrics.inc("stockwatch_sends_total", result='say "hi"')
+    metrics.observe("stockwatch_stage_seconds", 0.003, stage="fetch")
+    metrics.observe("stockwatch_stage_seconds", 0.2, stage="fetch")
+    lines = metrics.render().splitlines()
+
+    assert "# TYPE stockwatch_sends_total counter" in lines
+    assert 'stockwatch_sends_total{result="say \\"hi\\""} 1' in lines
+    assert "# TYPE stockwatch_stage_seconds histogram" in lines
+    assert 'stockwatch_stage_seconds_bucket{stage="fetch",le="0.0025"} 0' in lines
+    assert 'stockwatch_stage_seconds_bucket{stage="fetch",le="0.005"} 1' in lines
+    assert 'stockwatch_stage_seconds_bucket{stage="fetch",le="+Inf"} 2' in lines
+    assert 'stockwatch_stage_seconds_sum{stage="fetch"} 0.203000' in lines
+    assert 'stockwatch_stage_seconds_count{stage="fetch"} 2' in lines
+
+
+def test_export_writes_atomically_and_throttles(tmp_path):
+    metrics = Metrics()
+    metrics.inc("stockwatch_sends_total", result="sent")
+    path = tmp_path / "metrics.prom"
+    assert metrics.export(path, every=60)
+    assert path.read_text() == metrics.render()
+    assert not metrics.export(path, every=60)                     # too soon
+    assert metrics.export(path)
+    assert [p.name for p in tmp_path.iterdir()] == ["metrics.prom"]   # no temp files left behind
+
+
+def test_serve_exposes_metrics_over_http():
+    metrics = Metrics()
+    metrics.inc("stockwatch_candle_fetches_total", result="ok")
+    server = metrics.serve(0)
+    try:
+        url  = f"http://127.0.0.1:{server.server_port}"
+        resp = requests.get(f"{url}/metrics")
+        assert resp.status_code == 200 and resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        assert 'stockwatch_candle_fetches_total{result="ok"} 1' in resp.text
+        assert requests.get(f"{url}/other").status_code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,57 @@
+import time
+
+import pytest
+import requests
+
+from stockwatch import mock_http
+from stockwatch.bench import _delta, bench_config
+
+
+@pytest.fixture
+def server():
+    server, url = mock_http.start_background(seed=1)
+    yield server, url
+    server.shutdown()
+    server.server_close()
+
+
+# ── Mock Finnhub and GREEN API ────────────────────────────────────────────────
+def test_routes_answer_and_are_counted(server):
+    srv, url = server
+    quote = requests.get(f"{url}/api/v1/quote", params={"symbol": "AAPL"}).json()
+    assert set(quote) == {"c", "o", "pc", "h", "l", "d", "dp", "t"} and quote["l"] <= quote["c"] <= quote["h"]
+    listing = requests.get(f"{url}/api/v1/stock/symbol", params={"exchange": "US"}).json()
+    assert len(listing) == 20_000 and listing[0]["symbol"] == "AAPL"
+    assert requests.get(f"{url}/waInstance1/getStateInstance/tok").json() == {"stateInstance": "authorized"}
+    assert "idMessage" in requests.post(f"{url}/waInstance1/sendMessage/tok", json={"chatId": "1@c.us"}).json()
+    assert requests.get(f"{url}/nope").status_code == 404
+    assert srv.snapshot() == {"finnhub.quote": 1, "finnhub.symbols": 1, "greenapi.state": 1, "greenapi.send": 1}
+
+
+def test_candles_are_stable_across_refetches(server):
+    _, url = server
+    now    = int(time.time())
+    params = {"symbol": "MSFT", "resolution": "5", "from": now - 3600, "to": now}
+    first  = requests.get(f"{url}/api/v1/stock/candle", params=params).json()
+    again  = requests.get(f"{url}/api/v1/stock/candle", params=params).json()
+    assert first["s"] == "ok" and first == again
+    assert all(t % 300 == 0 for t in first["t"]) and len(first["t"]) in (12, 13)
+    assert requests.get(f"{url}/api/v1/stock/candle", params={**params, "from": now + 900}).json() == {"s": "no_data"}
+
+
+def test_injected_errors_and_rate_limits(server):
+    srv, url = server
+    srv.rate_limit_rate = 1.0
+    resp = requests.get(f"{url}/api/v1/quote", params={"symbol": "AAPL"})
+    assert resp.status_code == 429 and resp.headers["Retry-After"] == "1"
+    srv.rate_limit_rate, srv.error_rate = 0.0, 1.0
+    assert requests.get(f"{url}/api/v1/quote", params={"symbol": "AAPL"}).status_code == 500
+    assert srv.snapshot() == {"finnhub.quote": 2}
+
+
+# ── Benchmark helpers ─────────────────────────────────────────────────────────
+def test_bench_config_and_deltas():
+    cfg = bench_config(size=3, recipients=2, concurrency=4)
+    assert [s["symbol"] for s in cfg["stocks"]] == ["S0000", "S0001", "S0002"]
+    assert len(cfg["whatsapp"]["recipients"]) == 2 and cfg["fetch_concurrency"] == 4
+    assert _delta({"a": 3, "b": 1, "c": 2}, {"a": 1, "b": 1}) == {"a": 2, "c": 2}
@@ -0,0 +1,162 @@
+import json
+import time
+
+import pytest
+
+from stockwatch import monitor as monitor_module
+from stockwatch.config import default_config, list_tenants, serialise_config, tenant_config_path, tenant_name
+from stockwatch.monitor import Monitor, read_monitor_state, tenant_state_path, watched_stocks
+from stockwatch.providers import QuoteProvider
+from stockwatch.quotes import QuoteScheduler
+
+
+class StubProvider(QuoteProvider):
+    """Unmetered provider with settable prices that records every batch it is asked for."""
+
+    label     = "stub"
+    max_batch = 100
+    metered   = False
+
+    def __init__(self, prices):
+        self.prices  = prices
+        self.batches = []
+
+    def fetch_many(self, symbols):
+        self.batches.append(sorted(symbols))
+        return {s: {"c": self.prices.get(s, 100.0), "o": 100.0, "pc": 100.0, "t": int(time.time())}
+                for s in symbols}
+
+
+class RecordingDigest:
+    """DigestCoalescer stand-in: records who would have been messaged about what."""
+
+    def __init__(self):
+        self.sent = []
+
+    def add(self, alerts, recipients, wa, on_receipt=None, window=None):
+        if alerts:
+            self.sent.append((wa["id_instance"], [r["phone"] for r in recipients], [a["symbol"] for a in alerts]))
+
+    def flush(self, force=False):
+        return 0
+
+
+def _config(path, symbols, alert_pct=2.0, phone=None, **settings):
+    cfg = default_config()
+    cfg["stocks"] = [{"symbol": s, "name": s, "alert_pct": alert_pct} for s in symbols]
+    if phone:
+        cfg["whatsapp"] = {"id_instance": f"inst-{phone}", "api_token": "token",
+                           "recipients": [{"name": phone, "phone": phone}]}
+    cfg.update(settings)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(serialise_config(cfg)))
+
+
+@pytest.fixture
+def make_monitor(tmp_path, monkeypatch):
+    monkeypatch.setattr(monitor_module, "WA_AVAILABLE", True)
+
+    def make(prices, users_dir=None):
+        mon = Monitor(tmp_path / "config.json", tmp_path / "state.json", interval=30,
+                      history_path=tmp_path / "history.db", outbox_path=tmp_path / "outbox.db",
+                      prom_path=tmp_path / "monitor.prom", users_dir=users_dir, candle_dir=tmp_path / "candles")
+        mon.quotes          = QuoteScheduler(StubProvider(prices))
+        mon.digest          = RecordingDigest()
+        mon.instance.watch  = lambda wa: None            # no GREEN API polling
+        mon.delivery.replay = lambda wa, on_receipt=None: 0
+        return mon
+
+    return make
+
+
+# ── Single config ─────────────────────────────────────────────────────────────
+def test_cycle_fetches_alerts_and_publishes_state(tmp_path, make_monitor):
+    _config(tmp_path / "config.json", ["AAPL", "MSFT"])
+    mon   = make_monitor({"AAPL": 103.0})
+    state = mon.run_cycle()
+
+    assert state["symbols"] == 2 and state["alerts"] == 1
+    published = read_monitor_state(tmp_path / "state.json")
+    assert published["cycle"] == 1 and published["interval"] == 30
+    assert set(published["quotes"]) == {"AAPL", "MSFT"}
+    assert [a["symbol"] for a in published["triggered"]] == ["AAPL"]
+    assert published["breached"] == ["AAPL"]
+    assert (tmp_path / "monitor.prom").exists()
+
+    assert mon.run_cycle()["alerts"] == 0                  # latched: no second alert for the same breach
+    assert len(read_monitor_state(tmp_path / "state.json")["alerts"]) == 1
+    assert mon.ticks.latest("AAPL", 10)                     # quotes reach the tick history and the rings
+    assert "AAPL" in mon.rings
+
+
+def test_stale_or_missing_state_reads_as_no_monitor(tmp_path):
+    path = tmp_path / "state.json"
+    assert read_monitor_state(path) is None
+    path.write_text(json.dumps({"updated_at": time.time() - 1000, "interval": 60}))
+    assert read_monitor_state(path) is None                 # older than three intervals
+    path.write_text(json.dumps({"updated_at": time.time() - 10, "interval": 60}))
+    assert read_monitor_state(path)["age"] >= 10
+
+
+def test_restart_resumes_recent_alerts(tmp_path, make_monitor):
+    _config(tmp_path / "config.json", ["AAPL"])
+    make_monitor({"AAPL": 103.0}).run_cycle()
+    mon = make_monitor({"AAPL": 100.0})
+    mon.run_cycle()
+    assert [a["symbol"] for a in read_monitor_state(tmp_path / "state.json")["alerts"]] == ["AAPL"]
+
+
+def test_alerts_go_to_the_configured_recipients(tmp_path, make_monitor):
+    _config(tmp_path / "config.json", ["AAPL", "MSFT"], phone="111")
+    mon = make_monitor({"AAPL": 103.0, "MSFT": 97.0})
+    mon.run_cycle()
+    assert mon.digest.sent == [("inst-111", ["111"], ["AAPL", "MSFT"])]
+
+
+# ── Several users ─────────────────────────────────────────────────────────────
+def test_watched_stocks_keeps_the_tightest_threshold():
+    union = watched_stocks([[{"symbol": "AAPL", "alert_pct": 3.0}, {"symbol": "MSFT", "alert_pct": 0}],
+                            [{"symbol": "AAPL", "alert_pct": 1.5}, {"symbol": "MSFT", "alert_pct": 2.0}],
+                            [{"symbol": "AAPL", "alert_pct": 2.5}]])
+    assert [(s["symbol"], s["alert_pct"]) for s in union] == [("AAPL", 1.5), ("MSFT", 2.0)]
+
+
+def test_users_share_one_fetch_but_keep_their_own_alerts(tmp_path, make_monitor):
+    users = tmp_path / "users"
+    _config(tmp_path / "config.json", [])
+    _config(tenant_config_path("alice", users), ["AAPL", "MSFT"], phone="111")
+    _config(tenant_config_path("bob", users), ["MSFT", "GOOGL"], phone="222")
+    mon   = make_monitor({"AAPL": 103.0, "MSFT": 104.0}, users_dir=users)
+    state = mon.run_cycle()
+
+    assert state["users"] == 3 and state["watched"] == 4 and state["symbols"] == 3
+    assert mon.quotes.provider.batches == [["AAPL", "GOOGL", "MSFT"]]      # each symbol fetched once
+    alice = read_monitor_state(tenant_state_path("alice", users))
+    bob   = read_monitor_state(tenant_state_path("bob", users))
+    assert set(alice["quotes"]) == {"AAPL", "MSFT"} and set(bob["quotes"]) == {"MSFT", "GOOGL"}
+    assert [a["symbol"] for a in bob["alerts"]] == ["MSFT"]
+    assert sorted(mon.digest.sent) == [("inst-111", ["111"], ["AAPL", "MSFT"]), ("inst-222", ["222"], ["MSFT"])]
+
+
+def test_users_come_and_go_with_their_config(tmp_path, make_monitor):
+    users = tmp_path / "users"
+    _config(tenant_config_path("alice", users), ["AAPL"])
+    mon   = make_monitor({}, users_dir=users)
+    assert mon.run_cycle()["users"] == 1                                 # no default config yet
+
+    _config(tenant_config_path("bob", users), ["MSFT"])
+    (users / "Not A User").mkdir()
+    assert mon.run_cycle()["users"] == 2 and set(mon.tenants) == {"alice", "bob"}
+
+    tenant_config_path("alice", users).unlink()
+    state = mon.run_cycle()
+    assert set(mon.tenants) == {"bob"} and state["symbols"] == 1
+    assert mon.quotes.provider.batches[-1] == ["MSFT"]
+
+
+def test_tenant_names_are_safe_directories(tmp_path):
+    assert tenant_name("  Alice ") == "alice" and tenant_name(None) == ""
+    for bad in ("../etc", "a/b", ".hidden", "x" * 65):
+        with pytest.raises(ValueError):
+            tenant_name(bad)
+    assert list_tenants(tmp_path / "missing") == []
@@ -0,0 +1,204 @@
+import threading
+import time
+
+import pytest
+
+from stockwatch import delivery, outbox as outbox_module
+from stockwatch.delivery import DeliveryQueue
+from stockwatch.outbox import Outbox
+
+RECIPIENTS = [{"name": "Ann", "phone": "111"}, {"name": "Bob", "phone": "222"}]
+WA         = {"id_instance": "inst-1", "api_token": "token"}
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    box = Outbox(tmp_path / "outbox.db", lease=60)
+    yield box
+    box.close()
+
+
+def _pending(box):
+    return box.counts().get("pending", 0)
+
+
+# ── Journal and leases ────────────────────────────────────────────────────────
+def test_record_leases_deliveries_to_the_writer(outbox):
+    (mid,) = outbox.record(["hello"], RECIPIENTS, "inst-1")
+    now    = time.time()
+    assert _pending(outbox) == 2
+    assert outbox.claim_pending(now=now) == []                    # still leased to us
+
+    rows = outbox.claim_pending(now=now + 61)
+    assert rows == [(mid, "hello", "Ann", "111"), (mid, "hello", "Bob", "222")]
+    assert outbox.claim_pending(now=now + 62) == []               # the claim took a new lease
+
+
+def test_marks_are_buffered_until_flush(outbox):
+    (mid,) = outbox.record(["hello"], RECIPIENTS)
+    outbox.mark(mid, "111", ok=True)
+    outbox.mark(mid, "222", ok=False, err="HTTP 500", retryable=True)
+    assert outbox.flush() == 2
+    assert outbox.counts() == {"sent": 1, "pending": 1}
+    assert [r[3] for r in outbox.claim_pending(now=time.time() + 61)] == ["222"]
+
+    outbox.mark(mid, "222", ok=False, err="bad number")
+    outbox.flush()
+    assert outbox.counts() == {"sent": 1, "failed": 1}
+
+
+def test_claim_filters_by_instance_and_skip(outbox):
+    (mine,) = outbox.record(["mine"], RECIPIENTS[:1], "inst-1")
+    outbox.record(["other"], RECIPIENTS[:1], "inst-2")
+    outbox.record(["anyone"], RECIPIENTS[:1], "")
+    later   = time.time() + 61
+
+    rows = outbox.claim_pending(now=later, instance="inst-1", skip={(mine, "111")})
+    assert [r[1] for r in rows] == ["anyone"]
+    assert [r[1] for r in outbox.claim_pending(now=later, instance="inst-2")] == ["other"]
+
+
+def test_old_pending_alerts_expire_instead_of_sending_late(tmp_path):
+    box = Outbox(tmp_path / "outbox.db", lease=60, max_age=10)
+    box.record(["stale"], RECIPIENTS)
+    assert box.claim_pending(now=time.time() + 61) == []
+    assert box.counts() == {"expired": 2}
+    box.close()
+
+
+def test_renew_extends_pending_leases_only(outbox):
+    (mid,) = outbox.record(["hello"], RECIPIENTS)
+    outbox.mark(mid, "222", ok=True)
+    outbox.renew([(mid, "111"), (mid, "222")], extra=100)
+    outbox.flush()
+    now = time.time()
+
+    assert outbox.claim_pending(now=now + 61) == []               # 111 renewed to ~now + 160
+    assert [r[3] for r in outbox.claim_pending(now=now + 161)] == ["111"]
+    assert outbox.counts() == {"sent": 1, "pending": 1}
+
+
+class FailingConnection:
+    """Proxies a sqlite3 connection but fails the first lease update, mid-transaction."""
+
+    def __init__(self, conn):
+        self.conn  = conn
+        self.armed = True
+
+    def executemany(self, sql, rows):
+        if self.armed and "lease_until" in sql:
+            self.armed = False
+            raise RuntimeError("disk full")
+        return self.conn.executemany(sql, rows)
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+def test_failed_flush_rolls_back_and_keeps_the_buffer(outbox):
+    (mid,) = outbox.record(["hello"], RECIPIENTS)
+    real   = outbox._conn
+    outbox._conn = FailingConnection(real)
+    outbox.mark(mid, "111", ok=True)
+    outbox.renew([(mid, "222")])
+    with pytest.raises(RuntimeError):
+        outbox.flush()
+
+    assert not real.in_transaction
+    assert outbox.counts() == {"pending": 2}                      # the receipt mark was rolled back too
+    assert outbox.flush() == 1
+    assert outbox.counts() == {"sent": 1, "pending": 1}
+    outbox._conn = real
+
+
+# ── Pruning ───────────────────────────────────────────────────────────────────
+def _age(box, mid, days):
+    box._conn.execute("UPDATE messages SET created = created - ? WHERE id = ?", (days * 86400, mid))
+
+
+def test_finished_messages_are_pruned_while_running(outbox, monkeypatch):
+    (done,)   = outbox.record(["done"], RECIPIENTS[:1])
+    (recent,) = outbox.record(["recent"], RECIPIENTS[:1])
+    outbox.mark(done, "111", ok=True)
+    outbox.mark(recent, "111", ok=True)
+    outbox.flush()
+    _age(outbox, done, 8)
+    _age(outbox, recent, 1)
+
+    outbox.claim_pending()
+    assert outbox.counts() == {"sent": 2}                         # pruned on startup; next one is an hour off
+
+    monkeypatch.setattr(outbox_module, "PRUNE_EVERY", 0)
+    outbox.claim_pending()
+    assert outbox.counts() == {"sent": 1}
+    (count,) = outbox._conn.execute("SELECT COUNT(*) FROM messages").fetchone()
+    assert count == 1
+
+
+def test_flush_loop_prunes_when_due(outbox, monkeypatch):
+    monkeypatch.setattr(outbox_module, "PRUNE_EVERY", 0)
+    (mid,) = outbox.record(["done"], RECIPIENTS[:1])
+    _age(outbox, mid, 8)
+    outbox.mark(mid, "111", ok=True)                              # wakes the background flusher
+
+    deadline = time.monotonic() + 5
+    while outbox.counts() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert outbox.counts() == {}
+
+
+# ── Replay through the delivery queue ─────────────────────────────────────────
+@pytest.fixture
+def fake_client(monkeypatch):
+    monkeypatch.setattr(delivery, "can_send", lambda wa: True)
+    monkeypatch.setattr(delivery, "get_green_api_client", lambda wa: object())
+
+
+class HeldSend:
+    """send_one stand-in that records every send and blocks until released."""
+
+    def __init__(self):
+        self.sent    = []
+        self.release = threading.Event()
+        self.lock    = threading.Lock()
+
+    def __call__(self, client, phone, message):
+        self.release.wait(10)
+        with self.lock:
+            self.sent.append((phone, message))
+        return True, "", False
+
+
+def test_replay_never_duplicates_deliveries_still_queued(tmp_path, fake_client):
+    box   = Outbox(tmp_path / "outbox.db", lease=0.5)
+    send  = HeldSend()
+    queue = DeliveryQueue(workers=1, sends_per_second=1000, burst=1000, send=send, outbox=box)
+    queue.enqueue_many(["one", "two"], RECIPIENTS, WA)
+
+    for _ in range(4):                                            # each replay outlives the original lease
+        time.sleep(0.3)
+        assert queue.replay(WA, force=True) == 0
+    send.release.set()
+    assert queue.join(10)
+
+    assert sorted(send.sent) == sorted((r["phone"], m) for m in ("one", "two") for r in RECIPIENTS)
+    box.close()
+    assert Outbox(tmp_path / "outbox.db").counts() == {"sent": 4}
+
+
+def test_replay_sends_what_a_crashed_process_left_pending(tmp_path, fake_client):
+    crashed = Outbox(tmp_path / "outbox.db", lease=0)
+    crashed.record(["left over"], RECIPIENTS, "inst-1")
+    crashed.close()
+    box   = Outbox(tmp_path / "outbox.db", lease=60)
+    send  = HeldSend()
+    send.release.set()
+    queue = DeliveryQueue(workers=2, sends_per_second=1000, burst=1000, send=send, outbox=box)
+
+    assert queue.replay(WA, force=True) == 2
+    assert queue.join(10)
+    assert queue.replay(WA, force=True) == 0
+    box.flush()
+    assert box.counts() == {"sent": 2}
+    assert sorted(p for p, _ in send.sent) == ["111", "222"]
+    box.close()
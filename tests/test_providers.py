@@ -0,0 +1,107 @@
+import json
+import os
+import time
+
+import numpy as np
+import pytest
+
+from stockwatch import mock_http, providers
+from stockwatch.history import TickStore
+from stockwatch.providers import (FinnhubProvider, ReplayProvider, export_history, fetch_candles, fetch_quote,
+                                  generate_ticks, load_ticks, make_provider, provider_key)
+
+TICKS = [("AAPL", 10.0, 100.0), ("MSFT", 12.0, 50.0), ("AAPL", 20.0, 104.0),
+         ("AAPL", 15.0, 97.0), ("MSFT", 30.0, 55.0), ("AAPL", 40.0, 101.0)]
+
+
+@pytest.fixture
+def replay_file(tmp_path):
+    path = tmp_path / "ticks.jsonl"
+    path.write_text("".join(json.dumps({"s": s, "t": t, "p": p}) + "\n" for s, t, p in TICKS) + "\n")
+    return path
+
+
+def _at(provider, t, loop=0):
+    """Wind the replay clock to recorded time `t` of the given loop."""
+    provider._mono0 = time.monotonic() - (loop * provider.span + t - provider.t0) / provider.speed
+
+
+# ── Replay files ──────────────────────────────────────────────────────────────
+def test_load_ticks_sorts_each_symbol_and_caches_the_parse(replay_file):
+    ticks = load_ticks(replay_file)
+    assert ticks["AAPL"][0].tolist() == [10.0, 15.0, 20.0, 40.0]
+    assert ticks["AAPL"][1].tolist() == [100.0, 97.0, 104.0, 101.0]
+    cache = replay_file.with_name("ticks.jsonl.npz")
+    assert cache.exists()
+
+    os.utime(replay_file, (0, 0))                         # older than the cache: parsed arrays are reused
+    replay_file.write_text("not json")
+    os.utime(replay_file, (0, 0))
+    assert load_ticks(replay_file)["MSFT"][1].tolist() == [50.0, 55.0]
+
+
+def test_generate_and_export_round_trip(tmp_path):
+    assert generate_ticks(tmp_path / "gen.jsonl", symbols=3, hours=0.01, rate=1, seed=1) == 108
+    ticks = load_ticks(tmp_path / "gen.jsonl")
+    assert sorted(ticks) == ["R0000", "R0001", "R0002"] and all(np.all(np.diff(t) > 0) for t, _ in ticks.values())
+
+    store = TickStore(tmp_path / "history.db")
+    store.append_many([(s, time.time() - 60 + t, p) for s, t, p in TICKS])
+    assert export_history(store, tmp_path / "out.jsonl", symbols=["MSFT"]) == 2
+    assert load_ticks(tmp_path / "out.jsonl")["MSFT"][1].tolist() == [50.0, 55.0]
+    store.close()
+
+
+# ── Replay provider ───────────────────────────────────────────────────────────
+def test_replay_quotes_follow_the_clock(replay_file):
+    played   = []
+    provider = ReplayProvider(replay_file, speed=100, loop=False, on_tick=lambda *a: played.append(a[::2]))
+    _at(provider, 5)
+    assert provider.fetch_many(["AAPL"])["AAPL"] == {"c": 0, "t": 0}            # not trading yet
+    _at(provider, 25)
+    quote = provider.fetch_many(["AAPL", "NOPE"])
+    assert quote["AAPL"]["c"] == 104.0 and (quote["AAPL"]["h"], quote["AAPL"]["l"]) == (104.0, 97.0)
+    assert quote["AAPL"]["o"] == quote["AAPL"]["pc"] == 100.0
+    assert "error" in quote["NOPE"]
+    assert played == [("AAPL", 100.0), ("AAPL", 97.0), ("AAPL", 104.0)]      # every tick, not just the last
+    assert provider.played == 3
+
+
+def test_replay_loops_back_to_the_start(replay_file):
+    played   = []
+    provider = ReplayProvider(replay_file, speed=100, loop=True, on_tick=lambda s, t, p: played.append(p))
+    _at(provider, 35)
+    assert provider.fetch_many(["MSFT"])["MSFT"]["c"] == 55.0
+    _at(provider, 11, loop=1)
+    quote = provider.fetch_many(["MSFT"])["MSFT"]
+    assert quote["c"] == 55.0                                                # last tick of the previous loop
+    _at(provider, 13, loop=1)
+    assert provider.fetch_many(["MSFT"])["MSFT"]["c"] == 50.0
+    assert played == [50.0, 55.0, 50.0]
+
+
+def test_provider_settings():
+    assert provider_key({"provider": "finnhub", "replay_file": "x"}) == ("finnhub",)
+    assert provider_key({"provider": "replay", "replay_file": "x"}) == ("replay", "x", 1.0, True)
+    assert isinstance(make_provider({}), FinnhubProvider)
+    with pytest.raises(ValueError):
+        make_provider({"provider": "replay"})
+    with pytest.raises(OSError):
+        make_provider({"provider": "replay", "replay_file": "/nonexistent/ticks.jsonl"})
+
+
+# ── Finnhub against the mock server ───────────────────────────────────────────
+def test_finnhub_calls_against_the_mock_server(monkeypatch):
+    server, url = mock_http.start_background()
+    monkeypatch.setattr(providers, "FINNHUB_BASE", f"{url}/api/v1")
+    try:
+        assert fetch_quote("AAPL")["c"] > 0
+        now = int(time.time())
+        assert fetch_candles("AAPL", "D", now - 5 * 86400, now)["s"] == "ok"
+        server.rate_limit_rate = 1.0
+        assert fetch_quote("AAPL") == {"error": "HTTP 429 Too Many Requests", "rate_limited": True,
+                                       "retry_after": 1.0}
+        assert fetch_candles("AAPL", "D", now - 86400, now)["status"] == 429
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,262 @@
+import threading
+import time
+
+import pytest
+
+from stockwatch.providers import QuoteProvider
+from stockwatch.quotes import QuoteCache, QuoteDeferred, QuoteScheduler, fetch_quotes
+
+
+def _quote(price):
+    return {"c": price, "o": 100.0, "pc": 100.0}
+
+
+class CountingFetch:
+    """fetch_many stand-in that records every batch and can be held open."""
+
+    def __init__(self, price=101.0, hold=False):
+        self.price   = price
+        self.calls   = []
+        self.release = threading.Event()
+        self.entered = threading.Event()
+        if not hold:
+            self.release.set()
+
+    def __call__(self, symbols):
+        self.calls.append(list(symbols))
+        self.entered.set()
+        self.release.wait(5)
+        return {s: _quote(self.price) for s in symbols}
+
+
+# ── Single-flight ─────────────────────────────────────────────────────────────
+def test_concurrent_misses_share_one_fetch():
+    fetch = CountingFetch(hold=True)
+    cache = QuoteCache(fetch, ttl=30)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("AAPL"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    assert fetch.entered.wait(5)
+    time.sleep(0.05)                 # let the followers queue up behind the leader
+    fetch.release.set()
+    for t in threads:
+        t.join(5)
+
+    assert fetch.calls == [["AAPL"]]
+    assert results == [_quote(101.0)] * 8
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["misses"] + stats["coalesced"] + stats["hits"] == 8
+
+
+def test_get_many_fetches_only_stale_symbols_in_one_batch():
+    fetch = CountingFetch()
+    cache = QuoteCache(fetch, ttl=30)
+    cache.get("AAPL")
+    quotes = cache.get_many(["AAPL", "MSFT", "GOOGL", "MSFT"])
+
+    assert fetch.calls == [["AAPL"], ["MSFT", "GOOGL"]]
+    assert list(quotes) == ["AAPL", "MSFT", "GOOGL"]
+    assert cache.stats()["hits"] == 1
+
+
+def test_ttl_expiry_and_invalidate_refetch():
+    fetch = CountingFetch()
+    cache = QuoteCache(fetch, ttl=30)
+    cache.get("AAPL")
+    cache.get("AAPL")
+    cache.get("AAPL", ttl=0)
+    assert len(fetch.calls) == 2
+
+    cache.invalidate(["AAPL"])
+    cache.get("AAPL")
+    assert len(fetch.calls) == 3
+    assert cache.has_quote("AAPL")
+
+
+def test_callable_ttl_is_per_symbol():
+    fetch = CountingFetch()
+    cache = QuoteCache(fetch, ttl=30)
+    cache.get_many(["AAPL", "MSFT"])
+    cache.get_many(["AAPL", "MSFT"], ttl=lambda s: 0 if s == "MSFT" else 30)
+    assert fetch.calls == [["AAPL", "MSFT"], ["MSFT"]]
+
+
+def test_fetch_errors_are_cached_per_symbol_not_raised():
+    def broken(symbols):
+        raise ConnectionError("down")
+
+    cache = QuoteCache(broken, ttl=30)
+    assert cache.get("AAPL") == {"error": "down"}
+    assert not cache.has_quote("AAPL")
+
+
+def test_deferred_fetch_serves_last_good_quote_flagged_stale():
+    fetch = CountingFetch()
+    cache = QuoteCache(fetch, ttl=30)
+    cache.get("AAPL")
+
+    def deferring(symbols):
+        raise QuoteDeferred("budget")
+
+    cache._fetch = deferring
+    quote = cache.get("AAPL", ttl=0)
+    assert quote == {**_quote(101.0), "stale": True}
+    assert cache.get("MSFT")["error"].startswith("deferred")
+    assert cache.stats()["deferred"] == 2
+
+
+def test_stale_fallback_survives_a_provider_error():
+    fetch = CountingFetch()
+    cache = QuoteCache(fetch, ttl=30)
+    cache.get("AAPL")
+
+    cache._fetch = lambda symbols: {s: {"error": "HTTP 502"} for s in symbols}
+    assert cache.get("AAPL", ttl=0) == {"error": "HTTP 502"}
+    assert cache.has_quote("AAPL")
+
+    def deferring(symbols):
+        raise QuoteDeferred("budget")
+
+    cache._fetch = deferring
+    assert cache.get("AAPL", ttl=0) == {**_quote(101.0), "stale": True}
+
+
+# ── Budgeted scheduling ───────────────────────────────────────────────────────
+class StubProvider(QuoteProvider):
+    label = "stub"
+
+    def __init__(self, replies=None):
+        self.replies = list(replies or [])    # quotes (or 429s) handed out in order, then 101.0
+        self.calls   = 0
+
+    def fetch(self, symbol):
+        self.calls += 1
+        return self.replies.pop(0) if self.replies else _quote(101.0)
+
+
+RATE_LIMITED = {"error": "HTTP 429 Too Many Requests", "rate_limited": True, "retry_after": 0.0}
+
+
+def _end_pause(bucket):
+    """Skip to the end of a backoff without sleeping through it."""
+    bucket._paused_until = 0.0
+    bucket._tokens       = bucket.capacity
+
+
+def test_every_metered_call_takes_a_token():
+    provider  = StubProvider()
+    scheduler = QuoteScheduler(provider, calls_per_minute=60, burst=2, max_wait=0)
+    for sym in ("A", "B"):
+        assert scheduler.get(sym)["c"] == 101.0
+    assert scheduler.get("C")["error"].startswith("deferred")    # no token, nothing cached to fall back on
+    assert provider.calls == 2
+
+
+def test_budget_exhausted_serves_cached_quote_stale():
+    provider  = StubProvider()
+    scheduler = QuoteScheduler(provider, calls_per_minute=60, burst=1, max_wait=0)
+    scheduler.get("A")
+    quote = scheduler.get("A", ttl=0)
+    assert quote["stale"] and quote["c"] == 101.0
+    assert provider.calls == 1
+
+
+def test_unmetered_provider_ignores_the_bucket():
+    provider = StubProvider()
+    provider.metered = False
+    scheduler = QuoteScheduler(provider, calls_per_minute=1, burst=1, max_wait=0)
+    for _ in range(5):
+        scheduler.get("A", ttl=0)
+    assert provider.calls == 5
+
+
+def test_http_429_pauses_bucket_with_exponential_backoff():
+    provider  = StubProvider([RATE_LIMITED, RATE_LIMITED])
+    scheduler = QuoteScheduler(provider, calls_per_minute=6000, burst=100, max_wait=0)
+
+    assert scheduler.get("A")["error"].startswith("deferred: rate limited")
+    assert scheduler.rate_limited == 1
+    assert scheduler.bucket.paused_for() == pytest.approx(2, abs=0.1)     # 2 ** 1 s
+
+    _end_pause(scheduler.bucket)
+    scheduler.get("A", ttl=0)
+    assert scheduler.bucket.paused_for() == pytest.approx(4, abs=0.1)     # 2 ** 2 s
+
+    _end_pause(scheduler.bucket)
+    assert scheduler.get("A", ttl=0)["c"] == 101.0
+    assert scheduler._strikes == 0                                         # success resets the backoff
+
+
+def test_http_429_honours_retry_after():
+    provider  = StubProvider([{**RATE_LIMITED, "retry_after": 42.0}])
+    scheduler = QuoteScheduler(provider, calls_per_minute=6000, burst=100, max_wait=0)
+    scheduler.get("A")
+    assert scheduler.bucket.paused_for() == pytest.approx(42, abs=0.1)
+
+
+def test_lowering_the_budget_shrinks_the_burst():
+    provider  = StubProvider()
+    scheduler = QuoteScheduler(provider, calls_per_minute=600, burst=10, max_wait=0)
+    scheduler.set_budget(3)
+    assert scheduler.bucket.capacity == 3 and scheduler.bucket.available() <= 3
+    for sym in "ABCDE":
+        scheduler.get(sym)
+    assert provider.calls == 3
+
+    scheduler.set_budget(600)
+    assert scheduler.bucket.capacity == 10
+
+
+def test_near_threshold_symbols_get_short_ttls_and_go_first():
+    scheduler = QuoteScheduler(StubProvider(), base_ttl=10, max_stretch=4)
+    stocks    = [{"symbol": "HOT", "alert_pct": 2.0}, {"symbol": "FLAT", "alert_pct": 2.0}]
+    scheduler.observe(stocks, {"HOT": {"c": 102.5, "o": 100.0}, "FLAT": {"c": 100.0, "o": 100.0}})
+
+    assert scheduler.ttl_for("HOT") == 10
+    assert scheduler.ttl_for("FLAT") == 40
+    assert scheduler.ttl_for("UNSEEN") == 10
+    assert scheduler.prioritise(["FLAT", "HOT"]) == ["HOT", "FLAT"]
+
+
+# ── Concurrent fetch ──────────────────────────────────────────────────────────
+class ConcurrencyProbe:
+    """get_many stand-in that sleeps and records the peak number of overlapping calls."""
+
+    def __init__(self, delay=0.05):
+        self.delay   = delay
+        self.lock    = threading.Lock()
+        self.active  = 0
+        self.peak    = 0
+        self.batches = []
+
+    def __call__(self, symbols):
+        with self.lock:
+            self.active += 1
+            self.peak    = max(self.peak, self.active)
+            self.batches.append(list(symbols))
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        return {s: _quote(101.0) for s in symbols}
+
+
+def test_fetch_quotes_runs_chunks_concurrently_up_to_the_bound():
+    probe          = ConcurrencyProbe()
+    symbols        = [f"S{i}" for i in range(12)]
+    quotes, timing = fetch_quotes(probe, symbols, max_workers=4)
+
+    assert set(quotes) == set(symbols)
+    assert probe.peak == 4
+    assert timing["requests"] == 12 and timing["symbols"] == 12
+    assert timing["wall"] < timing["sequential"] / 2
+
+
+def test_fetch_quotes_batches_symbols():
+    probe          = ConcurrencyProbe(delay=0)
+    quotes, timing = fetch_quotes(probe, ["A", "B", "C", "D", "E"], max_workers=1, batch=2)
+    assert probe.batches == [["A", "B"], ["C", "D"], ["E"]]
+    assert timing["requests"] == 3 and len(quotes) == 5
+    quotes, timing = fetch_quotes(probe, [], max_workers=8)
+    assert quotes == {} and timing["requests"] == 0
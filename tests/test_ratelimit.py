@@ -0,0 +1,66 @@
+import pytest
+
+from stockwatch import ratelimit
+from stockwatch.ratelimit import TokenBucket
+
+
+class FakeClock:
+    """Stands in for the time module: sleep() advances monotonic() instantly."""
+
+    def __init__(self):
+        self.now   = 1000.0
+        self.slept = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now   += seconds
+        self.slept += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(ratelimit, "time", fake)
+    return fake
+
+
+def test_burst_then_refill_at_rate(clock):
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    assert [bucket.acquire() for _ in range(4)] == [True, True, True, False]
+
+    clock.now += 0.5                       # one token at 2/s
+    assert bucket.acquire()
+    assert not bucket.acquire()
+
+    clock.now += 100                       # refill is capped at capacity
+    assert bucket.available() == pytest.approx(3)
+
+
+def test_acquire_waits_up_to_timeout(clock):
+    bucket = TokenBucket(rate=1.0, capacity=1)
+    assert bucket.acquire()
+    assert not bucket.acquire(timeout=0.5)
+    assert clock.slept == 0                # gives up at once when the wait would overrun the timeout
+
+    assert bucket.acquire(timeout=2.0)
+    assert clock.slept == pytest.approx(1.0)
+
+
+def test_pause_empties_bucket_and_blocks_until_it_ends(clock):
+    bucket = TokenBucket(rate=10.0, capacity=5)
+    bucket.pause(30)
+    assert bucket.available() == 0
+    assert bucket.paused_for() == pytest.approx(30)
+    assert not bucket.acquire(timeout=29)
+
+    assert bucket.acquire(timeout=60)
+    assert clock.now >= 1030
+
+
+def test_pause_never_shortens_an_existing_pause(clock):
+    bucket = TokenBucket(rate=1.0, capacity=1)
+    bucket.pause(60)
+    bucket.pause(5)
+    assert bucket.paused_for() == pytest.approx(60)
@@ -0,0 +1,117 @@
+import math
+import threading
+
+import numpy as np
+
+from stockwatch.ringbuffer import PriceRings, RingBuffer
+
+
+# ── RingBuffer ────────────────────────────────────────────────────────────────
+def test_wraparound_keeps_newest_ticks_contiguous():
+    ring = RingBuffer(4)
+    for i in range(10):
+        ring.append(float(i), 100.0 + i)
+
+    t, p = ring.view()
+    assert len(ring) == 4
+    assert t.tolist() == [6.0, 7.0, 8.0, 9.0]
+    assert p.tolist() == [106.0, 107.0, 108.0, 109.0]
+    assert ring.view(2)[0].tolist() == [8.0, 9.0]
+    assert ring.oldest() == 6.0 and ring.latest() == (9.0, 109.0)
+    assert not t.flags.writeable
+
+
+def test_out_of_order_ticks_are_ignored():
+    ring = RingBuffer(4)
+    assert ring.append(5.0, 1.0)
+    assert not ring.append(5.0, 2.0)
+    assert not ring.append(4.0, 3.0)
+    assert ring.view()[1].tolist() == [1.0]
+
+
+def test_since_slices_by_time():
+    ring = RingBuffer(8)
+    for i in range(6):
+        ring.append(float(i), float(i))
+    assert ring.since(3.5)[0].tolist() == [4.0, 5.0]
+    assert ring.since(0)[0].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0, 5.0]
+
+
+# ── PriceRings ────────────────────────────────────────────────────────────────
+def test_price_at_returns_last_tick_at_or_before():
+    rings = PriceRings(depth=4)
+    for i in range(6):                       # ticks 2..5 survive the wrap
+        rings.append("AAPL", 10.0 * i, 100.0 + i)
+
+    assert rings.price_at("AAPL", 30.0) == 103.0
+    assert rings.price_at("AAPL", 39.9) == 103.0
+    assert rings.price_at("AAPL", 1e9) == 105.0
+    assert math.isnan(rings.price_at("AAPL", 19.0))     # evicted
+    assert math.isnan(rings.price_at("MSFT", 30.0))     # never seen
+
+
+def test_prices_at_matches_price_at_across_growth_and_wraparound():
+    rng   = np.random.default_rng(7)
+    rings = PriceRings(depth=16)
+    syms  = [f"S{i}" for i in range(40)]                # more rows than the first allocation
+    for sym in syms:
+        n = int(rng.integers(1, 50))
+        for t in np.cumsum(rng.uniform(0.5, 2.0, n)):
+            rings.append(sym, float(t), float(rng.uniform(50, 150)))
+
+    query = [syms[i] for i in rng.integers(0, len(syms), 500)] + ["NOPE"]
+    times = rng.uniform(-5, 100, len(query))
+    got   = rings.prices_at(query, times)
+    want  = [rings.price_at(s, t) for s, t in zip(query, times)]
+    np.testing.assert_array_equal(got, want)
+
+
+def test_prices_at_empty_and_unknown():
+    rings = PriceRings(depth=4)
+    assert rings.prices_at([], []).shape == (0,)
+    assert np.isnan(rings.prices_at(["X"], [1.0])).all()
+
+
+def test_record_quotes_skips_errors_and_uses_quote_time():
+    rings = PriceRings(depth=4)
+    rings.record_quotes({"A": {"c": 10.0, "t": 50}, "B": {"error": "down"}, "C": {"c": 0}}, now=99.0)
+    assert rings.ring("A").latest() == (50.0, 10.0)
+    assert "B" not in rings and "C" not in rings
+
+
+def test_covers_after_warm():
+    rings = PriceRings(depth=4)
+    rings.warm("SHORT", [(10.0, 1.0), (20.0, 2.0)])
+    assert rings.covers("SHORT", 0.0)                   # whole history fits, nothing older on disk
+
+    rings.warm("LONG", [(float(t), 1.0) for t in range(10)])
+    assert len(rings.ring("LONG")) == 4
+    assert rings.covers("LONG", 6.0)
+    assert not rings.covers("LONG", 5.0)
+    assert not rings.covers("UNKNOWN", 0.0)
+
+
+def test_readers_see_consistent_snapshots_while_writers_append_and_grow():
+    rings = PriceRings(depth=64)
+    rings.append("A", 0.0, 0.0)
+    stop  = threading.Event()
+
+    def writer():
+        t = 1
+        while not stop.is_set():
+            rings.append("A", float(t), float(t))        # price == time, so torn reads show up
+            if t % 50 == 0:
+                rings.append(f"S{t}", 1.0, 1.0)          # new rows force _grow() now and then
+            t += 1
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(2000):
+            t, p = rings.since("A", 0.0)
+            assert len(t) and np.array_equal(t, p) and (np.diff(t) > 0).all()
+            assert rings.price_at("A", float("inf")) >= t[-1]   # the writer only moves forward
+            assert rings.covers("A", float("inf"))             # an oldest tick, never a torn None
+    finally:
+        stop.set()
+        thread.join(5)
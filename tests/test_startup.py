@@ -0,0 +1,44 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from stockwatch import mock_http
+from stockwatch.bench import APP_PATH, HEAVY_MODULES, bench_config
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _python(code_or_args, cwd=ROOT, env=None):
+    args = ["-c", code_or_args] if isinstance(code_or_args, str) else code_or_args
+    proc = subprocess.run([sys.executable, *args], cwd=cwd, capture_output=True, text=True, timeout=120,
+                          env={**os.environ, "PYTHONPATH": str(ROOT), **(env or {})})
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    return proc.stdout.strip().splitlines()[-1]
+
+
+def test_importing_the_backend_leaves_optional_sdks_unloaded():
+    loaded = _python("import json, sys\n"
+                     "import stockwatch.monitor, stockwatch.delivery, stockwatch.whatsapp, stockwatch.streaming\n"
+                     f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))")
+    assert json.loads(loaded) == ["pandas"]                         # candles and history frames need it
+
+
+def test_dashboard_cold_start_defers_heavy_modules(tmp_path):
+    pytest.importorskip("streamlit.testing.v1")
+    # No recipients: an alert on the first run would rightly load the WhatsApp SDK to send it
+    (tmp_path / "stockwatch_config.json").write_text(json.dumps(bench_config(3, 0, 4)))
+    server, url = mock_http.start_background()
+    try:
+        out = _python(["-m", "stockwatch.bench", "--startup-child", "--app", str(APP_PATH), "--reruns", "1"],
+                      cwd=tmp_path, env={"STOCKWATCH_FINNHUB_BASE": f"{url}/api/v1",
+                                         "STOCKWATCH_GREENAPI_BASE": url})
+    finally:
+        server.shutdown()
+        server.server_close()
+    run = json.loads(out)
+    assert set(run["loaded"]) <= {"pandas"}                         # no SDK, WebSocket, QR or chart module
+    assert "fetch" in run["stages"]                                 # the app really ran its pipeline
@@ -0,0 +1,70 @@
+import json
+import time
+
+import pytest
+
+from stockwatch.streaming import PriceTable, TradeStream, overlay_quote
+
+
+# ── Price table and overlay ───────────────────────────────────────────────────
+def test_price_table_keeps_the_newest_trade():
+    table = PriceTable()
+    table.update("AAPL", 101.0, 20.0)
+    table.update("AAPL", 99.0, 10.0)                      # late, out-of-order trade
+    assert table.get("AAPL")[:2] == (101.0, 20.0)
+    assert table.get("MSFT") is None
+    assert set(table.snapshot()) == {"AAPL"}
+
+
+def test_overlay_replaces_price_and_widens_range():
+    quote = {"c": 100.0, "o": 99.0, "pc": 98.0, "h": 100.5, "l": 99.5, "t": 1}
+    live  = overlay_quote(quote, (101.0, 50.0, 0.0))
+    assert live == {**quote, "c": 101.0, "t": 50, "h": 101.0, "l": 99.5, "live": True}
+    assert overlay_quote(quote, None) is quote
+    assert overlay_quote({"error": "down"}, (101.0, 50.0, 0.0)) == {"c": 101.0, "t": 50, "live": True}
+
+
+def test_handle_feeds_table_and_callback():
+    seen   = []
+    stream = TradeStream("ws://unused", on_trade=lambda *a: seen.append(a))
+    stream._handle(json.dumps({"type": "ping"}))
+    stream._handle(json.dumps({"type": "trade", "data": [{"s": "AAPL", "p": 101.5, "t": 2000, "v": 1},
+                                                          {"s": "MSFT", "p": 300, "t": 3000, "v": 1}]}))
+    assert seen == [("AAPL", 2.0, 101.5), ("MSFT", 3.0, 300.0)]
+    assert stream.trades == 2 and stream.table.get("MSFT")[0] == 300.0
+
+
+# ── Against the mock server ───────────────────────────────────────────────────
+def test_stream_subscribes_and_receives_trades_from_mock_server():
+    pytest.importorskip("websockets")
+    from stockwatch import mock_ws
+
+    server, url = mock_ws.start_background(rate=50)
+    ticks       = []
+    stream      = TradeStream(url, on_trade=lambda sym, t, p: ticks.append(sym))
+    stream.subscribe(["AAPL", "MSFT"])
+    stream.start()
+    try:
+        deadline = time.monotonic() + 10
+        while {"AAPL", "MSFT"} - set(ticks) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert stream.status == "connected"
+        assert {"AAPL", "MSFT"} <= set(ticks)
+    finally:
+        stream.stop()
+        stream.join(5)
+        server.shutdown()
+    assert not stream.is_alive() and stream.status == "stopped"
+
+
+def test_stream_retries_until_stopped_when_server_is_down():
+    pytest.importorskip("websockets")
+    stream = TradeStream("ws://127.0.0.1:9")               # discard port: connection refused
+    stream.start()
+    deadline = time.monotonic() + 5
+    while not stream.status.startswith("reconnecting") and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert stream.status.startswith("reconnecting")
+    stream.stop()
+    stream.join(5)
+    assert stream.status == "stopped"
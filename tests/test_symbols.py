@@ -0,0 +1,59 @@
+import time
+
+from stockwatch.symbols import SymbolCatalog, SymbolIndex
+
+LISTING = [
+    {"symbol": "AAPL",  "description": "APPLE INC"},
+    {"symbol": "APLE",  "description": "APPLE HOSPITALITY REIT INC"},
+    {"symbol": "A",     "description": "AGILENT TECHNOLOGIES INC"},
+    {"symbol": "GOOGL", "description": "ALPHABET INC-CL A"},
+    {"symbol": "MSFT",  "description": "MICROSOFT CORP"},
+    {"symbol": "AAPL",  "description": "DUPLICATE LISTING"},
+]
+
+
+def _index():
+    return SymbolIndex((row["symbol"], row["description"]) for row in LISTING)
+
+
+# ── SymbolIndex ───────────────────────────────────────────────────────────────
+def test_tickers_match_before_company_names():
+    index = _index()
+    assert len(index) == 5
+    assert [s for s, _ in index.search("a")] == ["A", "AAPL", "APLE", "GOOGL"]   # then ALPHABET by name
+    assert index.search("aapl") == [("AAPL", "APPLE INC")]                     # first listing wins
+    assert index.search("  ") == []
+
+
+def test_company_names_match_on_any_word_but_stopwords():
+    index = _index()
+    assert [s for s, _ in index.search("apple")] == ["APLE", "AAPL"]          # in name order
+    assert [s for s, _ in index.search("apple  hosp")] == ["APLE"]
+    assert [s for s, _ in index.search("hospitality")] == ["APLE"]
+    assert index.search("corp") == []
+    assert [s for s, _ in index.search("a", limit=2)] == ["A", "AAPL"]
+    assert index.name_for(" msft ") == "MICROSOFT CORP" and index.name_for("NOPE") == ""
+
+
+# ── SymbolCatalog ─────────────────────────────────────────────────────────────
+def test_catalog_downloads_persists_and_reloads(tmp_path):
+    path    = tmp_path / "symbols.json"
+    catalog = SymbolCatalog(path, download=lambda exchange: LISTING)
+    assert catalog.stale() and catalog.search("msft") == []
+    assert catalog.ensure()
+    catalog._thread.join(5)
+    assert catalog.search("micro") == [("MSFT", "MICROSOFT CORP")]
+
+    reloaded = SymbolCatalog(path, download=lambda exchange: [])
+    assert not reloaded.stale() and not reloaded.ensure()
+    assert len(reloaded.index) == 5
+
+
+def test_failed_download_keeps_the_index_and_backs_off(tmp_path):
+    def down(exchange):
+        raise OSError("offline")
+
+    catalog = SymbolCatalog(tmp_path / "symbols.json", download=down)
+    assert catalog.download() == 0 and catalog.error == "offline"
+    assert catalog._failed <= time.time() and not catalog.ensure()      # waits RETRY_AFTER before trying again
+    assert not (tmp_path / "symbols.json").exists()
@@ -0,0 +1,47 @@
+import math
+
+import pytest
+
+from stockwatch.watchlist import CardRenderer, quote_frame, sort_frame
+
+STOCKS = [{"symbol": "AAPL", "name": "Apple", "alert_pct": 2.0},
+          {"symbol": "MSFT", "name": "Microsoft <Corp>", "alert_pct": 1.0},
+          {"symbol": "BAD", "name": "Bad", "alert_pct": 1.0},
+          {"symbol": "NONE", "name": "None", "alert_pct": 1.0}]
+QUOTES = {"AAPL": {"c": 103.0, "o": 100.0, "pc": 99.0, "h": 104.0, "l": 99.5},
+          "MSFT": {"c": 198.0, "o": 0, "pc": 200.0, "live": True},
+          "BAD":  {"error": "HTTP 500"}}
+
+
+# ── Quote frame ───────────────────────────────────────────────────────────────
+def test_quote_frame_derives_moves_and_status():
+    df = quote_frame(STOCKS, QUOTES, breached={"AAPL"}).set_index("symbol")
+    assert df.loc["AAPL", "change_pct"] == pytest.approx(3.0) and df.loc["AAPL", "alert"]
+    assert df.loc["MSFT", "ref"] == 200.0                      # no open: measured from the previous close
+    assert df.loc["MSFT", "change_pct"] == pytest.approx(-1.0) and df.loc["MSFT", "high"] == 198.0
+    assert df.loc["MSFT", "live"] and not df.loc["MSFT", "alert"]
+    assert df["status"].tolist() == ["ok", "ok", "error", "no data"]
+    assert df.loc["BAD", "error"] == "HTTP 500" and math.isnan(df.loc["NONE", "price"])
+
+
+def test_sort_orders_are_stable():
+    df = quote_frame(STOCKS, QUOTES, breached={"MSFT"})
+    assert sort_frame(df, "Watchlist order")["symbol"].tolist() == ["AAPL", "MSFT", "BAD", "NONE"]
+    assert sort_frame(df, "Alerts first")["symbol"].tolist() == ["MSFT", "AAPL", "BAD", "NONE"]
+    assert sort_frame(df, "Biggest move")["symbol"].tolist() == ["AAPL", "MSFT", "BAD", "NONE"]
+    assert sort_frame(df, "Symbol")["symbol"].tolist() == ["AAPL", "BAD", "MSFT", "NONE"]
+    assert quote_frame([], {}).empty
+
+
+# ── Cards ─────────────────────────────────────────────────────────────────────
+def test_cards_are_rebuilt_only_when_their_row_changes():
+    cards = CardRenderer()
+    grid  = cards.grid(quote_frame(STOCKS, QUOTES, breached={"AAPL"}))
+    assert grid.startswith('<div class="card-grid">') and grid.count('<div class="metric-card') == 4
+    assert "alert-card" in grid and "● LIVE" in grid and "❌ HTTP 500" in grid and "No data" in grid
+    assert "Microsoft &lt;Corp&gt;" in grid                    # names are escaped
+    assert cards.stats() == {"cached": 4, "built": 4, "reused": 0}
+
+    moved = {**QUOTES, "AAPL": {**QUOTES["AAPL"], "c": 101.0}}
+    assert cards.grid(quote_frame(STOCKS, moved)) != grid
+    assert cards.stats() == {"cached": 4, "built": 5, "reused": 3}
@@ -0,0 +1,86 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from stockwatch import mock_http, whatsapp
+from stockwatch.whatsapp import InstanceStateMonitor, check_greenapi_state, get_green_api_client, send_one
+
+WA = {"id_instance": "inst-1", "api_token": "token"}
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server, url = mock_http.start_background()
+    monkeypatch.setattr(whatsapp, "GREENAPI_BASE", url)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+# ── Clients and sends ─────────────────────────────────────────────────────────
+def test_clients_are_cached_per_credential_pair(server, monkeypatch):
+    pytest.importorskip("whatsapp_api_client_python")
+    monkeypatch.setattr(whatsapp, "_clients", {})
+    client = get_green_api_client(WA)
+    assert get_green_api_client({**WA, "recipients": []}) is client
+    assert get_green_api_client({**WA, "api_token": "other"}) is not client
+    assert get_green_api_client({"id_instance": "", "api_token": ""}) is None
+    assert client.session is whatsapp.CLIENT.session(whatsapp.GREENAPI_BASE)   # the pooled keep-alive session
+
+
+def test_send_one_classifies_failures():
+    def client(code=200, error=None, raises=None):
+        def send(chat, message):
+            if raises:
+                raise raises
+            return SimpleNamespace(code=code, error=error)
+        return SimpleNamespace(sending=SimpleNamespace(sendMessage=send))
+
+    assert send_one(client(), "+44 7700", "hi") == (True, "", False)
+    assert send_one(client(429), "1", "hi") == (False, "HTTP 429", True)
+    assert send_one(client(503), "1", "hi") == (False, "HTTP 503", True)
+    assert send_one(client(400), "1", "hi") == (False, "HTTP 400", False)
+    assert send_one(client(None, "refused"), "1", "hi") == (False, "refused", True)
+    assert send_one(client(raises=OSError("reset")), "1", "hi") == (False, "reset", True)
+
+
+def test_state_check_against_the_mock_server(server):
+    assert check_greenapi_state(WA) == "authorized"
+    server.state = "notAuthorized"
+    assert check_greenapi_state(WA) == "notAuthorized"
+    assert check_greenapi_state({"id_instance": "", "api_token": ""}) == "no_credentials"
+    assert server.snapshot() == {"greenapi.state": 2}
+
+
+# ── Instance state monitor ────────────────────────────────────────────────────
+def test_watched_instances_are_checked_in_the_background():
+    states  = {"inst-1": "authorized", "inst-2": "notAuthorized"}
+    checked = threading.Event()
+
+    def check(wa):
+        checked.set()
+        return states[wa["id_instance"]]
+
+    monitor = InstanceStateMonitor(interval=3600, check=check)
+    other   = {"id_instance": "inst-2", "api_token": "token"}
+    assert monitor.state(WA) == (None, None) and monitor.sendable(WA)      # unknown counts as sendable
+    monitor.watch(WA)
+    monitor.watch(other)
+    deadline = time.monotonic() + 5
+    while (monitor.state(WA)[0] is None or monitor.state(other)[0] is None) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert checked.is_set()
+    assert monitor.sendable(WA) and not monitor.sendable(other)
+
+    states["inst-2"] = "authorized"
+    assert monitor.refresh(other) == "authorized" and monitor.sendable(other)
+
+
+def test_watch_ignores_missing_credentials():
+    calls   = []
+    monitor = InstanceStateMonitor(interval=3600, check=lambda wa: calls.append(wa) or "authorized")
+    monitor.watch({"id_instance": "", "api_token": "token"})
+    time.sleep(0.05)
+    assert calls == [] and monitor._watched == {}